@@ -6,13 +6,13 @@ Blender插件入口
 import bpy  # pylint: disable=import-error
 
 from .src.util.logger import Log
-from .src.models.ui36 import is_auto_update_radio
 from .src.handler.watch_handler import stop_watch
 from .src.api.bridge import Bridge
 from .common import scene
 from .src.models import ui36
 from .src.handler import package_mgr
-from .src.data import py_models as pm
+from .src.handler import class_diff
+from .src.handler import scheduler
 
 # 插件信息字典，用于存储插件的元数据
 bl_info = {
@@ -43,13 +43,49 @@ ui_classes = (
     # ui36.GlobalSettings,
     ui36.GlobalSettingPanel,
     ui36.GlobalSettingPanel.ToggleConsole,
-    ui36.PluginPanel1,
-    ui36.PluginPanel1.LoadPlugin,
-    ui36.PluginPanel1.UnloadPlugin,
-    ui36.PluginPanel1.ReloadPlugin,
+    ui36.GlobalSettingPanel.ClearLog,
+    ui36.PluginSlot,
+    ui36.PluginPanel,
+    ui36.PluginPanel.AddSlot,
+    ui36.PluginPanel.RemoveSlot,
+    ui36.PluginPanel.LoadPlugin,
+    ui36.PluginPanel.UnloadPlugin,
+    ui36.PluginPanel.ReloadPlugin,
+    ui36.PluginPanel.BuildExtension,
+    ui36.ReloadTracePanel,
+    ui36.ReloadTracePanel.ExportTrace,
     ui36.OpenURLOperator
 )
 
+# 注册到 bpy.types.Scene 上的属性名称，注销时逐个删除
+SCENE_PROPERTIES = (
+    "plugin_slots",
+    "plugin_path",
+    "is_auto_update",
+    "watch_backend",
+    "reload_debounce",
+    "reload_budget",
+    "watch_cpu_budget",
+    "watch_include",
+    "watch_exclude",
+    "watch_use_gitignore",
+    "watch_use_manifest",
+    "log_filter_level",
+    "log_filter_reload",
+    "log_view_rows",
+    "leak_check_enabled",
+    "hot_patch_enabled",
+)
+
+
+@bpy.app.handlers.persistent
+def on_load_post(*_args):
+    """
+    打开 .blend 文件之后（以及插件注册之后）处理所有场景中保存的设置
+    """
+    for blender_scene in bpy.data.scenes:
+        ui36.migrate_legacy_slot(blender_scene)
+
 
 def register():
     """
@@ -69,8 +105,28 @@ def register():
             BRIDGE.register_class(cls)
 
         # Blender Scene
+        # 开发插件的槽位，每个槽位使用自己的标识符
+        bpy.types.Scene.plugin_slots = bpy.props.CollectionProperty(type=ui36.PluginSlot)
+        # 旧版本的属性只用于迁移到插件槽位
         bpy.types.Scene.plugin_path = scene.plugin_path
-        bpy.types.Scene.is_auto_update = is_auto_update_radio
+        bpy.types.Scene.is_auto_update = scene.is_auto_update
+        bpy.types.Scene.watch_backend = scene.watch_backend
+        bpy.types.Scene.reload_debounce = scene.reload_debounce
+        bpy.types.Scene.reload_budget = scene.reload_budget
+        bpy.types.Scene.watch_cpu_budget = scene.watch_cpu_budget
+        bpy.types.Scene.watch_include = scene.watch_include
+        bpy.types.Scene.watch_exclude = scene.watch_exclude
+        bpy.types.Scene.watch_use_gitignore = scene.watch_use_gitignore
+        bpy.types.Scene.watch_use_manifest = scene.watch_use_manifest
+        bpy.types.Scene.log_filter_level = scene.log_filter_level
+        bpy.types.Scene.log_filter_reload = scene.log_filter_reload
+        bpy.types.Scene.log_view_rows = scene.log_view_rows
+        bpy.types.Scene.leak_check_enabled = scene.leak_check_enabled
+        bpy.types.Scene.hot_patch_enabled = scene.hot_patch_enabled
+
+        # 打开文件之后迁移旧版本的设置；注册时 bpy.data 还不能访问，当前文件在第一次定时器执行时处理
+        bpy.app.handlers.load_post.append(on_load_post)
+        bpy.app.timers.register(on_load_post, first_interval=0.0)
 
     except Exception as err:  # pylint: disable=broad-exception-caught
         unregister()
@@ -86,37 +142,43 @@ def unregister():
     try:
         stop_watch()
     except Exception as err:  # pylint: disable=broad-exception-caught
-        Log.error(f"unregister stop_watch error: {err}")
+        Log.error("unregister stop_watch error: %s", err)
 
-    # 清除用户模块
-    for module in pm.get_modules(1):
-        try:
-            package_mgr.unload_package(module)
-        except Exception as err:  # pylint: disable=broad-exception-caught
-            Log.error(f"unregister unload_package error: {err}")
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    if bpy.app.timers.is_registered(on_load_post):
+        bpy.app.timers.unregister(on_load_post)
+
+    # 关闭调度器中没有完成的重载并注销它的持久定时器
+    scheduler.stop()
 
-    # 清除所有已经加载的模块 TODO 支持多模组时需要修改
+    # 清除所有槽位的用户模块以及所有已经加载的模块记录
     try:
-        pm.clear_identifier(1)
+        package_mgr.unload_all_plugins()
     except Exception as err:  # pylint: disable=broad-exception-caught
-        Log.error(f"unregister clear_identifier error: {err}")
+        Log.error("unregister unload_all error: %s", err)
+
+    # 恢复 bpy.utils 中被替换的注册函数
+    class_diff.uninstall()
 
     # 删除Blender Scene
-    if hasattr(bpy.types.Scene, "plugin_path"):
-        del bpy.types.Scene.plugin_path
-    if hasattr(bpy.types.Scene, "is_auto_update"):
-        del bpy.types.Scene.is_auto_update
+    for name in SCENE_PROPERTIES:
+        if hasattr(bpy.types.Scene, name):
+            delattr(bpy.types.Scene, name)
 
     # 卸载所有UI
     for cls in ui_classes:
         try:
             BRIDGE.unregister_class(cls)
         except Exception as err:  # pylint: disable=broad-exception-caught
-            Log.error(f"unregister unregister_class error: {err}")
+            Log.error("unregister unregister_class error: %s", err)
 
     # 卸载翻译
     BRIDGE.unregister_translations()
 
+    # 输出剩余的日志并停止日志线程
+    Log.shutdown()
+
 
 # bpy.app.handlers.depsgraph_update_post.append(check_for_plugin_changes)
 # bpy.app.handlers.depsgraph_update_post.remove(check_for_plugin_changes)
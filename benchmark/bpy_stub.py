@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+基准测试使用的 bpy 替身模块：只提供插件和合成插件用到的接口，使它们可以在普通CPython中运行
+"""
+import sys
+import time
+import types
+
+
+class _Namespace(types.SimpleNamespace):  # pylint: disable=too-few-public-methods
+    """
+    可以随意添加属性的命名空间，用于模拟 bpy.context.scene 等对象
+    """
+
+
+class _Timers:
+    """
+    模拟 bpy.app.timers：注册的函数保存在队列中，由基准测试显式执行
+    """
+
+    def __init__(self):
+        self._queue = []
+        # 最近一次 run() 中定时器函数本身的执行时间（秒），即主线程被占用的时间，
+        # 以及单次执行的最长时间，即界面最长的停顿
+        self.last_busy = 0.0
+        self.max_busy = 0.0
+
+    def register(self, function, first_interval=0, persistent=False):  # pylint: disable=unused-argument
+        """
+        注册定时器函数
+        """
+        if function not in self._queue:
+            self._queue.append(function)
+
+    def unregister(self, function):
+        """
+        注销定时器函数
+        """
+        if function in self._queue:
+            self._queue.remove(function)
+
+    def is_registered(self, function):
+        """
+        判断定时器函数是否已注册
+        """
+        return function in self._queue
+
+    def run(self, max_calls=100000):
+        """
+        执行队列中的定时器函数，返回数值的函数会在等待该时长后再次执行，直到全部返回None
+
+        :param max_calls: 最多执行的次数，防止持久定时器无限执行
+        :return: 实际执行的次数
+        """
+        calls = 0
+        self.last_busy = 0.0
+        self.max_busy = 0.0
+        while self._queue and calls < max_calls:
+            function = self._queue.pop(0)
+            calls += 1
+            start = time.perf_counter()
+            interval = function()
+            busy = time.perf_counter() - start
+            self.last_busy += busy
+            self.max_busy = max(self.max_busy, busy)
+            if interval is not None:
+                self._queue.append(function)
+                time.sleep(interval)
+        return calls
+
+
+class _PropertyDeferred:  # pylint: disable=too-few-public-methods
+    """
+    模拟 bpy.props.*Property 的返回值，function 与 Blender 中一样是属性定义函数本身
+    """
+
+    def __init__(self, function, keywords):
+        self.function = function
+        self.keywords = keywords
+
+
+def _property(name):
+    """
+    生成一个属性定义函数
+    """
+    def define(**keywords):
+        return _PropertyDeferred(define, keywords)
+    define.__name__ = name
+    return define
+
+
+class _StructBase:  # pylint: disable=too-few-public-methods
+    """
+    bpy.types 中可注册类型的基类
+    """
+    layout = None
+
+
+class _Registry:
+    """
+    模拟 bpy.utils.register_class / unregister_class，记录已注册的类
+    """
+
+    def __init__(self):
+        self.classes = {}
+
+    def register_class(self, cls):
+        """
+        注册类，重复注册时报错（与Blender的行为一致）
+        """
+        key = getattr(cls, 'bl_idname', None) or cls.__name__
+        if self.classes.get(key) is cls:
+            raise ValueError(f"register_class(...): already registered as a subclass '{key}'")
+        self.classes[key] = cls
+
+    def unregister_class(self, cls):
+        """
+        注销类，未注册时报错（与Blender的行为一致）
+        """
+        key = getattr(cls, 'bl_idname', None) or cls.__name__
+        if self.classes.get(key) is not cls:
+            raise RuntimeError(f"unregister_class(...): missing bl_rna attribute for '{key}'")
+        del self.classes[key]
+
+
+def build_module(user_resource_dir):
+    """
+    构建 bpy 替身模块
+
+    :param user_resource_dir: bpy.utils.user_resource 返回的根目录
+    :return: 模块对象
+    """
+    bpy = types.ModuleType('bpy')
+    registry = _Registry()
+    bpy.registry = registry
+    bpy.app = _Namespace(
+        version=(4, 2, 0),
+        binary_path='',
+        timers=_Timers(),
+        translations=_Namespace(register=lambda *args: None, unregister=lambda *args: None),
+        handlers=_Namespace(persistent=lambda function: function, load_post=[]),
+    )
+    bpy.props = _Namespace(**{
+        name: _property(name) for name in (
+            'BoolProperty', 'IntProperty', 'FloatProperty', 'StringProperty', 'EnumProperty',
+            'PointerProperty', 'CollectionProperty', 'FloatVectorProperty', 'IntVectorProperty',
+        )
+    })
+    bpy.types = _Namespace(**{
+        name: type(name, (_StructBase,), {}) for name in (
+            'Panel', 'Operator', 'PropertyGroup', 'UIList', 'Menu', 'AddonPreferences', 'Scene',
+        )
+    })
+    bpy.utils = _Namespace(
+        register_class=registry.register_class,
+        unregister_class=registry.unregister_class,
+        user_resource=lambda resource_type, path='', create=False: (
+            f"{user_resource_dir}/{resource_type.lower()}/{path}".rstrip('/')),
+    )
+    bpy.ops = _Namespace(wm=_Namespace(console_toggle=lambda: None))
+    bpy.context = _Namespace(scene=_Namespace(plugin_slots=[]))
+    return bpy
+
+
+def install(user_resource_dir):
+    """
+    把替身模块安装为 sys.modules['bpy']
+
+    :param user_resource_dir: bpy.utils.user_resource 返回的根目录
+    :return: 模块对象
+    """
+    bpy = build_module(user_resource_dir)
+    sys.modules['bpy'] = bpy
+    return bpy
@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+插件加载、重载、卸载以及监控扫描耗时的基准测试。
+
+在普通CPython中运行，使用 bpy_stub 代替 bpy，结果以JSON格式输出，便于在不同版本之间比较：
+
+    python benchmark/run_benchmark.py --modules 300 --out bench.json
+    python benchmark/run_benchmark.py --modules 300 --compare bench.json
+"""
+import argparse
+import gc
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import bpy_stub
+import synth_addon
+
+# 插件开发助手的根目录（本文件的上一级目录），以其目录名作为包名导入
+HELPER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HELPER_NAME = os.path.basename(HELPER_ROOT)
+
+
+class Helper:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    导入插件开发助手中需要测量的模块
+    """
+
+    def __init__(self):
+        sys.path.insert(0, os.path.dirname(HELPER_ROOT))
+        self.root = importlib.import_module(HELPER_NAME)
+        self.package_mgr = importlib.import_module(f"{HELPER_NAME}.src.handler.package_mgr")
+        self.watch_handler = importlib.import_module(f"{HELPER_NAME}.src.handler.watch_handler")
+        self.watch_backend = importlib.import_module(f"{HELPER_NAME}.src.handler.watch_backend")
+        self.py_models = importlib.import_module(f"{HELPER_NAME}.src.data.py_models")
+        self.path_filter = importlib.import_module(f"{HELPER_NAME}.src.util.path_filter")
+        self.precompiler = importlib.import_module(f"{HELPER_NAME}.src.handler.precompiler")
+        self.trace = importlib.import_module(f"{HELPER_NAME}.src.util.trace")
+        self.dir_scanner = importlib.import_module(f"{HELPER_NAME}.src.handler.dir_scanner")
+        self.hash_cache = importlib.import_module(f"{HELPER_NAME}.src.data.hash_cache")
+
+
+def _summary(values):
+    """
+    :param values: 多次测量的耗时（毫秒）
+    :return: 统计结果
+    """
+    return {
+        'min': min(values),
+        'median': statistics.median(values),
+        'mean': statistics.fmean(values),
+        'max': max(values),
+    }
+
+
+def measure(action, setup=None, repeat=5, counter=None):
+    """
+    测量一个操作的耗时和内存分配。
+    耗时测量时不开启tracemalloc，之后单独执行一次来统计内存。
+
+    :param action: 被测量的操作
+    :param setup: 每次测量前执行的准备操作，不计入耗时
+    :param repeat: 测量次数
+    :param counter: 测量结束后调用，返回需要记录的计数信息
+    :return: 测量结果
+    """
+    walls = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        action()
+        walls.append((time.perf_counter() - start) * 1000.0)
+
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    action()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'wall_ms': _summary(walls),
+        'alloc': {'peak_bytes': peak - before, 'retained_bytes': after - before},
+    }
+    if counter is not None:
+        result['counts'] = counter()
+    return result
+
+
+def retained_bytes(build, repeat=3):
+    """
+    测量 build() 返回的对象保留的内存。
+    取多次测量中的最小值：驻留字符串的全局字典偶尔扩容，扩容的那一次会被多算
+
+    :param build: 创建并返回被测量的对象
+    :param repeat: 测量次数
+    :return: 保留的字节数
+    """
+    sizes = []
+    for _ in range(repeat):
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        built = build()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del built
+        sizes.append(after - before)
+    return min(sizes)
+
+
+def run(args):  # pylint: disable=too-many-locals,too-many-statements
+    """
+    执行所有基准测试
+
+    :param args: 命令行参数
+    :return: 结果字典
+    """
+    # pylint: disable=no-member
+    # Blender默认会写入 .pyc，不受 PYTHONDONTWRITEBYTECODE 或 -B 的影响
+    sys.dont_write_bytecode = False
+    work_dir = tempfile.mkdtemp(prefix='pdh_bench_')
+    bpy = bpy_stub.install(os.path.join(work_dir, 'user'))
+    helper = Helper()
+    logging.getLogger('plugin_dev_helper').setLevel(args.log_level)
+
+    addon = synth_addon.generate(
+        os.path.join(work_dir, 'addons'), modules=args.modules, depth=args.depth,
+        classes=args.classes, functions=args.functions, files=args.files)
+    package_mgr = helper.package_mgr
+    watch_handler = helper.watch_handler
+
+    def loaded_count():
+        return {
+            'registered_modules': len(helper.py_models.get_modules(1)),
+            'registered_classes': len(bpy.registry.classes),
+            'sys_modules': len(sys.modules),
+        }
+
+    def ensure_unloaded():
+        package_mgr.unload_all(1)
+
+    def ensure_loaded():
+        if not helper.py_models.get_modules(1):
+            package_mgr.load_package(addon.path)
+
+    revision = [0]
+    touched = []
+    main_busy = []
+    max_tick = []
+
+    def reload_after_touch(index):
+        def action():
+            revision[0] += 1
+            changed = addon.touch_module(index, revision[0])
+            watch_handler.reload_modules_callback(1, addon.path, frozenset([changed]))
+            bpy.app.timers.run()
+            main_busy.append(bpy.app.timers.last_busy * 1000.0)
+            max_tick.append(bpy.app.timers.max_busy * 1000.0)
+        return action
+
+    def touch_all(precompile):
+        # 修改所有模块，模拟切换分支；precompile 为 True 时与监控线程一样先在后台编译，
+        # 否则删除 .pyc，让主线程导入时编译。编译不计入主线程的耗时
+        def setup():
+            ensure_loaded()
+            revision[0] += 1
+            touched[:] = [addon.touch_module(index, revision[0])
+                          for index in range(len(addon.module_files))]
+            if precompile:
+                helper.precompiler.precompile(touched)
+                return
+            for path in touched:
+                try:
+                    os.remove(importlib.util.cache_from_source(path))
+                except OSError:
+                    pass
+        return setup
+
+    def reload_touched():
+        watch_handler.reload_modules_callback(1, addon.path, frozenset(touched))
+        bpy.app.timers.run()
+        main_busy.append(bpy.app.timers.last_busy * 1000.0)
+        max_tick.append(bpy.app.timers.max_busy * 1000.0)
+
+    def reload_count():
+        counts = loaded_count()
+        # 定时器函数占用主线程的时间，只统计计时的几次测量（不含最后开启tracemalloc的一次）；
+        # max_tick_ms 为单次定时器执行的最长时间，即重载期间界面最长的停顿
+        counts['main_thread_ms'] = _summary(main_busy[:args.repeat])
+        counts['max_tick_ms'] = _summary(max_tick[:args.repeat])
+        main_busy.clear()
+        max_tick.clear()
+        latest = helper.trace.recent_traces()
+        if latest:
+            counts.update(latest[0].counters)
+        return counts
+
+    def full_reload():
+        package_mgr.unload_all(1)
+        package_mgr.load_package(addon.path)
+
+    results = {
+        'load_package': measure(lambda: package_mgr.load_package(addon.path),
+                                setup=ensure_unloaded, repeat=args.repeat, counter=loaded_count),
+        'reload_modules_leaf': measure(reload_after_touch(args.modules - 1), setup=ensure_loaded,
+                                       repeat=args.repeat, counter=reload_count),
+        'reload_modules_core': measure(reload_after_touch(0), setup=ensure_loaded,
+                                       repeat=args.repeat, counter=reload_count),
+        'reload_all_changed_cold': measure(reload_touched, setup=touch_all(False),
+                                           repeat=args.repeat, counter=reload_count),
+        'reload_all_changed_precompiled': measure(reload_touched, setup=touch_all(True),
+                                                  repeat=args.repeat, counter=reload_count),
+        'reload_full': measure(full_reload, setup=ensure_loaded, repeat=args.repeat,
+                               counter=loaded_count),
+        'unload_package': measure(lambda: package_mgr.unload_all(1), setup=ensure_loaded,
+                                  repeat=args.repeat, counter=loaded_count),
+    }
+
+    # 监控扫描：轮询后端的一次扫描，分别测量没有变化和有一个文件变化的情况
+    path_filter = helper.path_filter.build_filter(addon.path)
+    backend = helper.watch_backend.PollingBackend(addon.path, path_filter)
+    backend.start()
+    touched = addon.asset_files or addon.module_files
+
+    def touch_one():
+        os.utime(touched[-1], ns=(time.time_ns(), time.time_ns()))
+
+    results['watch_tick_idle'] = measure(backend.scanner.scan, repeat=args.repeat,
+                                         counter=lambda: dict(backend.stats))
+    results['watch_tick_one_change'] = measure(backend.scanner.scan, setup=touch_one,
+                                               repeat=args.repeat,
+                                               counter=lambda: dict(backend.stats))
+    backend.close()
+
+    # 监控索引的内存：轮询扫描器和哈希缓存为每个被监视的文件保留的内存
+    watched = len(helper.hash_cache.HashCache().seed(addon.path, path_filter))
+
+    def build_scanner():
+        scanner = helper.dir_scanner.DirScanner(addon.path, path_filter)
+        scanner.scan()
+        return scanner
+
+    def build_hash_cache():
+        cache = helper.hash_cache.HashCache()
+        cache.seed(addon.path, path_filter)
+        return cache
+
+    for name, build in (('index_memory_scanner', build_scanner),
+                        ('index_memory_hash_cache', build_hash_cache)):
+        result = measure(build, repeat=args.repeat)
+        retained = retained_bytes(build, max(args.repeat, 3))
+        result['counts'] = {'files': watched, 'bytes_per_file': retained / max(watched, 1)}
+        results[name] = result
+
+    # 停止监控线程：线程正在为目录建立基准时停止，测量主线程等待的时间
+    watchers = []
+
+    def start_watcher():
+        watcher = watch_handler.Watcher(lambda *_: None)
+        watcher.add(watch_handler.WatchedRoot(1, addon.path, 'polling', path_filter=path_filter))
+        watcher.start()
+        watchers[:] = [watcher]
+
+    results['watch_stop'] = measure(
+        lambda: watchers[0].stop(watch_handler.STOP_TIMEOUT), setup=start_watcher,
+        repeat=args.repeat, counter=lambda: {'stopped': not watchers[0].thread.is_alive()})
+    package_mgr.unload_all(1)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'helper_version': '.'.join(map(str, helper.root.bl_info['version'])),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': {
+                'modules': args.modules, 'depth': args.depth, 'classes': args.classes,
+                'functions': args.functions, 'files': args.files, 'repeat': args.repeat,
+            },
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline_path):
+    """
+    打印当前结果与之前结果的中位耗时对比
+
+    :param current: 当前结果
+    :param baseline_path: 之前保存的结果文件
+    """
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+    print(f"{'benchmark':<24}{'baseline ms':>14}{'current ms':>14}{'ratio':>10}")
+    for name, result in current['results'].items():
+        old = baseline['results'].get(name)
+        new_ms = result['wall_ms']['median']
+        if old is None:
+            print(f"{name:<24}{'-':>14}{new_ms:>14.2f}{'-':>10}")
+            continue
+        old_ms = old['wall_ms']['median']
+        ratio = new_ms / old_ms if old_ms else float('nan')
+        print(f"{name:<24}{old_ms:>14.2f}{new_ms:>14.2f}{ratio:>10.2f}")
+
+    memory = [(name, result['counts']['bytes_per_file'])
+              for name, result in current['results'].items()
+              if 'bytes_per_file' in result.get('counts', {})]
+    if memory:
+        print(f"{'memory per file':<24}{'baseline B':>14}{'current B':>14}{'ratio':>10}")
+    for name, new_bytes in memory:
+        old = baseline['results'].get(name, {}).get('counts', {}).get('bytes_per_file')
+        if old is None:
+            print(f"{name:<24}{'-':>14}{new_bytes:>14.1f}{'-':>10}")
+            continue
+        ratio = new_bytes / old if old else float('nan')
+        print(f"{name:<24}{old:>14.1f}{new_bytes:>14.1f}{ratio:>10.2f}")
+
+
+def main(argv=None):
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 2)[1])
+    parser.add_argument('--modules', type=int, default=100, help="number of modules")
+    parser.add_argument('--depth', type=int, default=3, help="package nesting depth")
+    parser.add_argument('--classes', type=int, default=3, help="registered classes per module")
+    parser.add_argument('--functions', type=int, default=10, help="plain functions per module")
+    parser.add_argument('--files', type=int, default=0, help="extra non-Python files")
+    parser.add_argument('--repeat', type=int, default=5, help="measurements per benchmark")
+    parser.add_argument('--log-level', default='WARNING', help="log level of the helper")
+    parser.add_argument('--out', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="compare with a previous JSON result file")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=2)
+    if args.compare:
+        compare(result, args.compare)
+    if not args.out and not args.compare:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
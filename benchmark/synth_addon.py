@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+生成用于基准测试的合成插件
+"""
+import os
+
+_MODULE_TEMPLATE = '''\
+import bpy
+{imports}
+
+VALUE = {index}
+REVISION = 0
+
+{functions}
+{classes}
+CLASSES = ({class_names})
+
+
+def register():
+    for cls in CLASSES:
+        bpy.utils.register_class(cls)
+
+
+def unregister():
+    for cls in reversed(CLASSES):
+        bpy.utils.unregister_class(cls)
+'''
+
+_CLASS_TEMPLATE = '''
+class {name}(bpy.types.Operator):
+    bl_idname = "synth.m{index}_c{number}"
+    bl_label = "Synthetic {index}.{number}"
+    bl_options = {{'REGISTER', 'UNDO'}}
+
+    amount: bpy.props.IntProperty(name="Amount", default={number})
+
+    def execute(self, context):
+        return {{'FINISHED'}}
+'''
+
+_FUNCTION_TEMPLATE = '''
+def helper_{number}(value):
+    total = 0
+    for item in range(value):
+        total += item * {number}
+    return total
+'''
+
+_ROOT_TEMPLATE = '''\
+bl_info = {{
+    "name": "{name}",
+    "version": (0, 0, 1),
+    "blender": (3, 6, 0),
+    "category": "Development",
+}}
+
+
+def register():
+    pass
+
+
+def unregister():
+    pass
+'''
+
+
+class SynthAddon:  # pylint: disable=too-few-public-methods
+    """
+    合成插件的描述信息
+
+    path: 插件根目录
+    name: 插件包名称
+    module_files: 按生成顺序排列的模块文件路径，模块i导入模块(i-1)//2，
+                  因此第一个模块被所有模块间接导入，最后一个模块没有被任何模块导入
+    asset_files: 生成的非Python文件
+    """
+
+    def __init__(self, path, name, module_files, asset_files):
+        self.path = path
+        self.name = name
+        self.module_files = module_files
+        self.asset_files = asset_files
+
+    def touch_module(self, index, revision):
+        """
+        修改一个模块的内容（修改 REVISION 的值），用于测量重载
+
+        :param index: 模块序号
+        :param revision: 新的 REVISION 值
+        :return: 被修改的文件路径
+        """
+        filepath = self.module_files[index]
+        with open(filepath, encoding='utf-8') as file:
+            lines = file.read().splitlines(True)
+        lines = [f"REVISION = {revision}\n" if line.startswith('REVISION = ') else line
+                 for line in lines]
+        with open(filepath, 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+        return filepath
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def generate(base_dir, name='pdh_bench_addon', modules=100, depth=3, classes=3,  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+             functions=10, files=0, modules_per_package=20):
+    """
+    生成合成插件
+
+    :param base_dir: 插件所在的目录
+    :param name: 插件包名称
+    :param modules: 模块数量（不含 __init__.py）
+    :param depth: 包的嵌套深度
+    :param classes: 每个模块中注册的类数量
+    :param functions: 每个模块中的普通函数数量
+    :param files: 额外生成的非Python文件数量（模拟资源文件）
+    :param modules_per_package: 每个包中的模块数量
+    :return: SynthAddon
+    """
+    root = os.path.join(base_dir, name)
+    _write(os.path.join(root, '__init__.py'), _ROOT_TEMPLATE.format(name=name))
+
+    module_names = []
+    module_files = []
+    for index in range(modules):
+        group = index // modules_per_package
+        package_parts = [f"pkg{group}"] + [f"lvl{level}" for level in range(1, depth)]
+        package_dir = root
+        for part in package_parts:
+            package_dir = os.path.join(package_dir, part)
+            init_file = os.path.join(package_dir, '__init__.py')
+            if not os.path.exists(init_file):
+                _write(init_file, '')
+        module_names.append('.'.join([name] + package_parts + [f"mod{index}"]))
+        module_files.append(os.path.join(package_dir, f"mod{index}.py"))
+
+    for index, filepath in enumerate(module_files):
+        imports = ''
+        if index > 0:
+            imports = f"from {module_names[(index - 1) // 2]} import VALUE as PARENT_VALUE"
+        class_names = [f"SYNTH_OT_m{index}_c{number}" for number in range(classes)]
+        _write(filepath, _MODULE_TEMPLATE.format(
+            index=index,
+            imports=imports,
+            functions=''.join(_FUNCTION_TEMPLATE.format(number=number)
+                              for number in range(functions)),
+            classes=''.join(_CLASS_TEMPLATE.format(name=class_name, index=index, number=number)
+                            for number, class_name in enumerate(class_names)),
+            class_names=''.join(f"{class_name}, " for class_name in class_names),
+        ))
+
+    asset_files = []
+    for index in range(files):
+        filepath = os.path.join(root, 'assets', f"group{index // 100}", f"asset{index}.bin")
+        _write(filepath, f"asset {index}\n")
+        asset_files.append(filepath)
+
+    return SynthAddon(root, name, module_files, asset_files)
@@ -5,10 +5,110 @@ Blender Scene文件
 """
 import bpy # pylint: disable=import-error
 
-plugin_path = bpy.props.StringProperty(
-    name="Plugin Path",
-    description="Path to the plugin file.",
+# 旧版本只有一个插件时保存在场景中的属性，打开旧文件时被移到插件槽位中，界面中不再显示
+plugin_path = bpy.props.StringProperty(default="", options={'HIDDEN'})
+is_auto_update = bpy.props.BoolProperty(default=False, options={'HIDDEN'})
+
+watch_backend = bpy.props.EnumProperty(
+    name="Watch Backend",
+    description="Backend used to detect file changes.",
+    items=[
+        ('AUTO', "Auto", "Use inotify on Linux, polling elsewhere"),
+        ('INOTIFY', "inotify", "Event driven, Linux only"),
+        ('POLLING', "Polling", "Scan the directory periodically"),
+    ],
+    default='AUTO',
+)
+
+reload_budget = bpy.props.FloatProperty(
+    name="Frame Budget (ms)",
+    description="Main thread time a reload may use per timer tick. The reload continues in the "
+                "next tick, so the interface keeps responding while large plugins reload.",
+    default=8.0,
+    min=1.0,
+    max=200.0,
+)
+
+reload_debounce = bpy.props.FloatProperty(
+    name="Quiet Window",
+    description="Seconds without further changes before a batch of changes is reloaded.",
+    default=0.3,
+    min=0.0,
+    max=10.0,
+    subtype='TIME_ABSOLUTE',
+    unit='TIME_ABSOLUTE',
+)
+
+watch_cpu_budget = bpy.props.FloatProperty(
+    name="Watch CPU Budget (%)",
+    description="Share of one CPU core the polling backend may spend scanning. Large plugin "
+                "folders are scanned less often to stay within it. Applies when watching starts.",
+    default=2.0,
+    min=0.1,
+    max=50.0,
+)
+
+watch_include = bpy.props.StringProperty(
+    name="Include",
+    description="Comma separated glob patterns of files to watch. Empty watches all files.",
+    default="",
+)
+
+watch_exclude = bpy.props.StringProperty(
+    name="Exclude",
+    description="Comma separated gitignore style patterns of files and folders to skip.",
     default="",
-    maxlen=512,
-    subtype='FILE_PATH',
+)
+
+watch_use_gitignore = bpy.props.BoolProperty(
+    name="Use .gitignore",
+    description="Also skip the paths ignored by the plugin's .gitignore.",
+    default=True,
+)
+
+watch_use_manifest = bpy.props.BoolProperty(
+    name="Use Manifest Excludes",
+    description="Also skip the paths_exclude_pattern of the plugin's blender_manifest.toml.",
+    default=True,
+)
+
+log_filter_level = bpy.props.EnumProperty(
+    name="Level",
+    description="Lowest level of the log records to show.",
+    items=[
+        ('DEBUG', "Debug", ""),
+        ('INFO', "Info", ""),
+        ('WARNING', "Warning", ""),
+        ('ERROR', "Error", ""),
+    ],
+    default='INFO',
+)
+
+log_filter_reload = bpy.props.IntProperty(
+    name="Reload ID",
+    description="Only show the records of this reload. 0 shows all records.",
+    default=0,
+    min=0,
+)
+
+log_view_rows = bpy.props.IntProperty(
+    name="Rows",
+    description="Number of log records to show.",
+    default=20,
+    min=1,
+    max=200,
+)
+
+leak_check_enabled = bpy.props.BoolProperty(
+    name="Leak Check",
+    description="Report the memory kept by every reload and the old modules and classes that "
+                "are still alive. Slows down reloads, use it only while investigating.",
+    default=False,
+)
+
+hot_patch_enabled = bpy.props.BoolProperty(
+    name="Hot Patch",
+    description="When only function bodies changed, replace the code of the loaded functions "
+                "instead of reloading the modules. Other changes still reload normally.",
+    default=False,
 )
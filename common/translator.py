@@ -31,16 +31,73 @@ translation_map = {
     ("*", "Global Settings"): "全局设置",
     ("*", "Addon DEV Helper"): "插件开发助手",
     ("*", "Auto change detection(Not rec.)"): "自动检测变化(不推荐)",
-    ("*", "DEV Plugin 1"): "开发插件 1",
+    ("*", "DEV Plugins"): "开发插件",
+    ("*", "Watch Settings"): "监控设置",
+    ("*", "Add a slot for another plugin in development"): "为另一个开发中的插件添加槽位",
+    ("*", "Unload the plugin and remove its slot"): "卸载插件并移除槽位",
     ("*", "Perform the operation of loading plugins"): "执行加载插件的操作",
     ("*", "Perform the operation of uninstalling plugins"): "执行卸载插件的操作",
     ("*", "Perform the operation of reloading plugins"): "执行重载插件的操作",
+    ("*", "Package the plugin directory into an extension zip using its manifest"):
+        "根据清单文件把插件目录打包为扩展的zip文件",
     ("*", "Enable/Disable Automatic check for changes and reload(1.5s)"): "开启/关闭 自动检查变化重载(1.5s)",
     ("*", "Global Setting Panel"): "全局设置",
+    ("*", "Watch Backend"): "监控后端",
+    ("*", "Backend used to detect file changes."): "用于检测文件变化的后端",
+    ("*", "Polling"): "轮询",
+    ("*", "Quiet Window"): "静默窗口",
+    ("*", "Seconds without further changes before a batch of changes is reloaded."):
+        "最后一次变化后等待多少秒没有新变化，才重载这批变化",
+    ("*", "Include"): "包含",
+    ("*", "Exclude"): "排除",
+    ("*", "Use .gitignore"): "使用 .gitignore",
+    ("*", "Use Manifest Excludes"): "使用清单排除规则",
+    ("*", "Comma separated glob patterns of files to watch. Empty watches all files."):
+        "以逗号分隔的需要监视的文件通配规则，为空时监视所有文件",
+    ("*", "Comma separated gitignore style patterns of files and folders to skip."):
+        "以逗号分隔的gitignore风格的排除规则",
+    ("*", "Reload Trace"): "重载耗时记录",
+    ("*", "No reloads recorded yet"): "还没有重载记录",
+    ("*", "Export reload timings as a Chrome/Perfetto trace file"):
+        "把重载耗时导出为 Chrome/Perfetto trace 文件",
+    ("*", "Level"): "级别",
+    ("*", "Lowest level of the log records to show."): "显示的最低日志级别",
+    ("*", "Reload ID"): "重载编号",
+    ("*", "Only show the records of this reload. 0 shows all records."):
+        "只显示该次重载的日志，为0时显示全部",
+    ("*", "Rows"): "行数",
+    ("*", "Number of log records to show."): "显示的日志条数",
+    ("*", "Log"): "日志",
+    ("*", "No log records"): "没有日志",
+    ("*", "Leak Check"): "泄漏检查",
+    ("*", "Report the memory kept by every reload and the old modules and classes that "
+          "are still alive. Slows down reloads, use it only while investigating."):
+        "报告每次重载保留的内存以及仍然存活的旧模块和旧类。会让重载变慢，只建议在排查问题时开启",
+    ("*", "Frame Budget (ms)"): "每帧预算（毫秒）",
+    ("*", "Watch CPU Budget (%)"): "监控CPU预算（%）",
+    ("*", "Share of one CPU core the polling backend may spend scanning. Large plugin "
+          "folders are scanned less often to stay within it. Applies when watching starts."):
+        "轮询后端扫描可以占用的单个CPU核心的比例，大型插件目录的扫描间隔会相应变长。开始监视时生效",
+    ("*", "Main thread time a reload may use per timer tick. The reload continues in the "
+          "next tick, so the interface keeps responding while large plugins reload."):
+        "重载在每次定时器执行中可以占用主线程的时间，剩余的工作在下一次执行中继续，重载大型插件时界面仍然可以响应",
+    ("*", "Hot Patch"): "热补丁",
+    ("*", "When only function bodies changed, replace the code of the loaded functions "
+          "instead of reloading the modules. Other changes still reload normally."):
+        "只有函数体发生变化时，直接替换已加载函数的代码而不重新加载模块，其他变化仍然照常重载",
     ("Operator", "Toggle System Console"): "切换系统控制台",
+    ("Operator", "Clear Log"): "清空日志",
     ("Operator", "user doc."): "用户文档",
     ("Operator", "open source"): "开源地址",
-    ("Operator", "Load Plugin 1"): "加载插件 1",
-    ("Operator", "Unload Plugin 1"): "卸载插件 1",
-    ("Operator", "Reload Plugin 1"): "重载插件 1",
+    ("Operator", "Load Plugin"): "加载插件",
+    ("Operator", "Unload Plugin"): "卸载插件",
+    ("Operator", "Reload Plugin"): "重载插件",
+    ("Operator", "Build Extension"): "打包扩展",
+    ("Operator", "Add Plugin"): "添加插件",
+    ("Operator", "Remove Plugin"): "移除插件",
+    ("Operator", "Load"): "加载",
+    ("Operator", "Unload"): "卸载",
+    ("Operator", "Reload"): "重载",
+    ("Operator", "Export Trace"): "导出耗时记录",
+    ("Operator", "Export All"): "全部导出",
 }
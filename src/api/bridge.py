@@ -22,7 +22,7 @@ class Bridge:
         参数:
         addon_name (str): 插件的名称，用于日志和翻译的标识。
         """
-        Log.info(f"Bridge init. addon name:{addon_name}")
+        Log.info("Bridge init. addon name:%s", addon_name)
         major, minor, _ = bpy.app.version
         self.bv = (major, minor)
         self.is_blender_gt_4_2 = self.bv >= (4, 2)
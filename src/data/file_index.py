@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+文件索引：紧凑的内存结构（FileIndex），以及持久化的文件索引。
+
+持久化的索引保存插件目录中每个文件的相对路径、大小、修改时间和内容摘要，以及上一次成功加载时的摘要。
+下次开始监视时（包括重新打开Blender之后）与索引比较，只需要重新计算修改过的文件的摘要
+"""
+import hashlib
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+from ..util.logger import Log
+
+# 文件格式：MAGIC，之后是 zlib 压缩的数据：根目录路径的长度和路径（UTF-8）、条目数量，以及每个条目
+MAGIC = b'PDHIDX1\n'
+_COUNT = struct.Struct('<I')
+# 条目：相对路径的长度、标志、大小、修改时间，之后是相对路径（UTF-8，以 / 分隔）和摘要
+_ENTRY = struct.Struct('<HBqq')
+# 标志：有当前的摘要；有已加载的摘要；已加载的摘要与当前的摘要相同（不再单独保存）
+HAS_DIGEST = 1
+HAS_LOADED = 2
+LOADED_SAME = 4
+
+# FileIndex 中每个槽位的标志：有大小、修改时间（和摘要）；有已加载的摘要
+STAT = 1
+LOADED = 2
+
+
+def _split(path):
+    """
+    比 os.path.split 更快的拆分，FileIndex 每次查找都需要拆分路径
+
+    :param path: 文件路径
+    :return: (目录路径, 文件名)；目录路径不以分隔符结尾，用 目录路径 + os.sep + 文件名 可以还原路径
+    """
+    dirpath, _, name = path.rpartition(os.sep)
+    if os.altsep and os.altsep in name:
+        dirpath, _, name = path.replace(os.altsep, os.sep).rpartition(os.sep)
+    return dirpath, name
+
+
+class FileIndex:  # pylint: disable=too-many-instance-attributes
+    """
+    紧凑的文件索引，监视几十万个文件（插件加上资源和第三方库）时也只占用很少的内存。
+
+    按结构数组保存：路径拆分为目录（每个目录只保存一次）和文件名（驻留的字符串，同名文件共用），
+    目录 -> {文件名 -> 槽位}；每个文件的修改时间和大小保存在 array('q') 中，
+    摘要连续保存在 bytearray 中。删除的文件的槽位会被重新使用。
+    不是线程安全的，由使用者加锁。
+    """
+
+    def __init__(self, root=None, digest_size=0):
+        """
+        :param root: 根目录，保存到磁盘时文件以相对于根目录的路径保存
+        :param digest_size: 每个文件保存的摘要长度（字节），为0时只保存修改时间和大小
+        """
+        self.root = root
+        self.digest_size = digest_size
+        # 目录路径（与 _split() 的结果相同）-> {文件名 -> 槽位}
+        self._files = {}
+        # 每个槽位：st_mtime_ns、st_size、标志、当前的摘要、已加载的摘要
+        self.mtime_ns = array('q')
+        self.size = array('q')
+        self.flags = bytearray()
+        self._digests = bytearray()
+        self._loaded = bytearray()
+        # 可以重新使用的槽位
+        self._free = []
+        # 每次修改加一，用于判断索引在保存之后是否发生了变化
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.flags) - len(self._free)
+
+    @staticmethod
+    def _dir_key(dirpath):
+        """
+        :param dirpath: 目录的路径
+        :return: 目录在索引中的键，与这个目录中的文件路径经过 _split() 得到的目录相同
+        """
+        return _split(os.path.join(dirpath, '_'))[0]
+
+    def directories(self):
+        """
+        :return: (目录路径, {文件名 -> 槽位}) 的迭代器，遍历期间不能修改索引
+        """
+        return iter(self._files.items())
+
+    def dir_files(self, dirpath):
+        """
+        :param dirpath: 目录的路径
+        :return: 目录中的文件：文件名 -> 槽位。返回的是索引内部的字典，同一个目录总是同一个对象，
+                 调用者不能直接修改，需要通过 set_stat() 和 remove() 等方法修改
+        """
+        key = self._dir_key(dirpath)
+        files = self._files.get(key)
+        if files is None:
+            files = self._files[sys.intern(key)] = {}
+        return files
+
+    def locate(self, path, create=False):
+        """
+        :param path: 文件路径
+        :param create: 目录不在索引中时是否创建
+        :return: (文件所在目录的 {文件名 -> 槽位}，目录不在索引中时为None, 文件名)
+        """
+        dirpath, name = _split(path)
+        files = self._files.get(dirpath)
+        if files is None and create:
+            files = self._files[sys.intern(dirpath)] = {}
+        return files, name
+
+    def slot(self, path):
+        """
+        :param path: 文件路径
+        :return: 文件的槽位，不在索引中时返回None
+        """
+        files, name = self.locate(path)
+        return None if files is None else files.get(name)
+
+    def _allocate(self, files, name):
+        """
+        :param files: 文件所在目录的 {文件名 -> 槽位}
+        :param name: 文件名
+        :return: 文件的槽位，不在索引中时分配一个新的槽位
+        """
+        slot = files.get(name)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self.flags)
+            self.mtime_ns.append(0)
+            self.size.append(0)
+            self.flags.append(0)
+            if self.digest_size:
+                self._digests.extend(bytes(self.digest_size))
+                self._loaded.extend(bytes(self.digest_size))
+        files[sys.intern(name)] = slot
+        return slot
+
+    def _clear(self, path, flag):
+        """
+        清除文件的标志，没有任何标志的文件从索引中删除
+
+        :param path: 文件路径
+        :param flag: STAT 或 LOADED
+        """
+        files, name = self.locate(path)
+        slot = None if files is None else files.get(name)
+        if slot is None:
+            return
+        self.flags[slot] &= ~flag
+        self.generation += 1
+        if not self.flags[slot]:
+            del files[name]
+            self._free.append(slot)
+
+    def has(self, slot, flag):
+        """
+        :return: 槽位是否有 STAT 或 LOADED 标志
+        """
+        return bool(self.flags[slot] & flag)
+
+    def set_stat(self, path, mtime_ns, size, digest=None):
+        """
+        记录文件的修改时间、大小和摘要
+
+        :param path: 文件路径
+        :param mtime_ns: st_mtime_ns
+        :param size: st_size
+        :param digest: 摘要，digest_size 为0时忽略
+        :return: 文件的槽位
+        """
+        return self.set_stat_in(*self.locate(path, create=True), mtime_ns, size, digest)
+
+    def set_stat_in(self, files, name, mtime_ns, size, digest=None):  # pylint: disable=too-many-arguments
+        """
+        与 set_stat() 相同，已经有文件所在目录的 dir_files() 时不需要再拆分路径
+
+        :param files: 文件所在目录的 dir_files()
+        :param name: 文件名
+        :return: 文件的槽位
+        """
+        slot = self._allocate(files, name)
+        self.mtime_ns[slot] = mtime_ns
+        self.size[slot] = size
+        self.flags[slot] |= STAT
+        self.generation += 1
+        if self.digest_size:
+            start = slot * self.digest_size
+            self._digests[start:start + self.digest_size] = digest
+        return slot
+
+    def digest(self, slot):
+        """
+        :return: 槽位的当前摘要
+        """
+        start = slot * self.digest_size
+        return bytes(self._digests[start:start + self.digest_size])
+
+    def loaded(self, path):
+        """
+        :param path: 文件路径
+        :return: 文件上一次成功加载时的摘要，没有时返回None
+        """
+        slot = self.slot(path)
+        if slot is None or not self.flags[slot] & LOADED:
+            return None
+        return self.loaded_digest(slot)
+
+    def loaded_digest(self, slot):
+        """
+        :return: 槽位已加载的摘要
+        """
+        start = slot * self.digest_size
+        return bytes(self._loaded[start:start + self.digest_size])
+
+    def set_loaded(self, path, digest):
+        """
+        记录文件上一次成功加载时的摘要
+
+        :param path: 文件路径
+        :param digest: 摘要
+        """
+        self.set_loaded_digest(self._allocate(*self.locate(path, create=True)), digest)
+
+    def set_loaded_digest(self, slot, digest):
+        """
+        记录槽位上一次成功加载时的摘要
+
+        :param slot: 文件的槽位
+        :param digest: 摘要
+        """
+        self.flags[slot] |= LOADED
+        self.generation += 1
+        start = slot * self.digest_size
+        self._loaded[start:start + self.digest_size] = digest
+
+    def clear_stat(self, path):
+        """
+        忘掉文件的修改时间、大小和摘要
+        """
+        self._clear(path, STAT)
+
+    def clear_loaded(self, path):
+        """
+        忘掉文件已加载的摘要
+        """
+        self._clear(path, LOADED)
+
+    def remove(self, path):
+        """
+        从索引中删除文件
+        """
+        self._clear(path, STAT | LOADED)
+
+    def paths(self, flag=STAT | LOADED):
+        """
+        :param flag: 只返回有这些标志之一的文件
+        :return: 文件路径的迭代器，遍历期间不能修改索引
+        """
+        flags = self.flags
+        for dirpath, files in self._files.items():
+            prefix = dirpath + os.sep
+            for name, slot in files.items():
+                if flags[slot] & flag:
+                    yield prefix + name
+
+    def paths_under(self, dirpath, flag=STAT | LOADED):
+        """
+        :param dirpath: 目录的路径
+        :param flag: 只返回有这些标志之一的文件
+        :return: 目录及其子目录中的文件路径列表
+        """
+        return [
+            key + os.sep + name
+            for key in self._dirs_under(dirpath)
+            for name, slot in self._files[key].items() if self.flags[slot] & flag
+        ]
+
+    def _dirs_under(self, dirpath):
+        """
+        :param dirpath: 目录的路径
+        :return: 目录及其子目录在索引中的键列表
+        """
+        key = self._dir_key(dirpath)
+        prefix = key + os.sep
+        return [dir_key for dir_key in self._files
+                if dir_key == key or dir_key.startswith(prefix)]
+
+    def remove_tree(self, dirpath):
+        """
+        删除目录及其子目录中的所有文件，这些目录的 dir_files() 字典也不再属于索引
+
+        :param dirpath: 目录的路径
+        :return: 被删除的文件路径列表
+        """
+        removed = self.paths_under(dirpath)
+        for path in removed:
+            self.remove(path)
+        for dir_key in self._dirs_under(dirpath):
+            del self._files[dir_key]
+        return removed
+
+    def copy(self):
+        """
+        :return: 索引的副本
+        """
+        other = FileIndex(self.root, self.digest_size)
+        # pylint: disable=protected-access
+        other._files = {key: dict(files) for key, files in self._files.items()}
+        other.mtime_ns = array('q', self.mtime_ns)
+        other.size = array('q', self.size)
+        other.flags = bytearray(self.flags)
+        other._digests = bytearray(self._digests)
+        other._loaded = bytearray(self._loaded)
+        other._free = list(self._free)
+        other.generation = self.generation
+        return other
+
+
+def index_name(root):
+    """
+    :param root: 插件目录的路径
+    :return: 这个目录的索引文件名，同一个目录总是得到同一个文件名
+    """
+    key = os.path.normcase(os.path.abspath(root)).encode('utf-8', 'surrogateescape')
+    return hashlib.blake2b(key, digest_size=8).hexdigest() + '.idx'
+
+
+def _relative(root, dirpath):
+    """
+    :return: 以 / 分隔的相对路径，根目录本身返回空字符串，不在根目录中的目录返回None
+    """
+    relpath = os.path.relpath(dirpath or os.sep, root)
+    if relpath == os.curdir:
+        return ''
+    if relpath == os.pardir or relpath.startswith(os.pardir + os.sep):
+        return None
+    return relpath.replace(os.sep, '/')
+
+
+def _encode_entry(relpath, index, slot):
+    """
+    :param relpath: 以 / 分隔的相对路径
+    :param index: FileIndex
+    :param slot: 文件的槽位
+    :return: 条目的字节
+    """
+    digest = index.digest(slot) if index.has(slot, STAT) else None
+    loaded_digest = index.loaded_digest(slot) if index.has(slot, LOADED) else None
+    flags = 0
+    if digest is not None:
+        flags |= HAS_DIGEST
+    if loaded_digest is not None:
+        flags |= HAS_LOADED | (LOADED_SAME if loaded_digest == digest else 0)
+    name = relpath.encode('utf-8', 'surrogateescape')
+    parts = [_ENTRY.pack(len(name), flags, index.size[slot], index.mtime_ns[slot]), name]
+    if digest is not None:
+        parts.append(digest)
+    if flags & HAS_LOADED and not flags & LOADED_SAME:
+        parts.append(loaded_digest)
+    return b''.join(parts)
+
+
+def save(filepath, index):
+    """
+    保存索引。先写入临时文件再替换，写入中断时旧的索引仍然完整
+
+    :param filepath: 索引文件的路径
+    :param index: FileIndex，根目录之外的文件不会保存
+    """
+    root_bytes = index.root.encode('utf-8', 'surrogateescape')
+    records = []
+    for dirpath, files in index.directories():
+        reldir = _relative(index.root, dirpath)
+        if reldir is None:
+            continue
+        records.extend(_encode_entry(f"{reldir}/{name}" if reldir else name, index, slot)
+                       for name, slot in files.items())
+    payload = b''.join([_COUNT.pack(len(root_bytes)), root_bytes,
+                        _COUNT.pack(len(records))] + records)
+
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(MAGIC + zlib.compress(payload, 6))
+        os.replace(temp_path, filepath)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _decode(data, root, digest_size):
+    """
+    解析解压后的索引数据
+
+    :return: FileIndex；索引不属于这个目录时返回None
+    """
+    (length,) = _COUNT.unpack_from(data, 0)
+    offset = _COUNT.size + length
+    if data[_COUNT.size:offset].decode('utf-8', 'surrogateescape') != root:
+        return None
+    (count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    index = FileIndex(root, digest_size)
+    for _ in range(count):
+        length, flags, size, mtime = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        path = os.path.join(root, *data[offset:offset + length]
+                            .decode('utf-8', 'surrogateescape').split('/'))
+        offset += length
+        digest = None
+        if flags & HAS_DIGEST:
+            digest = data[offset:offset + digest_size]
+            index.set_stat(path, mtime, size, digest)
+            offset += digest_size
+        if flags & LOADED_SAME:
+            index.set_loaded(path, digest)
+        elif flags & HAS_LOADED:
+            index.set_loaded(path, data[offset:offset + digest_size])
+            offset += digest_size
+    if offset != len(data):
+        raise ValueError("trailing data")
+    return index
+
+
+def load(filepath, root, digest_size):
+    """
+    读取索引
+
+    :param filepath: 索引文件的路径
+    :param root: 插件目录的路径，与索引中记录的不同时不使用这个索引
+    :param digest_size: 摘要的长度（字节）
+    :return: FileIndex；索引不存在、损坏或者不属于这个目录时返回None
+    """
+    try:
+        with open(filepath, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    try:
+        if not data.startswith(MAGIC):
+            raise ValueError("unknown file format")
+        return _decode(zlib.decompress(data[len(MAGIC):]), root, digest_size)
+    except (ValueError, KeyError, struct.error, zlib.error) as err:
+        Log.warning("ignore damaged file index %s: %s", filepath, err)
+        return None
+
+
+def diff(index, current):
+    """
+    比较索引与当前的文件
+
+    :param index: 索引中的文件：FileIndex
+    :param current: 当前的文件：文件路径 -> 摘要
+    :return: (新增的文件, 内容变化的文件, 删除的文件)，都是集合
+    """
+    added = set()
+    modified = set()
+    for path, digest in current.items():
+        slot = index.slot(path)
+        if slot is None or not index.has(slot, STAT):
+            added.add(path)
+        elif index.digest(slot) != digest:
+            modified.add(path)
+    removed = {path for path in index.paths(STAT) if path not in current}
+    return added, modified, removed
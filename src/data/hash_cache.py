@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+文件内容哈希缓存
+"""
+import hashlib
+import os
+import threading
+from stat import S_ISREG
+
+from .file_index import FileIndex, LOADED, STAT
+
+# 摘要长度（字节）
+DIGEST_SIZE = 16
+_READ_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """
+    计算文件内容的BLAKE2摘要
+
+    :param path: 文件路径
+    :return: 摘要（bytes）
+    """
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(_READ_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.digest()
+
+
+class HashCache:
+    """
+    文件内容哈希缓存。
+
+    只有文件的 st_mtime_ns 或大小变化时才重新计算摘要；同时记录上一次成功加载时每个文件的摘要，
+    用于判断文件是否真的发生了变化（保存但未修改、touch、来回切换分支都只会改变修改时间）。
+    监控线程和主线程都会访问，所有操作都在锁内进行。
+    """
+
+    def __init__(self, root=None):
+        """
+        :param root: 插件目录，其中的文件在索引中按相对路径保存
+        """
+        # 每个文件的 (st_mtime_ns, st_size, 摘要) 以及上一次成功加载时的摘要
+        self._index = FileIndex(root, DIGEST_SIZE)
+        self._lock = threading.Lock()
+        # 实际读取文件计算摘要的次数
+        self.hashed = 0
+
+    def _digest(self, path):
+        """
+        获取文件当前的摘要，修改时间和大小没有变化时直接使用缓存
+
+        :param path: 文件路径
+        :return: 摘要；文件不存在或不是普通文件时返回None
+        """
+        slot = self._slot(path)
+        return None if slot is None else self._index.digest(slot)
+
+    def _slot(self, path):
+        """
+        更新文件在索引中的修改时间、大小和摘要，修改时间和大小没有变化时不重新计算摘要
+
+        :param path: 文件路径
+        :return: 文件在索引中的槽位；文件不存在或不是普通文件时返回None
+        """
+        index = self._index
+        try:
+            stat = os.stat(path)
+        except OSError:
+            index.clear_stat(path)
+            return None
+        if not S_ISREG(stat.st_mode):
+            return None
+        files, name = index.locate(path, create=True)
+        slot = files.get(name)
+        if (slot is not None and index.has(slot, STAT) and index.mtime_ns[slot] == stat.st_mtime_ns
+                and index.size[slot] == stat.st_size):
+            return slot
+        try:
+            digest = file_digest(path)
+        except OSError:
+            index.clear_stat(path)
+            return None
+        self.hashed += 1
+        return index.set_stat_in(files, name, stat.st_mtime_ns, stat.st_size, digest)
+
+    def restore(self, index):
+        """
+        使用持久化的文件索引作为初始状态，之后 seed() 只需要为修改时间或大小变化的文件计算摘要
+
+        :param index: FileIndex，不会被修改
+        """
+        with self._lock:
+            self._index = index.copy()
+
+    @property
+    def generation(self):
+        """
+        :return: 文件索引的修改次数，没有变化时不需要重新保存
+        """
+        with self._lock:
+            return self._index.generation
+
+    def snapshot(self):
+        """
+        :return: 文件索引（FileIndex）的副本，用于保存索引
+        """
+        with self._lock:
+            return self._index.copy()
+
+    def seed(self, root, path_filter=None, stop_event=None, keep_baseline=None):
+        """
+        计算目录下所有文件的摘要，并作为已加载的基准
+
+        :param root: 目录路径
+        :param path_filter: PathFilter，被排除的目录和文件不会计算摘要
+        :param stop_event: threading.Event，设置后在当前目录之后结束
+        :param keep_baseline: 函数，参数为文件路径和当前的 st_mtime_ns（文件已经不存在时为None），
+                              返回True时保留 restore() 得到的已加载基准（没有基准的文件视为新增），
+                              而不是以当前内容为基准。为None时所有文件都以当前内容为基准
+        :return: 目录下所有文件的当前摘要：文件路径 -> 摘要；被停止时返回None
+        """
+        current = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            if stop_event is not None and stop_event.is_set():
+                return None
+            if path_filter is not None:
+                dirnames[:] = [
+                    name for name in dirnames
+                    if path_filter.accepts_dir(os.path.join(dirpath, name))
+                ]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if path_filter is not None and not path_filter.accepts_file(path):
+                    continue
+                with self._lock:
+                    slot = self._slot(path)
+                    if slot is None:
+                        continue
+                    digest = current[path] = self._index.digest(slot)
+                    if (keep_baseline is None
+                            or not keep_baseline(path, self._index.mtime_ns[slot])):
+                        self._index.set_loaded_digest(slot, digest)
+        with self._lock:
+            # 索引中已经不存在的文件：保留基准时作为删除的文件，否则忘掉
+            for path in [path for path in self._index.paths() if path not in current]:
+                self._index.clear_stat(path)
+                if keep_baseline is None or not keep_baseline(path, None):
+                    self._index.clear_loaded(path)
+        return current
+
+    def filter_changed(self, paths):
+        """
+        过滤出内容与上一次成功加载时不同的路径
+
+        :param paths: 变化的路径
+        :return: 内容确实发生变化（包括新增和删除）的路径集合
+        """
+        changed = set()
+        with self._lock:
+            for path in paths:
+                slot = self._slot(path)
+                if slot is None:
+                    digest = None
+                    loaded = self._index.loaded(path)
+                else:
+                    digest = self._index.digest(slot)
+                    loaded = (self._index.loaded_digest(slot)
+                              if self._index.has(slot, LOADED) else None)
+                if digest is None and loaded is None:
+                    # 不是普通文件：目录被删除或移动时，只要其中有已加载的文件就保留
+                    if self._index.paths_under(path, LOADED):
+                        changed.add(path)
+                    continue
+                if digest != loaded:
+                    changed.add(path)
+        return changed
+
+    def loaded_paths(self):
+        """
+        :return: 记录了已加载基准的文件路径列表，监视中断后用于找出中断期间发生变化的文件
+        """
+        with self._lock:
+            return list(self._index.paths(LOADED))
+
+    def mark_loaded(self, paths):
+        """
+        重载成功后，把这些路径当前的摘要记录为新的基准
+
+        :param paths: 已重新加载的路径
+        """
+        with self._lock:
+            for path in paths:
+                digest = self._digest(path)
+                if digest is not None:
+                    self._index.set_loaded(path, digest)
+                    continue
+                self._index.clear_loaded(path)
+                # 目录被删除或移动时，同时移除其中文件的基准
+                for loaded in self._index.paths_under(path, LOADED):
+                    if not os.path.exists(loaded):
+                        self._index.remove(loaded)
+
+    def mark_all_loaded(self):
+        """
+        完整加载后，把所有已知文件当前的摘要记录为新的基准
+        """
+        with self._lock:
+            for path in list(self._index.paths()):
+                self._index.clear_loaded(path)
+                digest = self._digest(path)
+                if digest is not None:
+                    self._index.set_loaded(path, digest)
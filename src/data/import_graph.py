@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+插件模块导入依赖图
+"""
+import builtins
+import importlib.util
+import os
+import sys
+
+# 主数据结构：标识符 -> ImportGraph
+graph_registry = {}
+
+
+def _norm_path(path):
+    """
+    规范化文件路径，用于文件路径与模块的映射
+
+    :param path: 文件路径
+    :return: 规范化后的绝对路径
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _stat_mtime_ns(path):
+    """
+    获取文件或目录的修改时间（纳秒），文件不存在时返回None
+
+    :param path: 文件或目录路径
+    :return: st_mtime_ns 或 None
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ReloadPlan:  # pylint: disable=too-few-public-methods
+    """
+    增量重载计划。
+
+    modules: 需要重新导入的模块名称，按依赖顺序排列（被依赖的模块在前）
+    changed: 直接发生变化的模块名称
+    skipped: 不受影响、可以跳过的模块名称
+    """
+
+    def __init__(self, modules, changed, skipped):
+        self.modules = modules
+        self.changed = changed
+        self.skipped = skipped
+
+
+class ImportGraph:  # pylint: disable=too-many-instance-attributes
+    """
+    记录插件内部模块之间的导入关系，以及每个模块对应的源文件。
+    导入关系在加载时通过拦截 __import__ 收集，不需要额外解析源码。
+    """
+
+    def __init__(self, package_name, package_path):
+        """
+        :param package_name: 插件包名称
+        :param package_path: 插件包路径
+        """
+        self.package_name = package_name
+        self.package_path = os.path.normpath(package_path)
+        # 模块名称 -> 加载顺序
+        self.order = {}
+        # 规范化的文件路径 -> 模块名称
+        self.file_to_module = {}
+        # 模块名称 -> (文件路径, 加载时的mtime_ns)
+        self.module_files = {}
+        # 包目录 -> 加载时的mtime_ns，用于发现新增或删除的模块文件
+        self.dir_mtimes = {}
+        # 模块名称 -> 它导入的插件内模块
+        self.imports = {}
+        # 模块名称 -> 导入它的插件内模块
+        self.importers = {}
+
+    def owns(self, module_name):
+        """
+        判断模块名称是否属于该插件
+
+        :param module_name: 模块名称
+        :return: bool
+        """
+        return (module_name == self.package_name
+                or module_name.startswith(self.package_name + '.'))
+
+    def add_module(self, module):
+        """
+        记录一个已加载的模块及其源文件的状态
+
+        :param module: 模块对象
+        """
+        name = module.__name__
+        self.order.setdefault(name, len(self.order))
+        filepath = getattr(module, '__file__', None)
+        if not filepath:
+            return
+        self.file_to_module[_norm_path(filepath)] = name
+        self.module_files[name] = (filepath, _stat_mtime_ns(filepath))
+        if os.path.basename(filepath) == '__init__.py':
+            dirpath = os.path.dirname(filepath)
+            self.dir_mtimes[dirpath] = _stat_mtime_ns(dirpath)
+
+    def add_edge(self, importer, imported):
+        """
+        记录一条导入关系
+
+        :param importer: 发起导入的模块名称
+        :param imported: 被导入的模块名称
+        """
+        if importer == imported:
+            return
+        self.imports.setdefault(importer, set()).add(imported)
+        self.importers.setdefault(imported, set()).add(importer)
+
+    def forget_imports(self, module_name):
+        """
+        清除模块的导入关系，模块重新导入时会重新记录
+
+        :param module_name: 模块名称
+        """
+        for imported in self.imports.pop(module_name, ()):
+            importers = self.importers.get(imported)
+            if importers is not None:
+                importers.discard(module_name)
+
+    def record_import(self, importer_globals, name, fromlist, level):
+        """
+        根据一次 __import__ 调用的参数记录导入关系
+
+        :param importer_globals: 发起导入的模块的全局变量
+        :param name: __import__ 的 name 参数
+        :param fromlist: __import__ 的 fromlist 参数
+        :param level: __import__ 的 level 参数
+        :return: 被导入的插件内模块名称
+        """
+        if not importer_globals:
+            return ()
+        importer = importer_globals.get('__name__')
+        if not importer or not self.owns(importer):
+            return ()
+        if level:
+            package = importer_globals.get('__package__')
+            if not package:
+                return ()
+            name = importlib.util.resolve_name('.' * level + name, package)
+        if not self.owns(name):
+            return ()
+        if not fromlist:
+            self.add_edge(importer, name)
+            return (name,)
+        imported = []
+        for attr in fromlist:
+            submodule = f"{name}.{attr}"
+            imported.append(submodule if submodule in sys.modules else name)
+            self.add_edge(importer, imported[-1])
+        return imported
+
+    def changed_modules(self, changed_paths=None):
+        """
+        找出源文件发生变化的模块
+
+        :param changed_paths: 变化的文件路径，为None时与加载时的mtime比较
+        :return: 变化的模块名称集合；无法映射到模块（如新增或删除了模块文件）时返回None
+        """
+        if changed_paths is None:
+            for dirpath, mtime in self.dir_mtimes.items():
+                if _stat_mtime_ns(dirpath) != mtime:
+                    return None
+            return {
+                name for name, (filepath, mtime) in self.module_files.items()
+                if _stat_mtime_ns(filepath) != mtime
+            }
+
+        changed = set()
+        for path in changed_paths:
+            name = self.module_of(path)
+            if name is not None:
+                changed.add(name)
+            elif path.endswith('.py') or self._contains_package(path):
+                return None
+        return changed
+
+    def module_of(self, path):
+        """
+        :param path: 文件路径
+        :return: 以该文件为源文件的模块名称，没有时返回None
+        """
+        return self.file_to_module.get(_norm_path(path))
+
+    def _contains_package(self, path):
+        """
+        判断路径是否为某个包目录或包含包目录（目录被删除、移动，或监控需要整体检查时）
+
+        :param path: 变化的路径
+        :return: bool
+        """
+        path = _norm_path(path)
+        prefix = path + os.sep
+        return any(
+            dirpath == path or dirpath.startswith(prefix)
+            for dirpath in map(_norm_path, self.dir_mtimes)
+        )
+
+    def plan_reload(self, changed_paths=None):
+        """
+        根据变化的文件生成增量重载计划
+
+        :param changed_paths: 变化的文件路径，为None时与加载时的mtime比较
+        :return: ReloadPlan；需要完整重载时返回None
+        """
+        changed = self.changed_modules(changed_paths)
+        if changed is None:
+            return None
+
+        # 收集变化的模块以及所有直接或间接导入它们的模块
+        affected = set()
+        stack = list(changed)
+        while stack:
+            name = stack.pop()
+            if name in affected:
+                continue
+            affected.add(name)
+            stack.extend(self.importers.get(name, ()))
+
+        skipped = [name for name in self.order if name not in affected]
+        return ReloadPlan(self._topological_order(affected), changed, skipped)
+
+    def _topological_order(self, names):
+        """
+        按依赖顺序排列模块，被依赖的模块在前；存在循环导入时按原加载顺序补齐
+
+        :param names: 模块名称集合
+        :return: 排序后的模块名称列表
+        """
+        load_order = sorted(names, key=lambda n: self.order.get(n, len(self.order)))
+        pending = {
+            name: len(self.imports.get(name, set()) & names) for name in load_order
+        }
+        result = []
+        ready = [name for name in load_order if pending[name] == 0]
+        while ready:
+            name = ready.pop(0)
+            result.append(name)
+            del pending[name]
+            for importer in sorted(self.importers.get(name, set()) & names,
+                                   key=lambda n: self.order.get(n, len(self.order))):
+                if importer in pending:
+                    pending[importer] -= 1
+                    if pending[importer] == 0:
+                        ready.append(importer)
+        result.extend(name for name in load_order if name in pending)
+        return result
+
+
+class ImportRecorder:
+    """
+    上下文管理器：拦截 __import__，把插件内部的导入关系记录到图中。
+    分步加载时在每个步骤中进入一次，步骤之间 __import__ 已经恢复，Blender 和其他插件的导入不会被记录。
+    """
+
+    def __init__(self, graph, on_import=None):
+        """
+        :param graph: 用于记录导入关系的 ImportGraph
+        :param on_import: 插件内模块被导入后调用，参数为模块名称
+        """
+        self.graph = graph
+        self.on_import = on_import
+        self._original_import = None
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._depth -= 1
+        if self._depth == 0:
+            builtins.__import__ = self._original_import
+        return False
+
+    def _import(self, name, globals=None, locals=None,  # pylint: disable=redefined-builtin
+                fromlist=(), level=0):
+        """
+        替代 builtins.__import__，先完成导入再记录导入关系
+        """
+        module = self._original_import(name, globals, locals, fromlist, level)
+        try:
+            imported = self.graph.record_import(globals, name, fromlist, level)
+            if self.on_import is not None:
+                for module_name in imported:
+                    self.on_import(module_name)
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+        return module
+
+
+def release_hooks():
+    """
+    恢复仍然被 ImportRecorder 替换着的 __import__，调度器在每个步骤之后调用
+
+    :return: 被恢复的钩子的名称列表
+    """
+    released = []
+    recorder = getattr(builtins.__import__, '__self__', None)
+    while isinstance(recorder, ImportRecorder):
+        # pylint: disable=protected-access
+        builtins.__import__ = recorder._original_import
+        recorder._depth = 0
+        released.append('builtins.__import__')
+        recorder = getattr(builtins.__import__, '__self__', None)
+    return released
+
+
+def new_graph(identifier, package_name, package_path):
+    """
+    为指定标识符创建新的导入图，覆盖已有的图
+
+    :param identifier: 标识符
+    :param package_name: 插件包名称
+    :param package_path: 插件包路径
+    :return: 新的 ImportGraph
+    """
+    graph = ImportGraph(package_name, package_path)
+    graph_registry[identifier] = graph
+    return graph
+
+
+def get_graph(identifier):
+    """
+    获取指定标识符的导入图
+
+    :param identifier: 标识符
+    :return: ImportGraph，不存在时返回None
+    """
+    return graph_registry.get(identifier)
+
+
+def clear_graph(identifier):
+    """
+    删除指定标识符的导入图
+
+    :param identifier: 标识符
+    """
+    graph_registry.pop(identifier, None)
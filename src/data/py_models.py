@@ -3,28 +3,123 @@
 """
 动态加载库管理
 """
-# 主数据结构：字典的值是列表
+import weakref
+
+# 主数据结构：标识符 -> ModuleRegistry
 module_registry = {}
+# 插件包名称 -> 标识符，用于根据模块名称找到所属的插件
+prefix_index = {}
+
+
+class ModuleRegistry:  # pylint: disable=too-few-public-methods
+    """
+    一个插件的模块记录。
+
+    modules: 模块名称 -> 模块的弱引用，按存储顺序排列，存储、查找和删除都是O(1)；
+    模块卸载并从 sys.modules 中删除后，记录不会让模块对象继续存活。
+    owned: 属于该插件的模块名称（有序集合），在导入时维护，卸载时不需要扫描 sys.modules。
+    """
+
+    def __init__(self):
+        self.package_name = None
+        self.modules = {}
+        self.owned = {}
+
+    def owns(self, module_name):
+        """
+        判断模块名称是否在插件包名称之下
+
+        :param module_name: 模块名称
+        :return: bool
+        """
+        prefix = self.package_name
+        return prefix is not None and (
+            module_name == prefix or module_name.startswith(prefix + '.'))
+
+
+def _get_registry(identifier):
+    """
+    获取指定标识符的记录，不存在时创建
+
+    :param identifier: 标识符
+    :return: ModuleRegistry
+    """
+    registry = module_registry.get(identifier)
+    if registry is None:
+        registry = module_registry[identifier] = ModuleRegistry()
+    return registry
+
+
+def set_package(identifier, package_name):
+    """
+    记录标识符对应的插件包名称，并更新包名称索引
+
+    :param identifier: 标识符
+    :param package_name: 插件包名称
+    """
+    registry = _get_registry(identifier)
+    if registry.package_name is not None:
+        prefix_index.pop(registry.package_name, None)
+    registry.package_name = package_name
+    prefix_index[package_name] = identifier
+
+
+def get_package_name(identifier):
+    """
+    获取标识符对应的插件包名称
+
+    :param identifier: 标识符
+    :return: 插件包名称，没有记录时返回None
+    """
+    registry = module_registry.get(identifier)
+    return registry.package_name if registry is not None else None
+
+
+def find_identifier(module_name):
+    """
+    根据模块名称找到所属插件的标识符，只查找顶层包名称，不需要遍历
+
+    :param module_name: 模块名称
+    :return: 标识符，不属于任何插件时返回None
+    """
+    return prefix_index.get(module_name.partition('.')[0])
+
+
+def own(identifier, module_name):
+    """
+    记录属于插件的模块名称，插件包名称之外的模块会被忽略
+
+    :param identifier: 标识符
+    :param module_name: 模块名称
+    """
+    registry = module_registry.get(identifier)
+    if registry is not None and module_name not in registry.owned and registry.owns(module_name):
+        registry.owned[module_name] = None
+
+
+def owned_names(identifier):
+    """
+    获取属于插件的所有模块名称
+
+    :param identifier: 标识符
+    :return: 模块名称列表，按首次导入的顺序排列
+    """
+    registry = module_registry.get(identifier)
+    return list(registry.owned) if registry is not None else []
 
 
 def store_module(identifier, module):
     """
-    存储模块对象到指定标识符的列表中
+    存储模块对象到指定标识符的记录中；同名模块已存在时替换它并移到末尾
 
     :param identifier: 用于标识模块列表的键
     :param module: 要存储的模块对象
     """
-    if identifier not in module_registry:
-        module_registry[identifier] = []
-
-    # 如果模块已存在，先移除它
-    module_registry[identifier] = [
-        m for m in module_registry[identifier]
-        if m.__name__ != module.__name__
-    ]
-
-    # 添加新模块到列表末尾
-    module_registry[identifier].append(module)
+    registry = _get_registry(identifier)
+    name = module.__name__
+    registry.modules.pop(name, None)
+    registry.modules[name] = weakref.ref(module)
+    registry.owned.setdefault(name, None)
 
 
 def get_modules(identifier):
@@ -32,23 +127,44 @@ def get_modules(identifier):
     获取指定标识符的所有模块
 
     :param identifier: 标识符
-    :return: 模块列表，如果标识符不存在则返回空列表
+    :return: 模块列表（按存储顺序），如果标识符不存在则返回空列表
+    """
+    registry = module_registry.get(identifier)
+    if registry is None:
+        return []
+    modules = []
+    for ref in registry.modules.values():
+        module = ref()
+        if module is not None:
+            modules.append(module)
+    return modules
+
+
+def get_module(identifier, module_name):
+    """
+    获取指定标识符下特定名称的模块
+
+    :param identifier: 标识符
+    :param module_name: 模块名称
+    :return: 模块对象，不存在或已被回收时返回None
     """
-    return module_registry.get(identifier, [])
+    registry = module_registry.get(identifier)
+    if registry is None:
+        return None
+    ref = registry.modules.get(module_name)
+    return ref() if ref is not None else None
 
 
 def remove_module(identifier, module_name):
     """
-    从指定标识符的列表中删除特定名称的模块
+    从指定标识符的记录中删除特定名称的模块
 
     :param identifier: 标识符
     :param module_name: 要删除的模块名称
     """
-    if identifier in module_registry:
-        module_registry[identifier] = [
-            m for m in module_registry[identifier]
-            if m.__name__ != module_name
-        ]
+    registry = module_registry.get(identifier)
+    if registry is not None:
+        registry.modules.pop(module_name, None)
 
 
 def clear_identifier(identifier):
@@ -57,13 +173,15 @@ def clear_identifier(identifier):
 
     :param identifier: 标识符
     """
-    if identifier in module_registry:
-        del module_registry[identifier]
+    registry = module_registry.pop(identifier, None)
+    if registry is not None and prefix_index.get(registry.package_name) == identifier:
+        del prefix_index[registry.package_name]
 
 
 def clear_all():
     """清空所有存储的模块"""
     module_registry.clear()
+    prefix_index.clear()
 
 #
 # # 使用示例
@@ -81,9 +199,9 @@ def clear_all():
 #
 #     # 打印存储的模块
 #     print("Stored modules:")
-#     for identifier, modules in module_registry.items():
+#     for identifier in module_registry:
 #         print(f"Identifier: {identifier}")
-#         for module in modules:
+#         for module in get_modules(identifier):
 #             print(f"  - {module.__name__}")
 #
 #     # 覆盖已存在的模块
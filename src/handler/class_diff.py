@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+类级别的注册比较：重载时只注销并重新注册定义发生变化的 bpy 类，没有变化的类保持注册
+"""
+import contextlib
+import hashlib
+import sys
+import types
+import weakref
+
+import bpy  # pylint: disable=import-error
+
+from ..util.logger import Log
+from ..util import trace
+
+# 在会话中注册的类的指纹：类 -> (指纹, 依赖的类的键)
+_fingerprints = weakref.WeakKeyDictionary()
+# 保持注册的旧类：新类 -> 仍然注册着的旧类
+_aliases = weakref.WeakKeyDictionary()
+# session: 正在进行的加载或重载的会话，跨越多个步骤；
+# active: 正在执行的步骤所属的会话，只在 step() 中不为None；depth: step() 的嵌套层数
+_state = {'session': None, 'active': None, 'depth': 0}
+# 原始的 register_class 和 unregister_class，第一次替换时保存，之后不再清除
+_originals = {}
+
+# 复制到保持注册的旧类上时跳过的属性
+_SKIPPED_ATTRIBUTES = frozenset(('__dict__', '__weakref__', '__annotations__', '__module__',
+                                 '__qualname__'))
+
+
+def class_key(cls):
+    """
+    :param cls: 类
+    :return: 在重载前后保持不变的类标识：模块名.限定名
+    """
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _code_digest(code, digest):
+    """
+    计算代码对象的摘要，不包含文件名和行号，在类的上方增删代码行不会改变摘要
+
+    :param code: 代码对象
+    :param digest: hashlib 对象
+    """
+    digest.update(code.co_code)
+    digest.update(repr((code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars,
+                        code.co_argcount, code.co_kwonlyargcount, code.co_flags)).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _code_digest(const, digest)
+        else:
+            digest.update(repr(const).encode())
+
+
+def _function_digest(function, digest):
+    """
+    计算函数的摘要：代码以及默认参数
+
+    :param function: 函数
+    :param digest: hashlib 对象
+    """
+    _code_digest(function.__code__, digest)
+    digest.update(repr((function.__defaults__, function.__kwdefaults__)).encode())
+
+
+def _describe(value, deps):  # pylint: disable=too-many-return-statements
+    """
+    把注解、bl_* 属性的值转换为稳定的字符串：类用键表示，函数用代码摘要表示，
+    bpy.props 的延迟属性展开为函数名和参数
+
+    :param value: 属性值
+    :param deps: 引用到的类的键，会被修改
+    :return: str
+    """
+    if isinstance(value, type):
+        key = class_key(value)
+        deps.add(key)
+        return f"<class {key}>"
+    if isinstance(value, types.FunctionType):
+        digest = hashlib.sha1()
+        _function_digest(value, digest)
+        return f"<function {digest.hexdigest()}>"
+    if hasattr(value, 'function') and hasattr(value, 'keywords'):
+        # bpy.props.*Property 返回的延迟属性
+        arguments = ', '.join(f"{name}={_describe(item, deps)}"
+                              for name, item in sorted(value.keywords.items()))
+        return f"{getattr(value.function, '__name__', value.function)}({arguments})"
+    if isinstance(value, (list, tuple)):
+        return '(' + ', '.join(_describe(item, deps) for item in value) + ')'
+    if isinstance(value, (set, frozenset)):
+        return '{' + ', '.join(sorted(_describe(item, deps) for item in value)) + '}'
+    if isinstance(value, dict):
+        return '{' + ', '.join(f"{_describe(name, deps)}: {_describe(item, deps)}"
+                               for name, item in value.items()) + '}'
+    return repr(value)
+
+
+def fingerprint(cls):
+    """
+    计算类的指纹：基类、文档字符串、注解（属性定义）、bl_* 属性以及所有方法的代码摘要
+
+    :param cls: 类
+    :return: (指纹, 依赖的类的键)，依赖包括基类以及注解中引用的类
+    """
+    digest = hashlib.sha1()
+    deps = set()
+    digest.update(_describe(cls.__bases__, deps).encode())
+    digest.update(repr(cls.__doc__).encode())
+    for name, value in cls.__dict__.get('__annotations__', {}).items():
+        digest.update(f"{name}: {_describe(value, deps)}\n".encode())
+    for name in sorted(cls.__dict__):
+        value = cls.__dict__[name]
+        if name.startswith('bl_'):
+            if name != 'bl_rna':
+                digest.update(f"{name} = {_describe(value, deps)}\n".encode())
+            continue
+        if isinstance(value, (staticmethod, classmethod)):
+            digest.update(type(value).__name__.encode())
+            value = value.__func__
+        if isinstance(value, types.FunctionType):
+            digest.update(f"def {name}\n".encode())
+            _function_digest(value, digest)
+        elif isinstance(value, property):
+            digest.update(f"property {name}\n".encode())
+            for accessor in (value.fget, value.fset, value.fdel):
+                if isinstance(accessor, types.FunctionType):
+                    _function_digest(accessor, digest)
+    return digest.hexdigest(), frozenset(deps)
+
+
+def _rebind(cls, target):
+    """
+    把模块（或外层类）中指向 cls 的名称改为指向 target，
+    使新模块之后通过名称访问的是真正注册着的类
+
+    :param cls: 新导入的类
+    :param target: 注册着的类
+    """
+    owner = sys.modules.get(cls.__module__)
+    parts = cls.__qualname__.split('.')
+    for part in parts[:-1]:
+        owner = getattr(owner, part, None)
+        if owner is None:
+            return
+    current = getattr(owner, parts[-1], None)
+    if (isinstance(current, type) and current is not target
+            and class_key(current) == class_key(target)):
+        setattr(owner, parts[-1], target)
+
+
+def _retarget_class_cell(value, old):
+    """
+    方法中使用 super() 或 __class__ 时，闭包中的 __class__ 指向新类；
+    改为指向保持注册的旧类，否则旧类的实例调用 super() 时会失败。同一个类的方法共用一个单元
+
+    :param value: 类字典中的值
+    :param old: 保持注册的旧类
+    """
+    if isinstance(value, (staticmethod, classmethod)):
+        value = value.__func__
+    if isinstance(value, property):
+        for accessor in (value.fget, value.fset, value.fdel):
+            _retarget_class_cell(accessor, old)
+        return
+    if isinstance(value, types.FunctionType) and '__class__' in value.__code__.co_freevars:
+        index = value.__code__.co_freevars.index('__class__')
+        value.__closure__[index].cell_contents = old
+
+
+def _adopt(old, new):
+    """
+    让保持注册的旧类使用新类的方法和属性：旧类的方法引用的是已经卸载的旧模块的全局变量
+
+    :param old: 保持注册的旧类
+    :param new: 新导入的类
+    """
+    for name, value in new.__dict__.items():
+        if name in _SKIPPED_ATTRIBUTES or name.startswith('bl_') or isinstance(value, type):
+            continue
+        _retarget_class_cell(value, old)
+        try:
+            setattr(old, name, value)
+        except (AttributeError, TypeError):
+            pass
+    _aliases[new] = old
+    _rebind(new, old)
+
+
+def _resolve_annotations(cls):
+    """
+    注解中引用了保持注册的类的新版本时，改为引用旧类，否则注册时会因为引用的类没有注册而失败
+
+    :param cls: 即将注册的类
+    """
+    annotations = cls.__dict__.get('__annotations__')
+    if not annotations:
+        return
+    for name, value in list(annotations.items()):
+        keywords = getattr(value, 'keywords', None)
+        target = keywords.get('type') if isinstance(keywords, dict) else None
+        if target is not None and target in _aliases:
+            annotations[name] = value.function(**dict(keywords, type=_aliases[target]))
+
+
+class _Session:
+    """
+    一次重载中的注册比较。
+
+    旧模块的 unregister() 注销类时只记录下来；新模块的 register() 注册同一个类时比较指纹：
+    指纹相同且依赖的类都没有重新注册时保持旧类的注册，否则注销旧类并注册新类。
+    会话结束时仍然没有被注册的旧类（已经删除的类）才真正注销。
+    """
+
+    def __init__(self):
+        # 延迟注销的旧类：键 -> 类，按注销的顺序
+        self.deferred = {}
+        # 本次会话中重新注册的类的键
+        self.replaced = set()
+        self.stats = {'classes_kept': 0, 'classes_registered': 0, 'classes_removed': 0}
+
+    def unregister(self, cls):
+        """
+        :param cls: 需要注销的类
+        :return: 是否延迟注销；不是在会话中注册的类返回False，照常注销
+        """
+        if cls not in _fingerprints:
+            return False
+        self.deferred[class_key(cls)] = cls
+        return True
+
+    def register(self, cls):
+        """
+        :param cls: 需要注册的类
+        """
+        key = class_key(cls)
+        _resolve_annotations(cls)
+        new_print, deps = fingerprint(cls)
+        old = self.deferred.pop(key, None)
+        if old is not None:
+            old_print = _fingerprints.get(old, (None, None))[0]
+            if old_print == new_print and not deps & self.replaced:
+                _adopt(old, cls)
+                self.stats['classes_kept'] += 1
+                return
+            self._unregister_dependents(key)
+            _originals['unregister'](old)
+            self.replaced.add(key)
+        _originals['register'](cls)
+        _fingerprints[cls] = (new_print, deps)
+        _rebind(cls, cls)
+        self.stats['classes_registered'] += 1
+
+    def _unregister_dependents(self, key):
+        """
+        注销依赖于该类的旧类，它们之后注册时也会重新注册
+
+        :param key: 即将重新注册的类的键
+        """
+        for other_key, other in list(self.deferred.items()):
+            if other_key in self.deferred and key in _fingerprints.get(other, (None, ()))[1]:
+                del self.deferred[other_key]
+                self._unregister_dependents(other_key)
+                _originals['unregister'](other)
+                self.replaced.add(other_key)
+
+    def flush(self):
+        """
+        注销新模块没有再注册的旧类
+        """
+        for old in self.deferred.values():
+            try:
+                _originals['unregister'](old)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                Log.warning("Failed to unregister removed class %s: %s", class_key(old), err)
+            self.stats['classes_removed'] += 1
+        self.deferred.clear()
+
+
+def _register_class(cls):
+    """
+    替换 bpy.utils.register_class：会话的步骤中交给会话比较，否则照常注册
+    """
+    active = _state['active']
+    if active is None:
+        return _originals['register'](cls)
+    return active.register(cls)
+
+
+def _unregister_class(cls):
+    """
+    替换 bpy.utils.unregister_class：新类被旧类代替时注销旧类；会话中延迟到新模块注册时再决定
+    """
+    cls = _aliases.get(cls, cls)
+    active = _state['active']
+    if active is not None and active.unregister(cls):
+        return None
+    return _originals['unregister'](cls)
+
+
+def _install():
+    """
+    替换 bpy.utils 中的注册函数
+    """
+    if not _originals:
+        _originals['register'] = bpy.utils.register_class
+        _originals['unregister'] = bpy.utils.unregister_class
+    bpy.utils.register_class = _register_class
+    bpy.utils.unregister_class = _unregister_class
+
+
+def uninstall():
+    """
+    恢复 bpy.utils 中原来的注册函数，每个步骤结束时以及本插件注销时调用。
+    插件模块中已经导入的替换函数在步骤之外与原来的函数行为相同（只把被代替的新类换成旧类）
+    """
+    if not _originals:
+        return
+    if bpy.utils.register_class is _register_class:
+        bpy.utils.register_class = _originals['register']
+    if bpy.utils.unregister_class is _unregister_class:
+        bpy.utils.unregister_class = _originals['unregister']
+
+
+def release_hooks():
+    """
+    恢复仍然被替换着的注册函数，调度器在每个步骤之后调用
+
+    :return: 被恢复的钩子的名称列表
+    """
+    if (bpy.utils.register_class is not _register_class
+            and bpy.utils.unregister_class is not _unregister_class):
+        return []
+    _state['active'] = None
+    _state['depth'] = 0
+    uninstall()
+    return ['bpy.utils.register_class']
+
+
+def refresh(module):
+    """
+    模块中的方法被热补丁替换后，重新计算其中已注册类的指纹，否则下次重载时它们会被当作发生了变化
+
+    :param module: 被热补丁的模块
+    """
+    for value in list(vars(module).values()):
+        if isinstance(value, type) and value in _fingerprints:
+            _fingerprints[value] = fingerprint(value)
+
+
+def kept_classes():
+    """
+    :return: 当前保持注册的旧类，泄漏检查时它们不算泄漏
+    """
+    return set(_aliases.values())
+
+
+@contextlib.contextmanager
+def step():
+    """
+    执行加载或重载的一个同步步骤（导入、注册或注销一个模块）：只在步骤期间替换 bpy.utils 中的注册函数，
+    步骤之间界面和其他插件调用的总是原来的函数，其他插件注册的类不会被计算指纹或延迟注销。
+    没有会话时只把被代替的新类换成旧类，例如卸载保持注册的类
+
+    :return: 上下文管理器
+    """
+    if _state['depth']:
+        _state['depth'] += 1
+        try:
+            yield
+        finally:
+            _state['depth'] -= 1
+        return
+    _install()
+    _state['active'] = _state['session']
+    _state['depth'] = 1
+    try:
+        yield
+    finally:
+        _state['depth'] = 0
+        _state['active'] = None
+        uninstall()
+
+
+@contextlib.contextmanager
+def session():
+    """
+    在一次加载或重载期间比较类的注册。会话跨越多个步骤，只在 step() 中生效。
+    嵌套使用时只有最外层生效，例如完整重载的会话包含卸载和加载两个阶段
+
+    :return: 上下文管理器
+    """
+    if _state['session'] is not None:
+        yield _state['session']
+        return
+    current = _state['session'] = _Session()
+    try:
+        yield current
+    finally:
+        _state['session'] = None
+        with trace.span('flush classes', 'unregister'):
+            current.flush()
+        reload_trace = trace.current()
+        if reload_trace is not None:
+            for name, value in current.stats.items():
+                if value:
+                    reload_trace.count(name, value)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+开发插件专用的 sys.meta_path 查找器：只负责插件包名称之下的模块，不修改 sys.path
+"""
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+# 按 FileFinder 的顺序查找的模块文件后缀：扩展模块在源文件之前
+_LOADERS = (
+    [(suffix, importlib.machinery.ExtensionFileLoader)
+     for suffix in importlib.machinery.EXTENSION_SUFFIXES]
+    + [(suffix, importlib.machinery.SourceFileLoader)
+       for suffix in importlib.machinery.SOURCE_SUFFIXES]
+)
+
+# 已安装的查找器：标识符 -> DevPluginFinder
+finders = {}
+
+
+class DevPluginFinder:
+    """
+    查找插件包及其子模块的查找器，作用范围只限于插件的根目录。
+
+    把插件的父目录加入 sys.path 后，Blender 中之后的每次导入（包括其他插件的导入）
+    都要在开发目录中多做几次 stat；这个查找器只处理以插件包名称开头的模块，其他导入直接跳过。
+    目录列表会被缓存，文件变化时根据监控到的变化集合只让相关目录的缓存失效。
+    """
+
+    def __init__(self, package_name, package_path, on_find=None):
+        """
+        :param package_name: 插件包名称
+        :param package_path: 插件包的路径
+        :param on_find: 找到模块时调用的函数，参数为模块名，用于记录插件拥有的模块
+        :raises ValueError: 插件包名称为空
+        """
+        if not package_name:
+            raise ValueError(f"plugin package name is empty for {package_path!r}")
+        self.package_name = package_name
+        self.package_path = os.path.normpath(package_path)
+        self.on_find = on_find
+        # 目录路径 -> {名称: 是否为目录}
+        self._listings = {}
+
+    def _listing(self, dirpath):
+        """
+        获取目录的内容，第一次访问时列出目录并缓存
+
+        :param dirpath: 目录路径
+        :return: {名称: 是否为目录}，目录不存在时为空字典
+        """
+        listing = self._listings.get(dirpath)
+        if listing is None:
+            listing = {}
+            try:
+                with os.scandir(dirpath) as entries:
+                    for entry in entries:
+                        try:
+                            listing[entry.name] = entry.is_dir()
+                        except OSError:
+                            listing[entry.name] = False
+            except OSError:
+                pass
+            self._listings[dirpath] = listing
+        return listing
+
+    def find_spec(self, fullname, path=None, target=None):  # pylint: disable=unused-argument
+        """
+        :param fullname: 模块名
+        :return: ModuleSpec；不属于插件或模块不存在时返回None，交给其他查找器
+        """
+        if not self.package_name:
+            return None
+        if fullname == self.package_name:
+            parent_dir = os.path.dirname(self.package_path)
+            name = os.path.basename(self.package_path)
+        elif fullname.startswith(self.package_name + '.'):
+            parts = fullname.split('.')[1:]
+            parent_dir = os.path.join(self.package_path, *parts[:-1])
+            name = parts[-1]
+        else:
+            return None
+        spec = self._find_in(parent_dir, name, fullname)
+        if spec is not None and self.on_find is not None:
+            self.on_find(fullname)
+        return spec
+
+    def _find_in(self, parent_dir, name, fullname):
+        """
+        按 FileFinder 的规则在目录中查找模块：常规包、模块文件、命名空间包
+
+        :param parent_dir: 模块所在的目录
+        :param name: 模块名的最后一部分
+        :param fullname: 完整的模块名
+        :return: ModuleSpec 或 None
+        """
+        listing = self._listing(parent_dir)
+        is_dir = listing.get(name)
+        dirpath = os.path.join(parent_dir, name)
+        if is_dir and self._listing(dirpath).get('__init__.py') is False:
+            return importlib.util.spec_from_file_location(
+                fullname, os.path.join(dirpath, '__init__.py'),
+                submodule_search_locations=[dirpath])
+        for suffix, loader in _LOADERS:
+            if listing.get(name + suffix) is False:
+                filepath = os.path.join(parent_dir, name + suffix)
+                return importlib.util.spec_from_file_location(
+                    fullname, filepath, loader=loader(fullname, filepath))
+        if is_dir:
+            spec = importlib.machinery.ModuleSpec(fullname, None, is_package=True)
+            spec.submodule_search_locations = [dirpath]
+            return spec
+        return None
+
+    def invalidate(self, paths=None):
+        """
+        让变化的文件所在目录及其上级目录的列表缓存失效
+
+        :param paths: 变化的文件或目录路径，为None时清空所有缓存
+        """
+        if paths is None:
+            self._listings.clear()
+            return
+        root = self.package_path
+        for path in paths:
+            path = os.path.normpath(path)
+            if path == root:
+                # 根目录本身发生变化（如事件队列溢出）时无法知道哪些目录变了，全部重新读取
+                self._listings.clear()
+                return
+            if not path.startswith(root + os.sep):
+                continue
+            self._listings.pop(path, None)
+            while path != root:
+                path = os.path.dirname(path)
+                self._listings.pop(path, None)
+
+    def invalidate_caches(self):
+        """
+        importlib.invalidate_caches() 会调用此方法，清空所有列表缓存
+        """
+        self._listings.clear()
+
+
+def install(identifier, package_name, package_path, on_find=None):
+    """
+    为插件安装查找器，同一个标识符之前的查找器会被替换
+
+    :param identifier: 插件槽位的标识符
+    :param package_name: 插件包名称
+    :param package_path: 插件包的路径
+    :param on_find: 找到模块时调用的函数，参数为模块名
+    :return: DevPluginFinder
+    :raises ValueError: 插件包名称为空，这时不会安装查找器
+    """
+    finder = DevPluginFinder(package_name, package_path, on_find)
+    uninstall(identifier)
+    finders[identifier] = finder
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def uninstall(identifier):
+    """
+    移除插件的查找器
+
+    :param identifier: 插件槽位的标识符
+    """
+    finder = finders.pop(identifier, None)
+    if finder is not None and finder in sys.meta_path:
+        sys.meta_path.remove(finder)
+
+
+def invalidate(identifier, paths=None):
+    """
+    让插件查找器中与变化的文件相关的目录列表缓存失效
+
+    :param identifier: 插件槽位的标识符
+    :param paths: 变化的文件路径，为None时清空所有缓存
+    """
+    finder = finders.get(identifier)
+    if finder is not None:
+        finder.invalidate(paths)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+增量目录扫描器：供轮询后端使用
+"""
+import os
+import time
+
+from ..data.file_index import FileIndex
+
+# 目录修改时间距离扫描开始不足该时长时，下一次扫描仍然重新列出该目录，
+# 避免在同一个时间戳精度内发生的新增/删除被漏掉
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+class DirNode:  # pylint: disable=too-few-public-methods
+    """
+    目录树中的一个目录节点。
+
+    files: 文件名 -> 扫描器的 FileIndex 中的槽位（索引内部的字典）
+    dirs: 子目录名 -> DirNode
+    """
+    __slots__ = ('path', 'mtime_ns', 'files', 'dirs')
+
+    def __init__(self, path, index):
+        """
+        :param path: 目录路径
+        :param index: 保存文件修改时间和大小的 FileIndex
+        """
+        self.path = path
+        self.mtime_ns = None
+        self.files = index.dir_files(path)
+        self.dirs = {}
+
+
+class DirScanner:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    基于 os.scandir 的增量扫描器。
+
+    扫描器保存一棵目录节点树：目录的修改时间没有变化时，说明其中没有新增或删除条目，
+    只需要检查已知文件的 st_mtime_ns 和 st_size，不需要重新列出目录；
+    只有修改时间变化的目录才会重新列出并与上一次的结果比较。
+    文件的修改时间和大小保存在紧凑的 FileIndex 中，空闲时的扫描不为每个文件分配新的对象。
+    """
+
+    def __init__(self, path, path_filter=None, stop_event=None):
+        """
+        :param path: 需要扫描的根目录
+        :param path_filter: PathFilter，被排除的目录不会被列出，被排除的文件不会被检查
+        :param stop_event: threading.Event，设置后扫描在当前目录之后结束，
+                           只用于停止监视，之后不会再使用这个扫描器
+        """
+        self.path = path
+        self.path_filter = path_filter
+        self.stop_event = stop_event
+        self.index = FileIndex(path)
+        self.root = DirNode(path, self.index)
+        # 最近一次扫描的统计信息
+        self.stats = {}
+        self._initialized = False
+        self._scan_start_ns = 0
+
+    def scan(self):
+        """
+        扫描一次目录树，返回自上次扫描以来新增、修改或删除的文件路径。
+        第一次扫描只建立目录树，不返回任何变化。
+
+        :return: 变化的文件路径集合
+        """
+        start = time.perf_counter()
+        self._scan_start_ns = time.time_ns()
+        changed = set()
+        counters = {'dirs_listed': 0, 'dirs_skipped': 0, 'files_checked': 0}
+        try:
+            self._scan_node(self.root, changed, counters)
+        except FileNotFoundError:
+            # 根目录不存在时丢弃目录树，目录恢复后其中的文件都会作为新增文件返回
+            self.index = FileIndex(self.path)
+            self.root = DirNode(self.path, self.index)
+            raise
+        finally:
+            counters['scan_ms'] = (time.perf_counter() - start) * 1000.0
+            counters['changed'] = len(changed)
+            self.stats = counters
+        if not self._initialized:
+            self._initialized = True
+            return set()
+        return changed
+
+    def _scan_node(self, node, changed, counters):
+        """
+        扫描单个目录节点并递归扫描子目录
+
+        :param node: DirNode
+        :param changed: 收集变化文件路径的集合
+        :param counters: 统计信息
+        """
+        if self.stop_event is not None and self.stop_event.is_set():
+            return
+        mtime_ns = os.stat(node.path).st_mtime_ns
+        if mtime_ns != node.mtime_ns:
+            counters['dirs_listed'] += 1
+            self._relist(node, changed, counters)
+            if mtime_ns >= self._scan_start_ns - RACY_WINDOW_NS:
+                # 修改时间太新，下次扫描仍然重新列出
+                node.mtime_ns = None
+            else:
+                node.mtime_ns = mtime_ns
+        else:
+            counters['dirs_skipped'] += 1
+            self._check_files(node, changed, counters)
+
+        for name, child in list(node.dirs.items()):
+            try:
+                self._scan_node(child, changed, counters)
+            except FileNotFoundError:
+                changed.update(self.index.remove_tree(child.path))
+                del node.dirs[name]
+
+    def _relist(self, node, changed, counters):
+        """
+        重新列出目录，比较新增、修改和删除的文件以及新增和删除的子目录
+
+        :param node: DirNode
+        :param changed: 收集变化文件路径的集合
+        :param counters: 统计信息
+        """
+        index = self.index
+        names, dir_names = self._list_dir(node, changed)
+        counters['files_checked'] += len(names)
+
+        for name in node.files.keys() - names:
+            filepath = os.path.join(node.path, name)
+            index.remove(filepath)
+            changed.add(filepath)
+
+        for name in node.dirs.keys() - dir_names:
+            changed.update(index.remove_tree(node.dirs.pop(name).path))
+        for name in dir_names - node.dirs.keys():
+            # 新目录中的文件在递归扫描时会作为新增文件返回
+            node.dirs[name] = DirNode(os.path.join(node.path, name), index)
+
+    def _list_dir(self, node, changed):
+        """
+        列出目录，记录文件的修改时间和大小，新增和修改的文件加入 changed
+
+        :param node: DirNode
+        :param changed: 收集变化文件路径的集合
+        :return: (文件名集合, 子目录名集合)
+        """
+        index = self.index
+        files = node.files
+        names = set()
+        dir_names = set()
+        path_filter = self.path_filter
+        with os.scandir(node.path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if path_filter is None or path_filter.accepts_dir(entry.path):
+                            dir_names.add(entry.name)
+                    elif entry.is_file():
+                        if path_filter is not None and not path_filter.accepts_file(entry.path):
+                            continue
+                        stat = entry.stat()
+                        names.add(entry.name)
+                        slot = files.get(entry.name)
+                        if (slot is None or index.mtime_ns[slot] != stat.st_mtime_ns
+                                or index.size[slot] != stat.st_size):
+                            index.set_stat_in(files, entry.name, stat.st_mtime_ns, stat.st_size)
+                            changed.add(entry.path)
+                except OSError:
+                    continue
+        return names, dir_names
+
+    def _check_files(self, node, changed, counters):
+        """
+        目录没有新增或删除条目时，只检查已知文件的修改时间和大小
+
+        :param node: DirNode
+        :param changed: 收集变化文件路径的集合
+        :param counters: 统计信息
+        """
+        mtimes = self.index.mtime_ns
+        sizes = self.index.size
+        removed = []
+        for name, slot in node.files.items():
+            filepath = os.path.join(node.path, name)
+            counters['files_checked'] += 1
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                removed.append(filepath)
+                continue
+            if stat.st_mtime_ns != mtimes[slot] or stat.st_size != sizes[slot]:
+                mtimes[slot] = stat.st_mtime_ns
+                sizes[slot] = stat.st_size
+                changed.add(filepath)
+        for filepath in removed:
+            self.index.remove(filepath)
+            changed.add(filepath)
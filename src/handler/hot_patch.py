@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+可选的热补丁重载：只有函数体发生变化时，直接替换已有函数对象的 __code__，不卸载模块也不重新注册类
+"""
+import ast
+import hashlib
+import inspect
+import os
+import sys
+import types
+
+import bpy  # pylint: disable=import-error
+
+from ..data import import_graph as ig
+from ..util.logger import Log
+from . import precompiler
+
+_state = {'enabled': False}
+# 已加载模块的结构摘要：源文件路径 -> (加载时源文件的 mtime_ns, 摘要)
+_skeletons = {}
+
+
+def set_enabled(enabled):
+    """
+    开启或关闭热补丁。开启时在线程池中记录所有已加载插件的模块结构，作为之后比较的基准
+
+    :param enabled: 是否开启
+    """
+    _state['enabled'] = enabled
+    if not enabled:
+        _skeletons.clear()
+        return
+    for graph in list(ig.graph_registry.values()):
+        remember(graph)
+
+
+def is_enabled():
+    """
+    按当前场景的设置开启或关闭热补丁。设置在使用时读取，打开文件或注册插件之后不需要另外同步；
+    刚开启时变化的文件还没有基准，这次仍然照常重载
+
+    :return: 是否开启了热补丁
+    """
+    enabled = getattr(getattr(bpy.context, 'scene', None), 'hot_patch_enabled', None)
+    if enabled is not None and enabled != _state['enabled']:
+        set_enabled(enabled)
+    return _state['enabled']
+
+
+def _skeleton(tree):
+    """
+    计算模块的结构摘要：去掉函数体（包括文档字符串）之后的语法树，不包含行号。
+    函数签名、装饰器、类的属性定义以及模块级的语句变化时摘要都会变化
+
+    :param tree: ast.Module，函数体会被清空
+    :return: (摘要, {限定名: [文档字符串, ...]})，同名函数按在源码中的顺序排列
+    """
+    docs = {}
+    stack = [(tree, '')]
+    while stack:
+        node, prefix = stack.pop()
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                docs.setdefault(prefix + child.name, []).append(
+                    ast.get_docstring(child, clean=False))
+                child.body = []
+            elif isinstance(child, ast.ClassDef):
+                stack.append((child, f"{prefix}{child.name}."))
+            elif not isinstance(child, ast.expr):
+                # if、try、with 等语句中定义的函数仍然属于同一个作用域
+                stack.append((child, prefix))
+    digest = hashlib.sha1(ast.dump(tree).encode()).hexdigest()
+    return digest, docs
+
+
+def _read_source(filepath):
+    """
+    :param filepath: 源文件路径
+    :return: (读取前的 mtime_ns, 源码字节)；读取期间文件被修改时返回None
+    """
+    mtime = os.stat(filepath).st_mtime_ns
+    with open(filepath, 'rb') as file:
+        source = file.read()
+    if os.stat(filepath).st_mtime_ns != mtime:
+        return None
+    return mtime, source
+
+
+def _remember_file(filepath, loaded_mtime):
+    """
+    在工作线程中记录模块的结构摘要。源文件在加载之后已经被修改时不记录，这个模块之后会照常重载
+
+    :param filepath: 源文件路径
+    :param loaded_mtime: 模块加载时源文件的 mtime_ns
+    """
+    try:
+        read = _read_source(filepath)
+        if read is None or read[0] != loaded_mtime:
+            return
+        _skeletons[filepath] = (loaded_mtime, _skeleton(ast.parse(read[1], filepath))[0])
+    except (OSError, SyntaxError, ValueError) as err:
+        Log.debug("hot patch baseline skipped %s: %s", filepath, err)
+
+
+def remember(graph, module_names=None):
+    """
+    加载或重载完成后，在线程池中记录模块的结构摘要，未开启热补丁时什么都不做
+
+    :param graph: 插件的 ImportGraph
+    :param module_names: 需要记录的模块名称，为None时记录插件的所有模块
+    """
+    if not is_enabled():
+        return
+    names = graph.module_files if module_names is None else module_names
+    executor = precompiler.get_executor()
+    for name in names:
+        entry = graph.module_files.get(name)
+        if entry is not None and entry[0].endswith('.py'):
+            executor.submit(_remember_file, *entry)
+
+
+def forget(graph):
+    """
+    插件卸载时删除它的模块结构摘要
+
+    :param graph: 插件的 ImportGraph
+    """
+    for filepath, _ in graph.module_files.values():
+        _skeletons.pop(filepath, None)
+
+
+def _collect_codes(code, prefix, codes):
+    """
+    收集模块或类体代码中定义的函数的代码对象，类体按类名继续收集
+
+    :param code: 模块或类体的代码对象
+    :param prefix: 限定名的前缀
+    :param codes: 限定名 -> 代码对象列表，会被修改
+    """
+    for const in code.co_consts:
+        if not isinstance(const, types.CodeType) or const.co_name.startswith('<'):
+            continue
+        if const.co_flags & inspect.CO_NEWLOCALS:  # pylint: disable=no-member
+            codes.setdefault(prefix + const.co_name, []).append(const)
+        else:
+            _collect_codes(const, f"{prefix}{const.co_name}.", codes)
+
+
+class ModulePatch:  # pylint: disable=too-few-public-methods
+    """
+    一个模块的补丁：新源码编译出的函数代码对象，以及新的结构基准
+    """
+
+    def __init__(self, module_name, filepath, mtime, digest, codes):  # pylint: disable=too-many-arguments
+        """
+        :param module_name: 模块名
+        :param filepath: 源文件路径
+        :param mtime: 读取源文件时的 mtime_ns
+        :param digest: 新源码的结构摘要
+        :param codes: 限定名 -> [(代码对象, 文档字符串), ...]，按在源码中的顺序排列
+        """
+        self.module_name = module_name
+        self.filepath = filepath
+        self.mtime = mtime
+        self.digest = digest
+        self.codes = codes
+
+
+def _prepare_module(module_name, filepath, baseline):
+    """
+    在工作线程中读取并编译变化的模块，与加载时的结构摘要比较
+
+    :param module_name: 模块名
+    :param filepath: 源文件路径
+    :param baseline: 加载时的结构摘要
+    :return: ModulePatch；结构发生变化时返回None
+    """
+    read = _read_source(filepath)
+    if read is None:
+        return None
+    mtime, source = read
+    tree = ast.parse(source, filepath)
+    code = compile(tree, filepath, 'exec', dont_inherit=True)
+    digest, docs = _skeleton(tree)
+    if digest != baseline:
+        Log.info("Hot patch not possible for '%s': more than function bodies changed.",
+                 module_name)
+        return None
+    found = {}
+    _collect_codes(code, '', found)
+    if found.keys() != docs.keys():
+        # 有函数不在模块或类体的代码中（如类型参数作用域），无法对应到函数对象
+        return None
+    codes = {}
+    for qualname, items in found.items():
+        items.sort(key=lambda item: item.co_firstlineno)
+        if len(items) != len(docs[qualname]):
+            return None
+        codes[qualname] = list(zip(items, docs[qualname]))
+    return ModulePatch(module_name, filepath, mtime, digest, codes)
+
+
+def _prepare(entries):
+    """
+    在工作线程中准备所有变化的模块的补丁
+
+    :param entries: [(模块名, 源文件路径, 加载时的结构摘要), ...]
+    :return: ModulePatch 列表；有任何一个模块不能热补丁时返回None
+    """
+    patches = []
+    for module_name, filepath, baseline in entries:
+        try:
+            patch = _prepare_module(module_name, filepath, baseline)
+        except (OSError, SyntaxError, ValueError) as err:
+            # 语法错误在照常重载时会再次出现并报告
+            Log.info("Hot patch not possible for '%s': %s", module_name, err)
+            return None
+        if patch is None:
+            return None
+        patches.append(patch)
+    return patches
+
+
+def prepare(graph, module_names):
+    """
+    开始准备热补丁：只有所有变化的模块都记录过加载时的结构摘要，才在线程池中读取并比较新的源码
+
+    :param graph: 插件的 ImportGraph
+    :param module_names: 源文件发生变化的模块名称
+    :return: 结果为 ModulePatch 列表或None的 Future；未开启或无法热补丁时返回None
+    """
+    if not is_enabled() or not module_names:
+        return None
+    entries = []
+    for name in module_names:
+        filepath, loaded_mtime = graph.module_files.get(name, (None, None))
+        baseline = _skeletons.get(filepath)
+        if baseline is None or baseline[0] != loaded_mtime:
+            return None
+        entries.append((name, filepath, baseline[1]))
+    return precompiler.get_executor().submit(_prepare, entries)
+
+
+def _live_functions(module):
+    """
+    找出模块中定义的所有函数对象：模块级函数、类（包括嵌套类）中的方法、静态方法、类方法、
+    property 的访问函数，以及 functools.wraps 包装的原函数
+
+    :param module: 模块对象
+    :return: 限定名 -> 函数列表，按旧代码的行号排列
+    """
+    found = {}
+    seen = set()
+    name = module.__name__
+
+    def add(value):
+        if isinstance(value, (staticmethod, classmethod)):
+            value = value.__func__
+        if isinstance(value, property):
+            for accessor in (value.fget, value.fset, value.fdel):
+                add(accessor)
+            return
+        while isinstance(value, types.FunctionType):
+            # functools.wraps 会把原函数的限定名复制到包装函数上，包装函数的代码名称与限定名不一致
+            if (id(value) not in seen and value.__module__ == name
+                    and value.__qualname__.rpartition('.')[2] == value.__code__.co_name):
+                seen.add(id(value))
+                found.setdefault(value.__qualname__, []).append(value)
+            value = getattr(value, '__wrapped__', None)
+
+    classes = []
+    for value in list(vars(module).values()):
+        if isinstance(value, type) and value.__module__ == name:
+            classes.append(value)
+        else:
+            add(value)
+    while classes:
+        cls = classes.pop()
+        if id(cls) in seen:
+            continue
+        seen.add(id(cls))
+        for value in list(vars(cls).values()):
+            if isinstance(value, type) and value.__qualname__.startswith(cls.__qualname__ + '.'):
+                classes.append(value)
+            else:
+                add(value)
+    for functions in found.values():
+        functions.sort(key=lambda function: function.__code__.co_firstlineno)
+    return found
+
+
+def apply(patches):
+    """
+    在主线程中替换函数的代码对象。先检查所有函数都能找到对应的旧函数对象并且闭包变量相同，
+    检查全部通过后才修改，不会只替换一部分
+
+    :param patches: prepare() 的结果
+    :return: 替换的函数数量；找不到对应的函数对象或闭包变量不同时返回None，需要照常重载
+    """
+    changes = []
+    for patch in patches:
+        module = sys.modules.get(patch.module_name)
+        if module is None:
+            return None
+        live = _live_functions(module)
+        for qualname, items in patch.codes.items():
+            functions = live.get(qualname, ())
+            if len(functions) != len(items):
+                Log.info("Hot patch not possible for '%s': cannot find %s.",
+                         patch.module_name, qualname)
+                return None
+            for function, (code, doc) in zip(functions, items):
+                if function.__code__.co_freevars != code.co_freevars:
+                    Log.info("Hot patch not possible for '%s': closure of %s changed.",
+                             patch.module_name, qualname)
+                    return None
+                changes.append((function, code, doc))
+    for function, code, doc in changes:
+        function.__code__ = code
+        function.__doc__ = doc
+    for patch in patches:
+        _skeletons[patch.filepath] = (patch.mtime, patch.digest)
+    return len(changes)
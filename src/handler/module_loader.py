@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+两阶段加载：在线程池中读取、解码并编译模块（或读取 .pyc），主线程只执行准备好的代码对象
+"""
+import contextlib
+import importlib.machinery
+import importlib.util
+import inspect
+import os
+import sys
+import threading
+import time
+
+from . import precompiler
+from ..util import trace
+
+
+# 主线程等待某个模块的代码对象准备完成时，调度器检查的间隔（秒）
+PREPARE_POLL_INTERVAL = 0.005
+# 加载子模块时默认不进入的目录
+DEFAULT_EXCLUDE_DIRS = ('.venv',)
+
+
+def is_package(path):
+    """
+    判断指定路径是否为一个插件包
+
+    参数:
+    path (str): 需要判断的路径
+
+    返回:
+    bool: 如果路径是一个插件包则返回True，否则返回False
+    """
+    return os.path.isdir(path) and '__init__.py' in os.listdir(path)
+
+
+def iter_modules(path):
+    """
+    列出目录中的模块和子包，规则与 pkgutil.iter_modules 相同，但不会在 sys.path_importer_cache
+    中为开发目录创建条目；子包不会递归列出
+
+    参数:
+    path (str): 目录路径
+
+    返回:
+    迭代器，元素为 (模块名, 是否为包)，按文件名排序
+    """
+    try:
+        filenames = sorted(os.listdir(path))
+    except OSError:
+        return
+    yielded = set()
+    for filename in filenames:
+        module_name = inspect.getmodulename(filename)
+        if module_name == '__init__' or module_name in yielded:
+            continue
+        is_pkg = False
+        if not module_name and '.' not in filename and is_package(os.path.join(path, filename)):
+            module_name, is_pkg = filename, True
+        if module_name and '.' not in module_name:
+            yielded.add(module_name)
+            yield module_name, is_pkg
+
+
+def is_excluded(path, exclude_dirs):
+    """
+    :param path: 子包的路径
+    :param exclude_dirs: 需要排除的目录列表，路径中包含其中任何一项时不进入
+    :return: 是否不进入该子包
+    """
+    return any(sub_dir in path for sub_dir in exclude_dirs)
+
+
+def walk_modules(package_path, package_name, exclude_dirs=DEFAULT_EXCLUDE_DIRS):
+    """
+    按加载子模块的顺序递归列出插件包中的模块，但不导入任何模块。
+    被排除的子包本身会被导入，但不进入它的目录
+
+    :param package_path: 插件包的路径
+    :param package_name: 插件包的名称
+    :param exclude_dirs: 需要排除的目录列表
+    :return: 迭代器，元素为 (模块名, 路径, 是否为包)，路径为模块文件或子包目录，父包在子模块之前
+    """
+    for module_name, is_pkg in iter_modules(package_path):
+        path = os.path.join(package_path, module_name)
+        full_name = f"{package_name}.{module_name}"
+        yield full_name, path, is_pkg
+        if is_pkg and not is_excluded(path, exclude_dirs):
+            yield from walk_modules(path, full_name, exclude_dirs)
+
+
+def discover_modules(package_path, package_name, exclude_dirs=DEFAULT_EXCLUDE_DIRS):
+    """
+    列出加载时会导入的、有源文件的模块，与 walk_modules() 的范围和顺序相同
+
+    :param package_path: 插件包的路径
+    :param package_name: 插件包的名称
+    :param exclude_dirs: 需要排除的目录列表
+    :return: 模块名 -> 源文件路径；没有 .py 源文件的模块（如扩展模块）按常规方式导入
+    """
+    modules = {package_name: os.path.join(package_path, '__init__.py')}
+    for full_name, path, is_pkg in walk_modules(package_path, package_name, exclude_dirs):
+        source_path = os.path.join(path, '__init__.py') if is_pkg else path + '.py'
+        if os.path.isfile(source_path):
+            modules[full_name] = source_path
+    return modules
+
+
+def _read_code(module_name, source_path):
+    """
+    在工作线程中准备模块的代码对象：.pyc 有效时读取并反序列化，否则读取源文件并编译（同时写入 .pyc）
+
+    :param module_name: 模块名
+    :param source_path: 源文件路径
+    :return: (代码对象, .pyc 是否命中, 开始时间, 结束时间, 线程名)
+    """
+    start = time.perf_counter()
+    hit = precompiler.is_cache_fresh(source_path)
+    code = importlib.machinery.SourceFileLoader(module_name, source_path).get_code(module_name)
+    return code, hit, start, time.perf_counter(), threading.current_thread().name
+
+
+class PreparedLoader(importlib.machinery.SourceFileLoader):
+    """
+    get_code() 直接返回在工作线程中准备好的代码对象，其余行为与 SourceFileLoader 相同
+    """
+
+    def __init__(self, fullname, path, code):
+        """
+        :param fullname: 模块名
+        :param path: 源文件路径
+        :param code: 准备好的代码对象，为None时在主线程中按常规方式读取
+        """
+        super().__init__(fullname, path)
+        self._code = code
+
+    def get_code(self, fullname):
+        code, self._code = self._code, None
+        if code is not None and fullname == self.name:
+            return code
+        return super().get_code(fullname)
+
+
+class PreparedFinder:
+    """
+    只负责已经提交准备的模块的查找器，只在加载或重载的每个步骤中通过 installed() 放在 sys.meta_path 最前面。
+
+    创建时把所有模块提交到线程池，按提交顺序（依赖顺序）准备；
+    分步导入每个模块之前通过 is_ready() 让出主线程等待该模块的代码对象（导入期间被间接导入的模块在 find_spec 中等待），
+    所以执行前面的模块时后面的模块仍在并行准备。
+    准备失败（如语法错误）的模块交给 SourceFileLoader 在主线程中重新读取，错误会照常抛出。
+    """
+
+    def __init__(self, modules):
+        """
+        :param modules: 模块名 -> 源文件路径，按导入顺序排列
+        """
+        executor = precompiler.get_executor()
+        self._entries = {
+            name: (path, executor.submit(_read_code, name, path))
+            for name, path in modules.items()
+        }
+
+    def is_ready(self, fullname):
+        """
+        :param fullname: 模块名
+        :return: 该模块的代码对象是否已经准备完成；不由这个查找器准备的模块总是返回True
+        """
+        entry = self._entries.get(fullname)
+        return entry is None or entry[1].done()
+
+    def refresh(self, fullname):
+        """
+        源文件在准备之后又发生了变化时重新准备，只对还没有被导入的模块有效
+
+        :param fullname: 模块名
+        :return: 是否重新提交了准备
+        """
+        entry = self._entries.get(fullname)
+        if entry is None:
+            return False
+        source_path, future = entry
+        future.cancel()
+        self._entries[fullname] = (
+            source_path, precompiler.get_executor().submit(_read_code, fullname, source_path))
+        return True
+
+    def cancel(self):
+        """
+        取消还没有开始准备的模块
+        """
+        for _, future in self._entries.values():
+            future.cancel()
+        self._entries.clear()
+
+    def find_spec(self, fullname, path=None, target=None):  # pylint: disable=unused-argument
+        """
+        :param fullname: 模块名
+        :return: 使用 PreparedLoader 的 ModuleSpec；不是准备过的模块时返回None，交给其他查找器
+        """
+        entry = self._entries.pop(fullname, None)
+        if entry is None:
+            return None
+        source_path, future = entry
+        reload_trace = trace.current()
+        code = None
+        if not future.done() and reload_trace is not None:
+            with reload_trace.span(fullname, 'prepare wait'):
+                future.exception()
+        try:
+            code, hit, start, end, worker = future.result()
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+        else:
+            if reload_trace is not None:
+                cache = 'hit' if hit else 'miss'
+                reload_trace.add_span(fullname, 'prepare', start, end,
+                                      trace.worker_tid(worker), pyc=cache)
+                reload_trace.count(f"pyc_{cache}")
+        is_pkg = os.path.basename(source_path) == '__init__.py'
+        return importlib.util.spec_from_file_location(
+            fullname, source_path, loader=PreparedLoader(fullname, source_path, code),
+            submodule_search_locations=[os.path.dirname(source_path)] if is_pkg else None)
+
+    @contextlib.contextmanager
+    def installed(self):
+        """
+        :return: 在一个步骤期间把查找器放在 sys.meta_path 最前面的上下文管理器
+        """
+        if self in sys.meta_path:
+            yield self
+            return
+        sys.meta_path.insert(0, self)
+        try:
+            yield self
+        finally:
+            if self in sys.meta_path:
+                sys.meta_path.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        # 加载或重载结束时取消没有用到的准备
+        self.cancel()
+
+
+def release_hooks():
+    """
+    从 sys.meta_path 中移除仍然安装着的查找器，调度器在每个步骤之后调用
+
+    :return: 被移除的钩子的名称列表
+    """
+    finders = [finder for finder in sys.meta_path if isinstance(finder, PreparedFinder)]
+    for finder in finders:
+        sys.meta_path.remove(finder)
+    return ['sys.meta_path'] if finders else []
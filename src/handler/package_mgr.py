@@ -3,14 +3,32 @@
 """
 包管理
 """
+import contextlib
+import logging
 import os
-import pkgutil
 import sys
+import types
 import importlib
+import linecache
+from functools import partial
+
+import bpy  # pylint: disable=import-error
 
 from ..data import py_models as pm
+from ..data import import_graph as ig
 from ..util.logger import Log
-
+from ..util import trace
+from ..util import leak_check
+from . import module_loader
+from . import dev_finder
+from . import class_diff
+from . import hot_patch
+from . import scheduler
+
+# 分步执行的加载和重载在步骤之间不能留下任何替换的全局函数，调度器在每个步骤之后检查
+scheduler.add_hook_check(class_diff.release_hooks)
+scheduler.add_hook_check(ig.release_hooks)
+scheduler.add_hook_check(module_loader.release_hooks)
 
 def reload_addon(addon_name):
     """重新加载指定的插件及其所有子模块"""
@@ -20,13 +38,11 @@ def reload_addon(addon_name):
     # 递归重新加载主模块及其所有子模块
     importlib.reload(main_module)
 
-    # 重新加载所有以插件名开头的模块
-    for module_name in list(sys.modules.keys()):
-        if module_name.startswith(addon_name + '.'):
-            module = sys.modules[module_name]
-            importlib.reload(module)
+    # 重新加载插件的所有子模块
+    for module in find_submodules(main_module):
+        importlib.reload(module)
 
-    Log.info(f"Addon '{addon_name}' and all its submodules have been reloaded.")
+    Log.info("Addon '%s' and all its submodules have been reloaded.", addon_name)
 
 
 def reload_addon_submodules(addon_name):
@@ -42,58 +58,145 @@ def reload_addon_submodules(addon_name):
     # 初始化一个列表，用于存储重新加载的子模块名称
     reloaded_modules = []
     try:
-        # 遍历当前加载的所有模块，寻找以插件名开头的子模块
-        for module_name in list(sys.modules.keys()):
-            if module_name.startswith(addon_name + '.'):
-                # 获取子模块并重新加载
-                module = sys.modules[module_name]
-                # 重新加载模块后，更新已重新加载模块的列表
-                importlib.reload(module)
-                reloaded_modules.append(module_name)
+        # 从主模块的属性出发找到已导入的子模块，不需要扫描 sys.modules
+        main_module = sys.modules.get(addon_name)
+        for module in find_submodules(main_module) if main_module is not None else ():
+            # 重新加载模块后，更新已重新加载模块的列表
+            importlib.reload(module)
+            reloaded_modules.append(module.__name__)
 
         # 如果有子模块被重新加载，则打印这些子模块的名称
         if reloaded_modules:
-            Log.info(f"The following submodules of '{addon_name}' "
-                     f"have been reloaded:")
+            Log.info("The following submodules of '%s' have been reloaded:", addon_name)
             for module_name in reloaded_modules:
-                Log.info(f"  - {module_name}")
+                Log.info("  - %s", module_name)
         else:
             # 如果没有找到任何子模块进行重新加载，打印提示信息
-            Log.info(f"No submodules of '{addon_name}' were found to reload.")
+            Log.info("No submodules of '%s' were found to reload.", addon_name)
     except Exception as e:  # pylint: disable=broad-exception-caught
         # 捕获并打印在重新加载过程中发生的任何异常
-        Log.warning(f"An warning occurred while "
-                    f"trying to reload the submodules of '{addon_name}': {e}")
+        Log.warning("An warning occurred while trying to reload the submodules of '%s': %s",
+                    addon_name, e)
+
 
+def find_submodules(package):
+    """
+    通过模块属性找到包中已导入的所有子模块。
+    导入子模块时，导入系统会把子模块设置为父包的属性，所以从包出发沿属性遍历就能找到全部子模块，
+    不需要扫描 sys.modules 中的几千个条目。
+
+    参数:
+    package (module): 包的模块对象
 
-def load_package(package_path):
+    返回:
+    list: 子模块列表，父模块在子模块之前
+    """
+    prefix = package.__name__ + '.'
+    seen = {package.__name__}
+    submodules = []
+    stack = [package]
+    while stack:
+        children = []
+        for value in list(vars(stack.pop()).values()):
+            if not isinstance(value, types.ModuleType):
+                continue
+            name = getattr(value, '__name__', None)
+            if (isinstance(name, str) and name.startswith(prefix) and name not in seen
+                    and sys.modules.get(name) is value):
+                seen.add(name)
+                submodules.append(value)
+                children.append(value)
+        stack.extend(reversed(children))
+    return submodules
+
+
+class StepHooks:  # pylint: disable=too-few-public-methods
+    """
+    加载或重载期间在每个同步步骤中安装的全局钩子：类的注册比较、导入记录以及准备好的代码对象的查找器。
+    分步执行的生成器 yield 之前钩子都已经恢复（调度器在每个步骤之后检查），调度器在两个步骤之间让出主线程时，
+    Blender 和其他插件的导入、注册不会被记录或比较
+    """
+
+    def __init__(self, recorder=None, finder=None):
+        """
+        :param recorder: ImportRecorder，为None时不记录导入
+        :param finder: PreparedFinder，为None时按常规方式导入
+        """
+        self.recorder = recorder
+        self.finder = finder
+
+    @contextlib.contextmanager
+    def step(self):
+        """
+        :return: 在一个步骤期间安装钩子的上下文管理器
+        """
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(class_diff.step())
+            if self.recorder is not None:
+                stack.enter_context(self.recorder)
+            if self.finder is not None:
+                stack.enter_context(self.finder.installed())
+            yield
+
+
+def load_package(package_path, identifier=1):
     """
     加载指定路径的插件包及其所有子模块
 
     参数:
     package_path (str): 插件包的路径
+    identifier: 模块记录的标识符，每个插件槽位使用自己的标识符
 
     返回:
     无返回值，但会打印出加载过程的信息或错误信息
     """
+    scheduler.run_steps(iter_load_package(package_path, identifier))
+
+
+def iter_load_package(package_path, identifier=1):
+    """
+    分步加载插件包：每导入或注册一个模块之后 yield 一次，由调度器在主线程的时间预算内执行
+
+    参数:
+    package_path (str): 插件包的路径
+    identifier: 模块记录的标识符
+    """
     package_path = os.path.normpath(package_path)
     package_name = get_package_name(package_path)
-    new_path = os.path.dirname(package_path)
-    if new_path not in sys.path:
-        sys.path.append(new_path)
-    if package_name in sys.modules:
-        sys.path.append(package_path)
-    package = importlib.import_module(package_name)
-    if hasattr(package, 'register'):
-        package.register()
-    pm.store_module(1, package)
-    Log.info(f"{package_name} has been loaded.")
-    try:
-        load_modules_recursively(package_path, package_name)
-    except Exception as err:  # pylint: disable=broad-exception-caught
-        Log.warning(f"An warning occurred while "
-                    f"trying to load the submodules of '{package_name}': {err}")
-        package.unregister()
+    if package_name is None:
+        # 不是插件包时不安装查找器，也不修改模块记录和导入图
+        Log.warning("'%s' is not a plugin package (a folder with __init__.py), skipped.",
+                    package_path)
+        return
+    owner = pm.find_identifier(package_name)
+    if owner is not None and owner != identifier:
+        Log.warning("'%s' is already loaded by plugin %s, unload it first.", package_name, owner)
+        return
+    # 插件包由专用的查找器导入，不修改 sys.path，其他插件的导入不会在开发目录中查找
+    dev_finder.install(identifier, package_name, package_path, partial(pm.own, identifier))
+    # 加载期间记录模块之间的导入关系，用于后续的增量重载
+    graph = ig.new_graph(identifier, package_name, package_path)
+    pm.set_package(identifier, package_name)
+    # 所有模块的代码对象先提交到线程池中准备，导入时主线程只执行代码对象
+    modules = module_loader.discover_modules(package_path, package_name)
+    finder = module_loader.PreparedFinder(modules)
+    hooks = StepHooks(ig.ImportRecorder(graph, partial(pm.own, identifier)), finder)
+    with finder, class_diff.session():
+        package = yield from iter_import_and_register(package_name, hooks)
+        pm.store_module(identifier, package)
+        Log.info("%s has been loaded.", package_name)
+        yield
+        try:
+            yield from iter_load_modules(package_path, package_name, identifier=identifier,
+                                         hooks=hooks)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            Log.warning("An warning occurred while trying to load the submodules of '%s': %s",
+                        package_name, err)
+            with hooks.step():
+                package.unregister()
+    for module in pm.get_modules(identifier):
+        graph.add_module(module)
+    hot_patch.remember(graph)
     # for _, module_name, _ in pkgutil.walk_packages([package_path]):
     #     full_module_name = f"{package_name}.{module_name}"
     #     print(f"{full_module_name} has been loaded.")
@@ -102,6 +205,329 @@ def load_package(package_path):
     #         module.register()
 
 
+class ReloadJob:  # pylint: disable=too-few-public-methods
+    """
+    一次正在准备的增量重载：需要重载的模块的代码对象在线程池中准备，在主线程中按模块依次执行
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, identifier, package_path, graph, plan, finder, patch=None):
+        """
+        :param identifier: 模块记录的标识符
+        :param package_path: 插件包的路径
+        :param graph: ImportGraph
+        :param plan: ReloadPlan，为None时需要完整重载
+        :param finder: 准备代码对象的 PreparedFinder，完整重载时为None
+        :param patch: 准备热补丁的 Future，未开启热补丁或无法热补丁时为None
+        """
+        self.identifier = identifier
+        self.package_path = package_path
+        self.graph = graph
+        self.plan = plan
+        self.finder = finder
+        self.patch = patch
+
+    def ready(self):
+        """
+        :return: 是否可以开始修改模块：热补丁已经准备好或者确定不可用。
+                 模块的代码对象不在这里等待，导入每个模块之前只等待该模块
+        """
+        return self.patch is None or self.patch.done()
+
+    def merge(self, changed_paths):
+        """
+        把重载期间再次变化的文件合并到这次重载中：属于这次重载、还没有被导入的模块重新准备代码对象，
+        它们之后执行的就是最新的源码
+
+        :param changed_paths: 新变化的文件路径
+        :return: 已经合并的文件路径集合，其余的文件需要之后再重载
+        """
+        merged = set()
+        if self.plan is None:
+            return merged
+        for path in changed_paths:
+            name = self.graph.module_of(path)
+            if name is not None and self.finder.refresh(name):
+                self.plan.changed.add(name)
+                merged.add(path)
+        return merged
+
+
+def begin_reload(package_path, changed_paths=None, identifier=1):
+    """
+    开始增量重载：计算需要重新导入的模块，并在线程池中准备它们的代码对象。
+    这一步只读取文件，不会改变已加载的模块。
+
+    参数:
+    package_path (str): 插件包的路径
+    changed_paths (iterable): 变化的文件路径，为None时根据加载时记录的mtime判断
+    identifier: 模块记录的标识符
+
+    返回:
+    ReloadJob，之后调用 finish_reload() 完成重载，无法增量重载时它的 plan 为None，完成时完整重载；
+    没有需要重载的模块时返回None
+    """
+    # 新增或删除的文件所在目录的列表缓存需要重新读取
+    dev_finder.invalidate(identifier, changed_paths)
+    graph = ig.get_graph(identifier)
+    with trace.span('plan reload', 'plan'):
+        plan = graph.plan_reload(changed_paths) if graph is not None else None
+    if plan is None:
+        Log.info("Incremental reload is not possible, reloading the whole package.")
+        return ReloadJob(identifier, package_path, graph, None, None)
+    if not plan.modules:
+        Log.info("No module of '%s' changed, skipped %d modules.",
+                 graph.package_name, len(plan.skipped))
+        return None
+    modules = {
+        name: graph.module_files[name][0] for name in plan.modules if name in graph.module_files
+    }
+    # 开启热补丁时同时准备补丁和代码对象，补丁不可用时直接按常规方式重载
+    return ReloadJob(identifier, package_path, graph, plan, module_loader.PreparedFinder(modules),
+                     hot_patch.prepare(graph, plan.changed))
+
+
+def finish_reload(job):
+    """
+    完成增量重载：卸载受影响的模块，再按依赖顺序执行准备好的代码对象并注册。
+    某个模块的代码对象还没有准备完成时，导入它之前会等待。
+
+    参数:
+    job (ReloadJob): begin_reload() 返回的重载任务
+    """
+    scheduler.run_steps(iter_finish_reload(job))
+
+
+def iter_finish_reload(job):
+    """
+    分步完成重载：每注销、导入或注册一个模块之后 yield 一次，由调度器在主线程的时间预算内执行。
+    类的注册比较和导入记录跨越所有步骤，但替换的全局函数只在每个步骤执行期间安装
+
+    参数:
+    job (ReloadJob): begin_reload() 返回的重载任务
+    """
+    if job.plan is None:
+        yield from iter_full_reload(job.package_path, job.identifier)
+        return
+    graph, plan, identifier = job.graph, job.plan, job.identifier
+    if job.patch is not None and _apply_patch(job):
+        return
+    cycle = _begin_leak_check(
+        identifier, [pm.get_module(identifier, name) for name in plan.modules])
+    # 注销和注册的类在会话中比较，定义没有变化的类保持注册
+    with class_diff.session():
+        # 按依赖的逆序卸载受影响的模块，保证导入方先于被导入方注销
+        for module_name in reversed(plan.modules):
+            module = pm.get_module(identifier, module_name)
+            if module is not None:
+                unload_package(module)
+            else:
+                with trace.span(module_name, 'purge'):
+                    _purge_module(module_name)
+            pm.remove_module(identifier, module_name)
+            module = None
+            yield
+        # 不再持有旧模块，检查泄漏时它应该能被回收
+        module = None
+
+        # 按依赖顺序执行并注册
+        hooks = StepHooks(ig.ImportRecorder(graph, partial(pm.own, identifier)), job.finder)
+        with job.finder:
+            for module_name in plan.modules:
+                graph.forget_imports(module_name)
+                module = yield from iter_import_and_register(module_name, hooks)
+                pm.store_module(identifier, module)
+                graph.add_module(module)
+                yield
+    leak_check.end_cycle(cycle, class_diff.kept_classes())
+    hot_patch.remember(graph, plan.modules)
+
+    Log.info("Reloaded %d modules of '%s' (changed: %s).",
+             len(plan.modules), graph.package_name, ', '.join(sorted(plan.changed)))
+    if plan.skipped and Log.is_enabled_for(logging.INFO):
+        Log.info("Skipped %d unaffected modules: %s", len(plan.skipped), ', '.join(plan.skipped))
+
+
+def _begin_leak_check(identifier, modules):
+    """
+    按当前场景的设置开启或关闭泄漏检查，再记录重载前的状态。
+    设置在使用时读取，打开文件或注册插件之后不需要另外同步
+
+    参数:
+    identifier: 插件槽位的标识符
+    modules: 即将被卸载的模块
+
+    返回:
+    leak_check.begin_cycle() 的返回值
+    """
+    enabled = getattr(getattr(bpy.context, 'scene', None), 'leak_check_enabled', None)
+    if enabled is not None:
+        leak_check.update(enabled)
+    return leak_check.begin_cycle(identifier, modules)
+
+
+def _apply_patch(job):
+    """
+    尝试用热补丁完成重载：只替换变化的函数的代码对象，不卸载模块，不注销和注册类
+
+    参数:
+    job (ReloadJob): 准备了热补丁的重载任务
+
+    返回:
+    是否已经完成热补丁；返回False时需要照常重载
+    """
+    patches = job.patch.result()
+    if patches is None:
+        return False
+    with trace.span('hot patch', 'hot patch'):
+        patched = hot_patch.apply(patches)
+    if patched is None:
+        return False
+    job.finder.cancel()
+    for patch in patches:
+        module = sys.modules[patch.module_name]
+        # 回溯信息显示新的源码行，重载计划使用新的修改时间
+        linecache.checkcache(patch.filepath)
+        job.graph.add_module(module)
+        class_diff.refresh(module)
+    reload_trace = trace.current()
+    if reload_trace is not None:
+        reload_trace.count('functions_patched', patched)
+    Log.info("Hot patched %d functions of '%s' (changed: %s).",
+             patched, job.graph.package_name, ', '.join(sorted(job.plan.changed)))
+    return True
+
+
+def reload_package(package_path, changed_paths=None, identifier=1):
+    """
+    增量重载插件包：只重新导入发生变化的模块以及导入了它们的模块
+
+    参数:
+    package_path (str): 插件包的路径
+    changed_paths (iterable): 变化的文件路径，为None时根据加载时记录的mtime判断
+    identifier: 模块记录的标识符
+
+    返回:
+    无返回值，无法增量重载时（如新增或删除了模块文件）会退回完整重载
+    """
+    job = begin_reload(package_path, changed_paths, identifier)
+    if job is not None:
+        finish_reload(job)
+
+
+def full_reload(package_path, identifier=1):
+    """
+    完整重载：卸载标识符下的所有模块后重新加载插件包，开启泄漏检查时报告这次重载保留的内存
+
+    参数:
+    package_path (str): 插件包的路径
+    identifier: 模块记录的标识符
+    """
+    scheduler.run_steps(iter_full_reload(package_path, identifier))
+
+
+def iter_full_reload(package_path, identifier=1):
+    """
+    分步完整重载，步骤与 iter_unload_all() 和 iter_load_package() 相同
+
+    参数:
+    package_path (str): 插件包的路径
+    identifier: 模块记录的标识符
+    """
+    cycle = _begin_leak_check(identifier, [
+        sys.modules[name] for name in owned_module_names(identifier) if name in sys.modules])
+    # 卸载和加载在同一个会话中，定义没有变化的类保持注册
+    with class_diff.session():
+        yield from iter_unload_all(identifier)
+        yield from iter_load_package(package_path, identifier)
+    leak_check.end_cycle(cycle, class_diff.kept_classes())
+
+
+def unload_all(identifier):
+    """
+    卸载指定标识符下的所有模块并清除记录。
+
+    注册过的模块逐个注销并删除；此外插件拥有的其他模块（导入时间接导入的模块，
+    以及运行时才导入、只能从包的属性找到的子模块）也从 sys.modules 中删除，
+    否则它们会一直留在内存中，并在下次加载时被直接复用。
+
+    参数:
+    identifier: 模块列表的标识符
+    """
+    scheduler.run_steps(iter_unload_all(identifier))
+
+
+def iter_unload_all(identifier):
+    """
+    分步卸载：每注销一个模块之后 yield 一次
+
+    参数:
+    identifier: 模块列表的标识符
+    """
+    owned = owned_module_names(identifier)
+    for module in pm.get_modules(identifier):
+        try:
+            unload_package(module)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            Log.warning("Failed to unload plugin: %s", err)
+        yield
+    module = None
+
+    with trace.span(pm.get_package_name(identifier) or str(identifier), 'purge'):
+        for module_name in owned:
+            _purge_module(module_name)
+
+    # 清除标识符、导入图、结构摘要以及查找器
+    graph = ig.get_graph(identifier)
+    if graph is not None:
+        hot_patch.forget(graph)
+    pm.clear_identifier(identifier)
+    ig.clear_graph(identifier)
+    dev_finder.uninstall(identifier)
+
+
+def owned_module_names(identifier):
+    """
+    获取插件拥有的所有模块名称：导入时记录的模块，以及从插件包的属性能找到的子模块
+
+    参数:
+    identifier: 模块列表的标识符
+
+    返回:
+    list: 模块名称，父模块在子模块之前
+    """
+    names = dict.fromkeys(pm.owned_names(identifier))
+    package_name = pm.get_package_name(identifier)
+    package = sys.modules.get(package_name) if package_name else None
+    if package is not None:
+        names.setdefault(package_name)
+        names.update(dict.fromkeys(module.__name__ for module in find_submodules(package)))
+    return list(names)
+
+
+def _purge_module(module_name):
+    """
+    从 sys.modules 中删除模块，并丢弃 linecache 中缓存的源代码
+
+    参数:
+    module_name (str): 模块的完整名称
+    """
+    module = sys.modules.pop(module_name, None)
+    filename = getattr(module, '__file__', None)
+    if filename:
+        linecache.cache.pop(filename, None)
+
+
+def unload_all_plugins():
+    """
+    卸载所有插件槽位加载的模块，本插件注销时调用
+    """
+    for identifier in list(pm.module_registry):
+        unload_all(identifier)
+    # 本插件注销后不再检查，停止检查时启动的 tracemalloc
+    leak_check.set_enabled(False)
+
+
 def unload_package(package):
     """
     卸载指定的插件包及其所有子模块
@@ -113,14 +539,54 @@ def unload_package(package):
     无返回值，但会打印出卸载过程的信息
     """
     if hasattr(package, 'unregister'):
-        Log.info(f"unregistering '{package.__name__}'")
-        package.unregister()
+        Log.info("unregistering '%s'", package.__name__)
+        with class_diff.step(), trace.span(package.__name__, 'unregister'):
+            package.unregister()
     if package.__name__ in sys.modules:
-        Log.info(f"del module'{package.__name__}'")
-        del sys.modules[package.__name__]
+        Log.info("del module'%s'", package.__name__)
+        with trace.span(package.__name__, 'purge'):
+            _purge_module(package.__name__)
 
 
-def load_modules_recursively(package_path, package_name, exclude_dirs=None):
+def import_and_register(module_name):
+    """
+    导入模块并调用其 register()，两个阶段的耗时分别记录到当前的重载记录中
+
+    参数:
+    module_name (str): 模块的完整名称
+
+    返回:
+    module: 导入的模块对象
+    """
+    return scheduler.run_steps(iter_import_and_register(module_name))
+
+
+def iter_import_and_register(module_name, hooks=None):
+    """
+    分两步导入模块并调用其 register()，导入之后 yield 一次。
+    钩子只在每一步执行期间安装，yield 时已经恢复；模块的代码对象还在准备时先让出主线程等待
+
+    参数:
+    module_name (str): 模块的完整名称
+    hooks (StepHooks): 每一步安装的钩子，为None时只比较类的注册
+
+    返回:
+    module: 导入的模块对象（生成器的返回值）
+    """
+    if hooks is None:
+        hooks = StepHooks()
+    while hooks.finder is not None and not hooks.finder.is_ready(module_name):
+        yield module_loader.PREPARE_POLL_INTERVAL
+    with hooks.step(), trace.span(module_name, 'import'):
+        module = importlib.import_module(module_name)
+    yield
+    if hasattr(module, 'register'):
+        with hooks.step(), trace.span(module_name, 'register'):
+            module.register()
+    return module
+
+
+def load_modules_recursively(package_path, package_name, exclude_dirs=None, identifier=1):
     """
     递归加载指定路径下的所有子模块
 
@@ -128,45 +594,42 @@ def load_modules_recursively(package_path, package_name, exclude_dirs=None):
     package_path (str): 插件包的路径
     package_name (str): 插件包的名称
     exclude_dirs (list): 需要排除的目录列表，默认为['.venv']
+    identifier: 模块记录的标识符
 
     返回:
     无返回值，但会打印出加载过程的信息或错误信息
     """
+    scheduler.run_steps(iter_load_modules(package_path, package_name, exclude_dirs, identifier))
+
+
+def iter_load_modules(package_path, package_name, exclude_dirs=None, identifier=1,
+                      hooks=None):
+    """
+    分步递归加载子模块，步骤与 iter_import_and_register() 相同，
+    参数与 load_modules_recursively() 相同，hooks 为每一步安装的钩子（StepHooks）
+    """
     # print(f"package_path: {package_path},package_name: {package_name}")
     # print(sys.path)
     if exclude_dirs is None:
-        exclude_dirs = ['.venv']
-    for _, module_name, is_pkg in pkgutil.walk_packages([package_path]):
+        exclude_dirs = module_loader.DEFAULT_EXCLUDE_DIRS
+    for module_name, is_pkg in module_loader.iter_modules(package_path):
         full_module_name = f"{package_name}.{module_name}"
-        Log.info(f"{package_path}.{full_module_name} has been loaded. is_pkg:{is_pkg}")
+        Log.info("%s.%s has been loaded. is_pkg:%s", package_path, full_module_name, is_pkg)
 
-        module = importlib.import_module(full_module_name)
-        if hasattr(module, 'register'):
-            module.register()
-        pm.store_module(1, module)
+        module = yield from iter_import_and_register(full_module_name, hooks)
+        pm.store_module(identifier, module)
+        yield
         try:
             if is_pkg:
                 # 如果是包，递归加载子包
                 sub_package_path = os.path.join(package_path, module_name)
-                Log.info(f"{sub_package_path} is_pkg:{is_pkg}")
-                if not any(sub_dir in sub_package_path for sub_dir in exclude_dirs):
-                    load_modules_recursively(sub_package_path, full_module_name, exclude_dirs)
+                Log.info("%s is_pkg:%s", sub_package_path, is_pkg)
+                if not module_loader.is_excluded(sub_package_path, exclude_dirs):
+                    yield from iter_load_modules(sub_package_path, full_module_name, exclude_dirs,
+                                                 identifier, hooks)
         except Exception as err:  # pylint: disable=broad-exception-caught
-            Log.warning(f"An error occurred while "
-                        f"trying to load the submodules of '{full_module_name}': {err}")
-
-
-def is_package(path):
-    """
-    判断指定路径是否为一个插件包
-
-    参数:
-    path (str): 需要判断的路径
-
-    返回:
-    bool: 如果路径是一个插件包则返回True，否则返回False
-    """
-    return os.path.isdir(path) and '__init__.py' in os.listdir(path)
+            Log.warning("An error occurred while trying to load the submodules of '%s': %s",
+                        full_module_name, err)
 
 
 def get_package_name(path):
@@ -180,7 +643,7 @@ def get_package_name(path):
     str: 插件包的名称，如果路径不是一个有效的插件包路径则返回None
     """
     # 判断路径是否为目录
-    if not is_package(path):
+    if not module_loader.is_package(path):
         return None
 
     # 规范化路径（将反斜杠转换为正斜杠，移除末尾的斜杠）
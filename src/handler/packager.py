@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+把插件目录打包为Blender扩展的zip文件。
+
+按 blender_manifest.toml 中 [build] paths_exclude_pattern 的规则选择文件（没有时使用Blender的默认规则）；
+压缩后的成员按内容摘要缓存在内存和磁盘中，修改一个文件后重新打包只需要压缩这个文件；
+读取和压缩在线程池中并行进行。输出是确定的：成员按名称排序，使用固定的时间和权限，
+同样的文件内容（使用同一个zlib版本）总是得到逐字节相同的zip。
+"""
+import contextlib
+import errno
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from . import precompiler
+from .dir_scanner import RACY_WINDOW_NS
+from ..data import file_index
+from ..data.file_index import FileIndex, STAT
+from ..data.hash_cache import DIGEST_SIZE
+from ..util import path_filter
+from ..util.logger import Log
+
+# 默认的压缩级别
+COMPRESS_LEVEL = 9
+# 等待成员准备完成时检查的间隔（秒）
+WAIT_INTERVAL = 0.002
+# 内存中缓存的压缩数据的总大小上限（字节）
+MEMORY_CACHE_LIMIT = 256 * 1024 * 1024
+
+STORED = 0
+DEFLATED = 8
+
+# 所有成员使用同样的修改时间（1980-01-01 00:00:00，zip能表示的最早时间）和权限
+_DOS_TIME = 0
+_DOS_DATE = (1 << 5) | 1
+_EXTERNAL_ATTR = 0o100644 << 16
+# 创建系统为Unix，格式版本2.0；使用zip64字段的成员需要4.5
+_VERSION_MADE_BY = (3 << 8) | 20
+_VERSION_NEEDED = 20
+_VERSION_ZIP64 = 45
+_FLAG_UTF8 = 0x800
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP64_COUNT_LIMIT = 0xFFFF
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<IHHHHIIH')
+_END_RECORD64 = struct.Struct('<IQHHIIQQQQ')
+_END_LOCATOR64 = struct.Struct('<IIQI')
+_ZIP64_OFFSET_EXTRA = struct.Struct('<HHQ')
+# 磁盘缓存文件的头：压缩方法、CRC32、原始大小
+_CACHE_HEADER = struct.Struct('<BIQ')
+
+_state = {
+    # (摘要, 压缩级别) -> CompressedMember，按最近使用的顺序排列
+    'members': OrderedDict(),
+    'bytes': 0,
+    # 插件目录 -> 上一次打包时的 FileIndex（修改时间、大小和摘要）
+    'indexes': {},
+}
+_lock = threading.Lock()
+
+
+class CompressedMember:  # pylint: disable=too-few-public-methods
+    """
+    一个已经压缩好的zip成员，只取决于文件内容和压缩级别
+    """
+    __slots__ = ('method', 'crc', 'size', 'data')
+
+    def __init__(self, method, crc, size, data):
+        """
+        :param method: STORED 或 DEFLATED
+        :param crc: 原始内容的CRC32
+        :param size: 原始内容的大小
+        :param data: 写入zip的数据
+        """
+        self.method = method
+        self.crc = crc
+        self.size = size
+        self.data = data
+
+
+def compress(data, level=COMPRESS_LEVEL):
+    """
+    使用raw deflate压缩文件内容，压缩后没有变小时直接存储
+
+    :param data: 文件内容
+    :param level: 压缩级别
+    :return: CompressedMember
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    packed = compressor.compress(data) + compressor.flush()
+    if len(packed) >= len(data):
+        return CompressedMember(STORED, zlib.crc32(data), len(data), data)
+    return CompressedMember(DEFLATED, zlib.crc32(data), len(data), packed)
+
+
+def _cache_key(digest, level):
+    """
+    :return: 缓存文件名：不同的zlib版本可能得到不同的压缩结果，所以版本也是键的一部分
+    """
+    return f"{digest.hex()}-{level}-{zlib.ZLIB_RUNTIME_VERSION}.z"
+
+
+def _remember(key, member):
+    """
+    把压缩结果放入内存缓存，超过大小上限时丢弃最久没有使用的成员
+    """
+    with _lock:
+        members = _state['members']
+        if key in members:
+            members.move_to_end(key)
+            return
+        members[key] = member
+        _state['bytes'] += len(member.data)
+        while _state['bytes'] > MEMORY_CACHE_LIMIT and len(members) > 1:
+            _, evicted = members.popitem(last=False)
+            _state['bytes'] -= len(evicted.data)
+
+
+def _lookup(digest, level, cache_dir):
+    """
+    在内存缓存和磁盘缓存中查找压缩结果
+
+    :param digest: 文件内容的摘要
+    :param level: 压缩级别
+    :param cache_dir: 磁盘缓存目录，为None时只使用内存缓存
+    :return: CompressedMember，没有缓存时返回None
+    """
+    key = _cache_key(digest, level)
+    with _lock:
+        member = _state['members'].get(key)
+        if member is not None:
+            _state['members'].move_to_end(key)
+            return member
+    if cache_dir is None:
+        return None
+    try:
+        with open(os.path.join(cache_dir, key), 'rb') as file:
+            content = file.read()
+        method, crc, size = _CACHE_HEADER.unpack_from(content)
+    except (OSError, struct.error):
+        return None
+    member = CompressedMember(method, crc, size, content[_CACHE_HEADER.size:])
+    _remember(key, member)
+    return member
+
+
+def _store(digest, level, member, cache_dir):
+    """
+    把压缩结果写入内存缓存和磁盘缓存。缓存文件以内容命名，先写入临时文件再替换，多个进程同时打包也是安全的
+    """
+    key = _cache_key(digest, level)
+    _remember(key, member)
+    if cache_dir is None:
+        return
+    path = os.path.join(cache_dir, key)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(_CACHE_HEADER.pack(member.method, member.crc, member.size))
+            file.write(member.data)
+        os.replace(temp_path, path)
+    except OSError as err:
+        Log.debug("failed to cache compressed member %s: %s", key, err)
+
+
+def _prepare(path, known_digest, level, cache_dir):
+    """
+    在工作线程中准备一个成员：文件没有变化时直接使用缓存，否则读取、计算摘要并在缓存未命中时压缩
+
+    :param path: 文件路径
+    :param known_digest: 修改时间和大小与上次打包时相同时，上次的摘要；否则为None
+    :param level: 压缩级别
+    :param cache_dir: 磁盘缓存目录
+    :return: (摘要, CompressedMember, 是否重新压缩)
+    """
+    if known_digest is not None:
+        member = _lookup(known_digest, level, cache_dir)
+        if member is not None:
+            return known_digest, member, False
+    with open(path, 'rb') as file:
+        data = file.read()
+    digest = hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+    member = _lookup(digest, level, cache_dir)
+    if member is not None:
+        return digest, member, False
+    member = compress(data, level)
+    _store(digest, level, member, cache_dir)
+    return digest, member, True
+
+
+class ZipWriter:
+    """
+    确定的zip写入器：不写入时间、用户、额外的属性等随环境变化的信息，
+    成员的顺序由调用者决定。成员超过65535个或者文件超过4 GiB时使用zip64记录
+    """
+
+    def __init__(self, file):
+        """
+        :param file: 以二进制写入方式打开的文件
+        """
+        self._file = file
+        self._offset = 0
+        self._central = []
+
+    def _write(self, data):
+        self._file.write(data)
+        self._offset += len(data)
+
+    def add(self, name, member):
+        """
+        写入一个成员
+
+        :param name: 以 / 分隔的成员名称
+        :param member: CompressedMember
+        """
+        if member.size > _ZIP64_LIMIT or len(member.data) > _ZIP64_LIMIT:
+            raise ValueError(f"{name} is larger than 4 GiB")
+        encoded = name.encode('utf-8')
+        flags = 0 if encoded.isascii() else _FLAG_UTF8
+        offset = self._offset
+        self._write(_LOCAL_HEADER.pack(
+            0x04034b50, _VERSION_NEEDED, flags, member.method, _DOS_TIME, _DOS_DATE,
+            member.crc, len(member.data), member.size, len(encoded), 0))
+        self._write(encoded)
+        self._write(member.data)
+
+        extra = b''
+        version = _VERSION_NEEDED
+        if offset > _ZIP64_LIMIT:
+            extra = _ZIP64_OFFSET_EXTRA.pack(0x0001, 8, offset)
+            offset = _ZIP64_LIMIT
+            version = _VERSION_ZIP64
+        self._central.append(_CENTRAL_HEADER.pack(
+            0x02014b50, _VERSION_MADE_BY, version, flags, member.method, _DOS_TIME, _DOS_DATE,
+            member.crc, len(member.data), member.size, len(encoded), len(extra), 0, 0, 0,
+            _EXTERNAL_ATTR, offset) + encoded + extra)
+
+    def close(self):
+        """
+        写入中央目录和结束记录
+        """
+        start = self._offset
+        for record in self._central:
+            self._write(record)
+        size = self._offset - start
+        count = len(self._central)
+        if count > _ZIP64_COUNT_LIMIT or start > _ZIP64_LIMIT or size > _ZIP64_LIMIT:
+            end64 = self._offset
+            self._write(_END_RECORD64.pack(0x06064b50, _END_RECORD64.size - 12, _VERSION_MADE_BY,
+                                           _VERSION_ZIP64, 0, 0, count, count, size, start))
+            self._write(_END_LOCATOR64.pack(0x07064b50, 0, end64, 1))
+            count = min(count, _ZIP64_COUNT_LIMIT)
+            start = min(start, _ZIP64_LIMIT)
+            size = min(size, _ZIP64_LIMIT)
+        self._write(_END_RECORD.pack(0x06054b50, 0, 0, count, count, size, start, 0))
+
+
+def collect_files(root, excludes, skip=()):
+    """
+    列出需要打包的文件
+
+    :param root: 插件根目录
+    :param excludes: gitignore风格的排除规则
+    :param skip: 总是跳过的文件或目录的路径（输出文件、缓存目录）
+    :return: (成员名称, 文件路径) 列表，按成员名称排序
+    """
+    rules = path_filter.PathFilter(root, exclude=excludes)
+    skip = {os.path.normcase(os.path.abspath(path)) for path in skip if path}
+    members = []
+    for dirpath, dirnames, filenames in os.walk(rules.root):
+        dirnames[:] = [
+            name for name in dirnames
+            if rules.accepts_dir(os.path.join(dirpath, name))
+            and os.path.normcase(os.path.join(dirpath, name)) not in skip
+        ]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if rules.accepts_file(path) and os.path.normcase(path) not in skip:
+                members.append((rules.relative(path), path))
+    members.sort(key=lambda member: member[0].encode('utf-8'))
+    return members
+
+
+def _load_index(root, cache_dir):
+    """
+    :return: 上一次打包时的 FileIndex，内存中没有时从磁盘缓存读取，都没有时返回空的索引
+    """
+    with _lock:
+        index = _state['indexes'].get(root)
+    if index is None and cache_dir is not None:
+        index = file_index.load(os.path.join(cache_dir, file_index.index_name(root)),
+                                root, DIGEST_SIZE)
+    return index if index is not None else FileIndex(root, DIGEST_SIZE)
+
+
+def _save_index(root, cache_dir, index):
+    """
+    保存这次打包的 FileIndex，供下一次打包判断哪些文件没有变化
+    """
+    with _lock:
+        _state['indexes'][root] = index
+    if cache_dir is None:
+        return
+    try:
+        file_index.save(os.path.join(cache_dir, file_index.index_name(root)), index)
+    except OSError as err:
+        Log.warning("failed to save build index of '%s': %s", root, err)
+
+
+def _check_wheels(manifest, names):
+    """
+    清单中列出的wheel文件必须被打包，否则安装后的扩展无法使用
+
+    :param manifest: 清单内容
+    :param names: 打包的成员名称集合
+    """
+    for wheel in manifest.get('wheels', []):
+        name = os.path.normpath(wheel).replace(os.sep, '/')
+        if name not in names:
+            raise ValueError(f"wheel listed in the manifest is missing or excluded: {wheel}")
+
+
+def _submit(members, previous, level, cache_dir):
+    """
+    把每个成员的准备工作提交到线程池
+
+    :param members: (成员名称, 文件路径) 列表
+    :param previous: 上一次打包时的 FileIndex，修改时间和大小没有变化的文件直接使用其中的摘要
+    :param level: 压缩级别
+    :param cache_dir: 磁盘缓存目录
+    :return: (成员名称, 文件路径, os.stat_result, Future) 列表，顺序与 members 相同
+    """
+    executor = precompiler.get_executor()
+    futures = []
+    for name, path in members:
+        stat = os.stat(path)
+        slot = previous.slot(path)
+        known = None
+        if (slot is not None and previous.has(slot, STAT)
+                and previous.mtime_ns[slot] == stat.st_mtime_ns
+                and previous.size[slot] == stat.st_size):
+            known = previous.digest(slot)
+        futures.append((name, path, stat,
+                        executor.submit(_prepare, path, known, level, cache_dir)))
+    return futures
+
+
+def _iter_write_zip(output_path, futures, index, start_ns):
+    """
+    按顺序等待每个成员准备完成并写入zip。先写入临时文件，完成后再替换输出文件。
+    成员还在准备时 yield 等待的秒数，关闭生成器时取消剩余的准备并删除临时文件
+
+    :param output_path: 输出的zip文件路径
+    :param futures: _submit() 的结果
+    :param index: 记录这次打包的文件修改时间、大小和摘要的 FileIndex
+    :param start_ns: 打包开始的时间
+    :return: 生成器，返回 {'compressed': 重新压缩的文件数, 'reused': 使用缓存的文件数}
+    """
+    counts = {'compressed': 0, 'reused': 0}
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            writer = ZipWriter(file)
+            for name, path, stat, future in futures:
+                while not future.done():
+                    yield WAIT_INTERVAL
+                digest, member, compressed = future.result()
+                writer.add(name, member)
+                counts['compressed' if compressed else 'reused'] += 1
+                # 修改时间太新的文件可能在同一个时间戳内再次被修改，下次打包时重新读取
+                if stat.st_mtime_ns < start_ns - RACY_WINDOW_NS:
+                    index.set_stat(path, stat.st_mtime_ns, stat.st_size, digest)
+            writer.close()
+        os.replace(temp_path, output_path)
+    except BaseException:
+        for *_, future in futures:
+            future.cancel()
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    return counts
+
+
+def output_name(manifest):
+    """
+    :param manifest: 清单内容
+    :return: 与 Blender 的 "extension build" 相同的输出文件名：<id>-<version>.zip
+    """
+    extension_id = manifest.get('id')
+    version = manifest.get('version')
+    if not extension_id or not version:
+        raise ValueError(f"{path_filter.MANIFEST_NAME} must define id and version")
+    return f"{extension_id}-{version}.zip"
+
+
+def build(root, output_path=None, cache_dir=None, level=COMPRESS_LEVEL):
+    """
+    打包扩展，在当前线程中等待完成。参数、返回值和异常与 iter_build() 相同
+    """
+    steps = iter_build(root, output_path, cache_dir, level)
+    try:
+        while True:
+            time.sleep(next(steps) or 0)
+    except StopIteration as finished:
+        return finished.value
+
+
+def iter_build(root, output_path=None, cache_dir=None, level=COMPRESS_LEVEL):
+    """
+    分步打包扩展：收集文件之后和等待成员准备时 yield（等待时为秒数），可以由主线程的调度器执行。
+
+    参数:
+    - root: 插件根目录，其中必须有 blender_manifest.toml。
+    - output_path: 输出的zip文件路径，为None时与Blender相同，写入插件根目录中的 <id>-<version>.zip。
+    - cache_dir: 压缩结果和文件索引的磁盘缓存目录，为None时只使用内存中的缓存。
+    - level: 压缩级别。
+
+    返回:
+    - 生成器，返回统计信息：output（输出路径）、files（成员数）、compressed（重新压缩的文件数）、
+      reused（使用缓存的文件数）、bytes（zip的大小）、ms（耗时）。
+
+    异常:
+    - FileNotFoundError: 没有清单文件。
+    - ValueError: 清单缺少 id 或 version，或者清单中的wheel没有被打包。
+    """
+    start = time.perf_counter()
+    start_ns = time.time_ns()
+    root = os.path.normpath(os.path.abspath(root))
+    manifest = path_filter.read_manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(errno.ENOENT, "extension manifest not found",
+                                os.path.join(root, path_filter.MANIFEST_NAME))
+    if output_path is None:
+        output_path = os.path.join(root, output_name(manifest))
+    output_path = os.path.abspath(output_path)
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    excludes = path_filter.read_manifest_excludes(root, path_filter.BUILD_DEFAULT_EXCLUDES)
+    members = collect_files(root, excludes, skip=(output_path, cache_dir))
+    _check_wheels(manifest, {name for name, _ in members})
+
+    futures = _submit(members, _load_index(root, cache_dir), level, cache_dir)
+    yield
+    index = FileIndex(root, DIGEST_SIZE)
+    stats = {'output': output_path, 'files': len(members)}
+    stats.update((yield from _iter_write_zip(output_path, futures, index, start_ns)))
+    _save_index(root, cache_dir, index)
+
+    stats['bytes'] = os.path.getsize(output_path)
+    stats['ms'] = (time.perf_counter() - start) * 1000.0
+    Log.info("built %s: %d files, %d compressed, %d reused, %d bytes in %.1f ms",
+             output_path, stats['files'], stats['compressed'], stats['reused'],
+             stats['bytes'], stats['ms'])
+    return stats
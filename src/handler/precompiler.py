@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+在后台线程中把变化的源文件编译到 __pycache__，主线程重载时只需要读取 .pyc
+"""
+import importlib.util
+import os
+import py_compile
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ..util.logger import Log
+
+# 编译线程数
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+_executor = None  # pylint: disable=invalid-name
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    :return: 预编译和准备模块共用的线程池，第一次使用时创建
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                           thread_name_prefix='pdh_worker')
+        return _executor
+
+
+def is_cache_fresh(source_path):
+    """
+    判断源文件的 .pyc 是否可以直接使用：按 importlib 的规则比较 .pyc 头中的修改时间和大小
+
+    :param source_path: .py 文件路径
+    :return: bool
+    """
+    try:
+        stat = os.stat(source_path)
+        with open(importlib.util.cache_from_source(source_path), 'rb') as file:
+            header = file.read(16)
+    except (OSError, ValueError, NotImplementedError):
+        return False
+    if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+        return False
+    flags, mtime, size = struct.unpack('<III', header[4:16])
+    if flags != 0:
+        # 基于哈希的 .pyc，需要读取源文件才能判断，这里按未命中处理
+        return False
+    return mtime == (int(stat.st_mtime) & 0xFFFFFFFF) and size == (stat.st_size & 0xFFFFFFFF)
+
+
+def _compile(source_path):
+    """
+    编译单个文件
+
+    :param source_path: .py 文件路径
+    :return: 是否编译成功
+    """
+    try:
+        py_compile.compile(source_path, doraise=True,
+                           invalidation_mode=py_compile.PycInvalidationMode.TIMESTAMP)
+        return True
+    except (py_compile.PyCompileError, OSError) as err:
+        # 语法错误会在重载导入时再次出现并报告，这里只记录
+        Log.info("precompile skipped %s: %s", source_path, err)
+        return False
+
+
+def precompile(paths):
+    """
+    在线程池中编译变化的 .py 文件并等待完成，在监控线程中调用，不阻塞主线程。
+
+    即使 .pyc 头中的修改时间和大小与源文件一致也会重新编译：.pyc 只记录秒级的修改时间，
+    同一秒内保存两次且大小不变时旧的 .pyc 看起来仍然有效，而传入的文件已经确认内容发生了变化。
+
+    :param paths: 内容发生变化的文件路径
+    :return: 统计信息：compiled、failed
+    """
+    stats = {'compiled': 0, 'failed': 0}
+    if sys.dont_write_bytecode:
+        return stats
+    sources = [path for path in paths if path.endswith('.py') and os.path.isfile(path)]
+    if not sources:
+        return stats
+    for compiled in get_executor().map(_compile, sources):
+        stats['compiled' if compiled else 'failed'] += 1
+    return stats
+
+
+def shutdown():
+    """
+    停止线程池，监控停止时调用
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
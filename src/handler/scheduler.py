@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+主线程调度器：一个持久的 bpy.app.timers 定时器按每次执行的时间预算分步执行工作队列中的任务
+"""
+import collections
+import threading
+import time
+
+import bpy  # pylint: disable=import-error
+
+from ..util.logger import Log
+
+# 默认每次定时器执行的时间预算（秒）
+DEFAULT_BUDGET = 0.008
+# 队列为空但仍有使用者（如正在监视的插件）时，检查新任务的间隔（秒）
+IDLE_INTERVAL = 0.1
+
+# 任务：(函数, 参数)，开始执行时调用函数得到生成器。生成器每次 yield 表示一个步骤结束，
+# yield 一个正数表示需要等待这么多秒后再继续（如等待后台准备），期间不执行其他任务
+_tasks = collections.deque()
+_lock = threading.Lock()
+# current: 正在执行的生成器；holds: 需要定时器保持运行的使用者
+_state = {'current': None, 'holds': set()}
+# 最近一次定时器执行的统计：执行的步骤数和耗时（秒）
+last_tick = {'steps': 0, 'busy': 0.0}
+# 每个步骤之后执行的检查：恢复仍然安装着的全局钩子并返回它们的名称
+_hook_checks = []
+
+
+def get_budget():
+    """
+    每次定时器执行的时间预算，使用当前场景的设置。设置在每次执行时读取，打开文件或注册插件之后不需要另外同步
+
+    :return: 秒，单个步骤不会被打断，所以一次执行可能超出预算；没有设置时使用默认预算
+    """
+    budget_ms = getattr(getattr(bpy.context, 'scene', None), 'reload_budget', None)
+    return DEFAULT_BUDGET if budget_ms is None else max(0.001, budget_ms / 1000.0)
+
+
+def submit(function, *args):
+    """
+    提交一个任务，可以在任何线程中调用。
+    只有主线程可以注册定时器，所以在其他线程中提交时需要已经有使用者通过 hold() 让定时器保持运行
+
+    :param function: 返回生成器的函数
+    :param args: 函数的参数
+    """
+    with _lock:
+        _tasks.append((function, args))
+    if threading.current_thread() is threading.main_thread():
+        start()
+
+
+def start():
+    """
+    在主线程中注册定时器，已经注册时什么都不做
+    """
+    if not bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.register(_tick, first_interval=0.0, persistent=True)
+
+
+def hold(owner):
+    """
+    让定时器在队列为空时也保持运行，其他线程提交的任务才能被执行。在主线程中调用
+
+    :param owner: 使用者的标识
+    """
+    _state['holds'].add(owner)
+    start()
+
+
+def release(owner):
+    """
+    取消 hold()，没有使用者并且队列为空时定时器在下次执行时结束
+
+    :param owner: 使用者的标识
+    """
+    _state['holds'].discard(owner)
+
+
+def add_hook_check(check):
+    """
+    注册一个在每个步骤之后执行的检查。任务在步骤之间让出主线程，这时替换的全局函数
+    （__import__、bpy.utils.register_class 等）必须已经恢复，否则 Blender 和其他插件会受到影响
+
+    :param check: 函数，恢复仍然安装着的钩子并返回它们的名称列表，没有时返回空列表
+    """
+    if check not in _hook_checks:
+        _hook_checks.append(check)
+
+
+def check_hooks():
+    """
+    检查步骤之间是否还有安装着的全局钩子，有时恢复并记录错误
+
+    :return: 仍然安装着的钩子的名称列表
+    """
+    leaked = [name for check in _hook_checks for name in check()]
+    if leaked:
+        Log.error("Global hooks still installed between steps: %s", ', '.join(leaked))
+    return leaked
+
+
+def is_busy():
+    """
+    :return: 是否有正在执行或等待执行的任务
+    """
+    return _state['current'] is not None or bool(_tasks)
+
+
+def _next_task():
+    """
+    :return: 正在执行的生成器，没有时从队列中取出下一个任务开始执行；队列为空时返回None
+    """
+    if _state['current'] is None:
+        with _lock:
+            if not _tasks:
+                return None
+            function, args = _tasks.popleft()
+        _state['current'] = function(*args)
+    return _state['current']
+
+
+def _step(task):
+    """
+    执行任务的一个步骤
+
+    :param task: 生成器
+    :return: 需要等待的秒数；任务结束时返回None，其他情况返回0
+    """
+    try:
+        wait = next(task)
+    except StopIteration:
+        _state['current'] = None
+        return None
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        # 任务应该自行处理错误，这里只保证一个任务的错误不会让调度器停止
+        Log.error("Scheduled task failed: %s", err)
+        _state['current'] = None
+        return None
+    finally:
+        check_hooks()
+    return wait or 0.0
+
+
+def _tick():
+    """
+    定时器函数：在时间预算内执行任务的步骤，预算用完后让出主线程，下一次界面事件循环时继续
+
+    :return: 下次执行的间隔（秒），为None时定时器结束
+    """
+    start_time = time.perf_counter()
+    deadline = start_time + get_budget()
+    steps = 0
+    interval = 0.0
+    while True:
+        task = _next_task()
+        if task is None:
+            interval = IDLE_INTERVAL if _state['holds'] else None
+            break
+        wait = _step(task)
+        steps += 1
+        if wait:
+            interval = wait
+            break
+        if time.perf_counter() >= deadline:
+            interval = 0.0
+            break
+    last_tick['steps'] = steps
+    last_tick['busy'] = time.perf_counter() - start_time
+    return interval
+
+
+def run_steps(steps):
+    """
+    在当前线程中一次执行完生成器的所有步骤，需要等待时短暂休眠，用于同步调用的操作
+
+    :param steps: 生成器
+    :return: 生成器的返回值
+    """
+    while True:
+        try:
+            wait = next(steps)
+        except StopIteration as finished:
+            return finished.value
+        finally:
+            check_hooks()
+        if wait:
+            time.sleep(min(wait, 0.005))
+
+
+def finish_current():
+    """
+    同步执行完正在执行的任务，手动加载、卸载等操作之前调用，避免与分步执行的重载交错
+    """
+    task = _state['current']
+    if task is None:
+        return
+    try:
+        run_steps(task)
+    except Exception as err:  # pylint: disable=broad-exception-caught
+        Log.error("Scheduled task failed: %s", err)
+    finally:
+        if _state['current'] is task:
+            _state['current'] = None
+
+
+def cancel_current():
+    """
+    关闭正在执行的任务，生成器中的 finally 会被执行
+    """
+    task, _state['current'] = _state['current'], None
+    if task is not None:
+        task.close()
+
+
+def stop():
+    """
+    关闭所有任务并注销定时器，本插件注销时调用。未开始的任务被丢弃，正在执行的任务被关闭
+    """
+    with _lock:
+        _tasks.clear()
+    cancel_current()
+    _state['holds'].clear()
+    if bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.unregister(_tick)
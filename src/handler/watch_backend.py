@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+文件监控后端：轮询后端以及Linux下基于inotify的事件驱动后端
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from ..util.logger import Log
+from .dir_scanner import DirScanner
+
+# 轮询间隔（秒）：发现变化后使用最短间隔，之后每次没有变化的扫描乘以 POLL_BACKOFF，直到最长间隔
+MIN_POLL_INTERVAL = 0.25
+MAX_POLL_INTERVAL = 3.0
+POLL_BACKOFF = 1.5
+# 默认的 CPU 预算：扫描耗时占轮询间隔的最大比例，大型目录树的扫描间隔会相应变长
+DEFAULT_CPU_BUDGET = 0.02
+
+
+class PollingBackend:
+    """
+    轮询后端：定期增量扫描目录，比较文件的 st_mtime_ns 和大小，适用于所有平台。
+
+    扫描间隔是自适应的：刚发现变化时（通常是正在编辑）使用最短间隔，空闲时逐渐变长；
+    同时扫描耗时不超过间隔的 cpu_budget 比例，目录树很大时间隔会超过最长间隔。
+    """
+    name = 'polling'
+
+    def __init__(self, path, path_filter=None, cpu_budget=DEFAULT_CPU_BUDGET, stop_event=None):
+        """
+        :param path: 需要监视的目录路径
+        :param path_filter: PathFilter，决定哪些文件和目录需要监视
+        :param cpu_budget: 扫描耗时占扫描间隔的最大比例
+        :param stop_event: threading.Event，设置后正在进行的扫描提前结束
+        """
+        self.path = path
+        self.path_filter = path_filter
+        self.cpu_budget = cpu_budget
+        self.stop_event = stop_event
+        # 当前两次扫描之间的间隔（秒）
+        self.interval = MIN_POLL_INTERVAL
+        self.scanner = DirScanner(path, path_filter, stop_event)
+
+    @property
+    def stats(self):
+        """
+        :return: 最近一次扫描的统计信息（耗时、重新列出和跳过的目录数等）
+        """
+        return self.scanner.stats
+
+    def start(self):
+        """
+        建立初始的目录树
+        """
+        self.scanner.scan()
+
+    def fileno(self):
+        """
+        :return: None，轮询后端没有可以等待的文件描述符，由调度器按扫描间隔调用 read_changes(0)
+        """
+        return None
+
+    def read_changes(self, timeout):
+        """
+        等待一个扫描间隔后扫描目录，返回新增、修改或删除的文件路径。
+
+        :param timeout: 最长等待时间（秒），轮询后端取它与扫描间隔中较小的值
+        :return: 变化的文件路径集合
+        """
+        time.sleep(min(timeout, self.interval))
+        changed = self.scanner.scan()
+        self._adapt(changed)
+        return changed
+
+    def _adapt(self, changed):
+        """
+        根据这次扫描的结果和耗时计算下一次的扫描间隔
+
+        :param changed: 这次扫描发现的变化
+        """
+        if changed:
+            interval = MIN_POLL_INTERVAL
+        else:
+            interval = min(self.interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+        scan_seconds = self.scanner.stats.get('scan_ms', 0.0) / 1000.0
+        self.interval = max(interval, scan_seconds / self.cpu_budget)
+
+    def close(self):
+        """
+        释放后端资源
+        """
+        self.scanner = DirScanner(self.path, self.path_filter, self.stop_event)
+
+
+# inotify 常量，见 <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+
+def _load_libc():
+    """
+    加载提供inotify接口的libc，不可用时返回None
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class InotifyBackend:  # pylint: disable=too-many-instance-attributes
+    """
+    Linux inotify后端：由内核推送文件变化事件，空闲时不消耗CPU，保存后几毫秒内即可发现变化。
+    通过ctypes调用libc，不需要额外的依赖。
+    """
+    name = 'inotify'
+
+    def __init__(self, path, path_filter=None, stop_event=None):
+        """
+        :param path: 需要监视的目录路径
+        :param path_filter: PathFilter，被排除的目录不会被监视，被排除的文件的事件会被忽略
+        :param stop_event: threading.Event，设置后不再为更多的目录添加监视
+        """
+        self.path = path
+        self.path_filter = path_filter
+        self.stop_event = stop_event
+        self._libc = _load_libc()
+        if self._libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        self._fd = -1
+        # 监视描述符 -> 目录路径
+        self._watches = {}
+        # 根目录被删除或移走后为True，需要在目录恢复后重新创建后端
+        self.lost = False
+        # 事件驱动，不需要扫描
+        self.stats = {}
+
+    def _add_watch(self, dirpath):
+        """
+        为单个目录添加监视
+
+        :param dirpath: 目录路径
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(err, f"inotify_add_watch failed: {os.strerror(err)}", dirpath)
+        self._watches[wd] = dirpath
+
+    def _add_tree(self, dirpath, changed=None):
+        """
+        为目录及其所有子目录添加监视
+
+        :param dirpath: 目录路径
+        :param changed: 不为None时，把目录中已经存在的文件加入该集合（新建目录时文件可能先于监视出现）
+        """
+        path_filter = self.path_filter
+        if path_filter is not None and not path_filter.accepts_dir(dirpath):
+            return
+        for root, dirnames, files in os.walk(dirpath):
+            if self.stop_event is not None and self.stop_event.is_set():
+                return
+            if path_filter is not None:
+                # 在进入之前剪掉被排除的子目录
+                dirnames[:] = [
+                    name for name in dirnames
+                    if path_filter.accepts_dir(os.path.join(root, name))
+                ]
+            self._add_watch(root)
+            if changed is not None:
+                changed.update(
+                    filepath for filepath in (os.path.join(root, name) for name in files)
+                    if path_filter is None or path_filter.accepts_file(filepath)
+                )
+
+    def _remove_tree(self, dirpath):
+        """
+        移除目录及其所有子目录的监视（目录被移出监视范围时调用）
+
+        :param dirpath: 目录路径
+        """
+        prefix = dirpath + os.sep
+        for wd, path in list(self._watches.items()):
+            if path == dirpath or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def start(self):
+        """
+        创建inotify实例并监视整个目录树
+        """
+        self.lost = False
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        try:
+            self._add_tree(self.path)
+        except OSError:
+            self.close()
+            raise
+
+    def _read_events(self):
+        """
+        读取当前所有可读的事件
+
+        :return: 原始事件数据
+        """
+        chunks = []
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            chunks.append(data)
+        return b''.join(chunks)
+
+    def fileno(self):
+        """
+        :return: inotify 实例的文件描述符，有事件时可读，供调度器同时等待多个后端
+        """
+        return self._fd
+
+    def read_changes(self, timeout):
+        """
+        阻塞等待文件变化事件，返回变化的文件路径。
+
+        :param timeout: 最长等待时间（秒）
+        :return: 变化的文件路径集合；目录被删除或移走时包含该目录，事件队列溢出时包含监视根目录。
+                 根目录本身被删除或移走时 lost 变为True
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        data = self._read_events()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                changed.add(self.path)
+                continue
+            if mask & IN_IGNORED:
+                if self._watches.pop(wd, None) == self.path:
+                    self.lost = True
+                continue
+            dirpath = self._watches.get(wd)
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and dirpath == self.path:
+                # 根目录被删除、移走或者所在的磁盘被卸载，之后不会再收到其中的事件
+                self.lost = True
+            if dirpath is None or not name:
+                continue
+            filepath = os.path.join(dirpath, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(filepath, changed)
+                elif mask & IN_MOVED_FROM:
+                    self._remove_tree(filepath)
+                    changed.add(filepath)
+                elif mask & IN_DELETE:
+                    changed.add(filepath)
+                continue
+            if self.path_filter is None or self.path_filter.accepts_file(filepath):
+                changed.add(filepath)
+        return changed
+
+    def close(self):
+        """
+        关闭inotify实例，内核会自动移除所有监视
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._watches.clear()
+
+
+BACKENDS = {
+    PollingBackend.name: PollingBackend,
+    InotifyBackend.name: InotifyBackend,
+}
+
+
+def create_backend(path, backend_name='auto', path_filter=None,
+                   cpu_budget=DEFAULT_CPU_BUDGET, stop_event=None):
+    """
+    创建并启动文件监控后端。
+
+    参数:
+    - path: 需要监视的目录路径。
+    - backend_name: 'auto'、'inotify' 或 'polling'；'auto' 在支持的平台上优先使用inotify。
+    - path_filter: PathFilter，决定哪些文件和目录需要监视，为None时监视所有文件。
+    - cpu_budget: 轮询后端的扫描耗时占扫描间隔的最大比例。
+    - stop_event: threading.Event，设置后扫描和添加监视提前结束，停止监视时不需要等待遍历整个目录树。
+
+    返回:
+    - 已启动的后端对象，inotify不可用时退回轮询后端。
+
+    异常:
+    - FileNotFoundError: 目录不存在（例如被移走或所在的磁盘没有挂载）。
+    """
+    if not os.path.isdir(path):
+        raise FileNotFoundError(errno.ENOENT, "watched directory does not exist", path)
+    if backend_name == 'auto':
+        backend_name = InotifyBackend.name if _load_libc() is not None else PollingBackend.name
+    if backend_name != PollingBackend.name:
+        try:
+            backend = BACKENDS[backend_name](path, path_filter, stop_event=stop_event)
+            backend.start()
+            return backend
+        except (OSError, KeyError) as err:
+            Log.warning("watch backend '%s' unavailable, fallback to polling: %s",
+                        backend_name, err)
+    backend = PollingBackend(path, path_filter, cpu_budget, stop_event)
+    backend.start()
+    return backend
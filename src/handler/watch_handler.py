@@ -3,189 +3,923 @@
 """
 检查文件变动的方法
 """
+import errno
 import os
+import select
 import threading
 import time
 import bpy  # pylint: disable=import-error
 
 from ..util.logger import Log
+from ..util import trace
 from ..handler import package_mgr
-from ..data import py_models as pm
+from ..handler import module_loader
+from ..handler import watch_backend
+from ..handler import precompiler
+from ..handler import scheduler
+from ..data.hash_cache import HashCache, DIGEST_SIZE
+from ..data import file_index
+from ..data import import_graph as ig
+from ..util.path_filter import build_filter
+
+# 所有插件目录共用一个监控线程：watcher 为正在运行的 Watcher，没有监视的目录时为None。只在主线程中修改
+_state = {'watcher': None}
+# 停止监视所有目录（注销本插件）时等待监控线程结束的最长时间（秒）
+STOP_TIMEOUT = 0.05
+# 持久化的文件索引所在的目录，位于 Blender 的用户配置目录中
+INDEX_DIR = 'plugin_dev_helper/file_index'
+
+# 等待主线程重载的请求，按到达的顺序处理：
+# 标识符 -> {'path': 插件路径, 'changes': 变化的文件路径, 'timing': 第一批变化在监控线程中的各阶段耗时,
+#           'queued_at': 第一批变化交给主线程的时间, 'version': 最后一批变化的版本}，
+# 时间为 time.perf_counter()，changes 为空集合时比较所有模块的修改时间
+pending_reloads = {}
+pending_lock = threading.Lock()
+# 每个插件最后一批变化的版本号，每次有新的变化加1
+change_versions = {}
+# 正在分步执行的重载：{'identifier': 标识符, 'version': 版本, 'applying': 是否已经开始修改模块}
+active_reload = None  # pylint: disable=invalid-name
+
+# 没有其他需要处理的事情时，每次等待文件变化的最长时间（秒），超时后同步监视的目录并检查是否需要停止
+WAIT_TIMEOUT = 1.5
+# 默认的静默窗口（秒）：最后一次变化后这么久没有新的变化，才把这批变化交给重载
+DEFAULT_QUIET_WINDOW = 0.3
+# 监视出错后重试的等待时间（秒）：从 ERROR_BACKOFF_BASE 开始每次失败加倍，最长 ERROR_BACKOFF_MAX
+ERROR_BACKOFF_BASE = 0.5
+ERROR_BACKOFF_MAX = 30.0
+# 连续失败这么多次后断路：只按最长等待时间重试，日志中不再重复记录同样的错误
+CIRCUIT_THRESHOLD = 5
+
+
+class WatchedRoot:  # pylint: disable=too-many-instance-attributes
+    """
+    一个被监视的插件目录。
+
+    主线程根据插件槽位的设置创建，监控线程开始监视时才创建后端和哈希缓存，
+    所以扫描目录树、计算初始哈希都不会阻塞界面。
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(self, identifier, path, backend_name='auto', quiet_window=DEFAULT_QUIET_WINDOW,
+                 path_filter=None, cpu_budget=watch_backend.DEFAULT_CPU_BUDGET, index_file=None,
+                 loaded_files=None):
+        """
+        :param identifier: 插件槽位的标识符，变化会交给该标识符的重载
+        :param path: 需要监视的目录路径
+        :param backend_name: 监控后端，'auto'、'inotify' 或 'polling'
+        :param quiet_window: 静默窗口（秒），最后一次变化后经过这么久没有新变化才交给重载
+        :param path_filter: PathFilter，被排除的目录不会被遍历，被排除的文件的变化会被忽略
+        :param cpu_budget: 轮询后端的扫描耗时占扫描间隔的最大比例
+        :param index_file: 持久化的文件索引的路径，为None时不使用索引
+        :param loaded_files: 插件在本次会话中已经加载的模块的源文件：规范化的路径 -> 加载时的 st_mtime_ns，
+                             插件没有加载时为None
+        """
+        self.identifier = identifier
+        self.path = path
+        self.backend_name = backend_name
+        self.quiet_window = quiet_window
+        self.path_filter = path_filter
+        self.cpu_budget = cpu_budget
+        self.index_file = index_file
+        self.loaded_files = loaded_files
+        # 开始监视时与索引比较的结果
+        self.index_stats = {}
+        # 最近一次保存的文件索引的 generation，以及串行化保存的锁
+        self._saved_generation = None
+        self._save_lock = threading.Lock()
+        # 所属 Watcher 的停止事件，扫描和建立基准时检查，停止时提前结束
+        self.stop_event = None
+        self.backend = None
+        # 文件内容哈希缓存，用于跳过内容没有变化的重载
+        self.hash_cache = None
+        # 当前正在合并的一批变化，最后一次发现变化的时间，以及这批变化的各阶段耗时
+        self.batch = set()
+        self.last_change = 0.0
+        self.timing = {}
+        # 轮询后端下一次扫描的时间（time.monotonic()）
+        self.next_poll = 0.0
+        # 连续失败的次数、最近一次的错误，以及出错后下一次重试的时间（time.monotonic()）
+        self.failures = 0
+        self.last_error = None
+        self.retry_at = 0.0
+
+    @property
+    def circuit_open(self):
+        """
+        :return: 是否因为连续失败而断路
+        """
+        return self.failures >= CIRCUIT_THRESHOLD
+
+    def start(self):
+        """
+        创建监控后端，并建立已加载的基准。
+
+        有持久化的文件索引时，大小和修改时间没有变化的文件直接使用索引中的摘要，不需要重新读取；
+        与索引比较可以知道上次会话之后哪些文件发生了变化。已经加载的模块在加载之后又被修改的文件，
+        会作为第一批变化交给重载，所以开始监视之前的修改也会被增量重载
+        """
+        self._open_backend()
+        cache = HashCache(self.path)
+        index = None
+        if self.index_file is not None:
+            index = file_index.load(self.index_file, self.path, DIGEST_SIZE)
+        if index is not None:
+            cache.restore(index)
+        current = cache.seed(self.path, self.path_filter, self.stop_event, self._keeps_baseline)
+        if current is None:
+            # 正在停止监视
+            return
+        self.hash_cache = cache
+        if index is not None:
+            added, modified, removed = file_index.diff(index, current)
+            self.index_stats = {'added': len(added), 'modified': len(modified),
+                                'removed': len(removed), 'hashed': cache.hashed,
+                                'files': len(current)}
+            Log.info("watch '%s': %d added, %d modified, %d removed since the last session, "
+                     "hashed %d of %d files", self.path, len(added), len(modified), len(removed),
+                     cache.hashed, len(current))
+        changed = cache.filter_changed(current.keys() | set(cache.loaded_paths()))
+        # 立即保存新的基准，之后停止监视时索引没有变化就不需要再保存
+        self.save_index()
+        if changed:
+            self.batch.update(changed)
+            self.timing = {'scan': (time.perf_counter(), time.perf_counter(), {'index': True})}
+            self.last_change = time.monotonic()
+
+    def _keeps_baseline(self, path, mtime_ns):
+        """
+        开始监视时，文件是保留索引中记录的已加载基准，还是以当前内容为基准
+
+        :param path: 文件路径
+        :param mtime_ns: 文件当前的 st_mtime_ns，文件已经不存在时为None
+        :return: 文件是已经加载的模块的源文件，并且在加载之后被修改或删除时返回True；
+                 插件没有加载时，之后加载的就是当前的内容，返回False
+        """
+        if self.loaded_files is None:
+            return False
+        loaded_mtime = self.loaded_files.get(os.path.normcase(os.path.abspath(path)))
+        return loaded_mtime is not None and loaded_mtime != mtime_ns
+
+    def save_index(self):
+        """
+        把哈希缓存保存为持久化的文件索引，可以在任何线程中调用。索引在上一次保存之后没有变化时不再写入
+        """
+        cache = self.hash_cache
+        if cache is None or self.index_file is None:
+            return
+        # 加载后在线程池中保存和停止监视时在监控线程中保存可能同时发生：
+        # 在锁内取快照并写入，最后完成的保存总是最新的索引
+        with self._save_lock:
+            if cache.generation == self._saved_generation:
+                return
+            index = cache.snapshot()
+            try:
+                file_index.save(self.index_file, index)
+            except OSError as err:
+                Log.warning("failed to save file index of '%s': %s", self.path, err)
+                return
+            self._saved_generation = index.generation
+
+    def _open_backend(self):
+        """
+        创建并启动监控后端，目录不存在时抛出 FileNotFoundError
+        """
+        self.backend = watch_backend.create_backend(self.path, self.backend_name, self.path_filter,
+                                                    self.cpu_budget, self.stop_event)
+        Log.info("watch '%s' with %s backend", self.path, self.backend.name)
+        self.next_poll = time.monotonic() + getattr(self.backend, 'interval', 0.0)
 
-# 全局变量
-watch_thread = None  # pylint: disable=invalid-name
-is_running = False  # pylint: disable=invalid-name
+    def _restart(self):
+        """
+        出错后重新开始监视。中断期间的变化无法从后端得知，
+        所以把所有已加载的文件加入这批变化，由哈希缓存找出内容确实变化的文件
+        """
+        if self.hash_cache is None:
+            self.start()
+            return
+        self._open_backend()
+        self.batch.update(self.hash_cache.loaded_paths())
+        self.timing = {'scan': (time.perf_counter(), time.perf_counter(), {'restart': True})}
+        self.last_change = time.monotonic()
+
+    def fail(self, err, now):
+        """
+        记录一次失败：关闭后端，按指数退避安排下一次重试。
+        只在第一次失败和断路时输出警告，避免目录长时间不可用时日志被同样的错误填满
+
+        :param err: 异常
+        :param now: time.monotonic()
+        """
+        self.failures += 1
+        self.last_error = str(err)
+        delay = min(ERROR_BACKOFF_BASE * 2 ** (self.failures - 1), ERROR_BACKOFF_MAX)
+        if self.circuit_open:
+            delay = ERROR_BACKOFF_MAX
+        self.retry_at = now + delay
+        if self.backend is not None:
+            try:
+                self.backend.close()
+            except OSError:
+                pass
+            self.backend = None
+        if self.failures == 1:
+            Log.warning("watch '%s' failed, retry in %.1f s: %s", self.path, delay, err)
+        elif self.failures == CIRCUIT_THRESHOLD:
+            Log.warning("watch '%s' failed %d times, circuit open, retry every %.0f s: %s",
+                        self.path, self.failures, delay, err)
+        else:
+            Log.debug("watch '%s' failed %d times: %s", self.path, self.failures, err)
+
+    def _recovered(self):
+        """
+        出错之后第一次成功时清除失败记录
+        """
+        if self.failures:
+            Log.info("watch '%s' recovered after %d failures", self.path, self.failures)
+        self.failures = 0
+        self.last_error = None
+
+    def poll(self, readable, now, callback):
+        """
+        处理这个目录：出错后等待重试时间，到时重新开始监视；否则读取变化并在静默窗口结束后交给回调函数。
+        一个目录出错只影响它自己，不会让监控线程空转或者影响其他目录
+
+        :param readable: 可读的文件描述符
+        :param now: time.monotonic()
+        :param callback: 回调函数
+        """
+        try:
+            if self.backend is None:
+                if now < self.retry_at:
+                    return
+                self._restart()
+            else:
+                self.collect(readable, now)
+            self.flush(callback, now)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            self.fail(err, time.monotonic())
+            return
+        self._recovered()
 
-last_modified_times = {}
-known_paths = set()
+    def close(self):
+        """
+        停止监视，保存文件索引并释放后端资源
+        """
+        self.save_index()
+        backend, self.backend = self.backend, None
+        self.hash_cache = None
+        if backend is not None:
+            backend.close()
 
+    def timeout(self, now):
+        """
+        :param now: time.monotonic()
+        :return: 距离这个目录下一次需要处理（静默窗口结束或轮询扫描）的秒数
+        """
+        if self.backend is None:
+            return max(0.0, self.retry_at - now)
+        timeout = WAIT_TIMEOUT
+        if self.batch:
+            timeout = self.quiet_window - (now - self.last_change)
+        if self.backend.fileno() is None:
+            timeout = min(timeout, self.next_poll - now)
+        return max(0.0, timeout)
+
+    def collect(self, readable, now):
+        """
+        读取后端发现的变化，合并到当前这批变化中。
+        事件驱动的后端只在其文件描述符可读时读取，轮询后端到了扫描时间才扫描。
 
-# 定义一个监控指定目录变化的函数
-def watch_directory(path, callback):
+        :param readable: 可读的文件描述符
+        :param now: time.monotonic()
+        """
+        fileno = self.backend.fileno()
+        if fileno is None:
+            if now < self.next_poll:
+                return
+            changes = self.backend.read_changes(0)
+            self.next_poll = time.monotonic() + self.backend.interval
+        elif fileno in readable:
+            changes = self.backend.read_changes(0)
+            if self.backend.lost:
+                raise FileNotFoundError(errno.ENOENT, "watched directory was removed", self.path)
+        else:
+            return
+        if not changes:
+            return
+        if not self.batch:
+            # 记录发现这批变化的那次扫描，轮询后端会提供扫描耗时
+            detected = time.perf_counter()
+            self.timing = {'scan': (detected - self.backend.stats.get('scan_ms', 0.0) / 1000.0,
+                                    detected, {})}
+        self.batch.update(changes)
+        self.last_change = time.monotonic()
+
+    def flush(self, callback, now):
+        """
+        静默窗口结束后，把这批变化交给回调函数
+
+        :param callback: 回调函数
+        :param now: time.monotonic()
+        """
+        if self.batch and now - self.last_change >= self.quiet_window:
+            batch, self.batch = self.batch, set()
+            _dispatch_batch(self, batch, self.timing, callback)
+
+
+class Watcher:
     """
-    监视指定目录中的文件变化。
+    共享的监控线程：同时等待所有插件目录的变化，把每批变化交给所属插件的重载。
 
-    当目录中的文件被创建、修改或删除时，调用回调函数。
+    同一次检查以及静默窗口内发生的所有变化会合并为一批，只调用一次回调函数，
+    避免 git checkout 或格式化工具修改大量文件时触发多次重载。
 
-    参数:
-    - path: 需要监视的目录路径。
-    - callback: 当文件变化时调用的回调函数，无参数，无返回值。
+    单个目录出错（例如目录被移走或所在的磁盘没有挂载）时按指数退避重试，连续失败后断路，
+    出错的状态可以在面板中查看；循环本身出错时同样退避，不会空转占满CPU。
+
+    线程的等待、扫描和建立基准都会检查停止事件，停止时通过唤醒管道（或事件）立即打断等待，
+    所以停止只需要几毫秒，与目录树的大小无关。添加目录时同样唤醒线程，新目录立即开始监视。
     """
-    global is_running, last_modified_times, known_paths  # pylint: disable=global-variable-not-assigned
 
-    # 获取所有文件路径（包括子目录）
-    def get_all_files(dir_path):
+    def __init__(self, callback):
+        """
+        :param callback: 当文件变化时调用的回调函数，参数为标识符、插件路径、这批变化的文件路径（frozenset）
+            以及这批变化在监控线程中的各阶段耗时（阶段名 -> (开始, 结束, 附加信息)），无返回值。
+            回调之前会先在线程池中把变化的 .py 文件编译到 __pycache__，主线程导入时只需要读取 .pyc。
+        """
+        self.callback = callback
+        # 需要监视的目录：标识符 -> WatchedRoot，由主线程修改，监控线程在每次循环开始时同步
+        self.roots = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        # 唤醒等待中的线程：没有文件描述符可以等待时使用事件，否则使用管道（只在支持的平台上创建）
+        self._wake_event = threading.Event()
+        self._wake_fds = os.pipe() if os.name == 'posix' else None
+        if self._wake_fds is not None:
+            for fd in self._wake_fds:
+                os.set_blocking(fd, False)
+        self.thread = threading.Thread(target=self._run, name='pdh_watcher', daemon=True)
+
+    def start(self):
+        """
+        启动监控线程
+        """
+        self.thread.start()
+
+    def add(self, root):
         """
-        递归获取指定目录及其子目录中的所有文件路径。
+        开始监视一个目录，同一个标识符的旧目录会被替换
 
-        参数:
-        - dir_path: 目录路径。
+        :param root: WatchedRoot
+        """
+        root.stop_event = self.stop_event
+        with self.lock:
+            self.roots[root.identifier] = root
+        self.wake()
 
-        返回:
-        - 包含所有文件路径的集合。
+    def remove(self, identifier):
         """
-        all_files = set()
-        for root, _, files in os.walk(dir_path):
-            for filename in files:
-                filepath = os.path.join(root, filename)
-                all_files.add(filepath)
-        return all_files
+        停止监视一个目录
 
-    # 初始化文件修改时间
-    known_paths = get_all_files(path)
-    for filepath in known_paths:
-        last_modified_times[filepath] = os.path.getmtime(filepath)
+        :param identifier: 插件槽位的标识符
+        :return: 是否已经没有需要监视的目录
+        """
+        with self.lock:
+            self.roots.pop(identifier, None)
+            empty = not self.roots
+        self.wake()
+        return empty
 
-    # 监控循环
-    while is_running:
-        try:
-            # 获取当前所有文件
-            current_files = get_all_files(path)
+    def get(self, identifier):
+        """
+        :param identifier: 插件槽位的标识符
+        :return: WatchedRoot，没有监视时返回None
+        """
+        return self.roots.get(identifier)
 
-            # 检查新文件和修改的文件
-            for filepath in current_files:
+    def wake(self):
+        """
+        唤醒正在等待的监控线程，让它立即同步目录或检查停止事件，可以在任何线程中调用
+        """
+        self._wake_event.set()
+        with self.lock:
+            if self._wake_fds is not None:
                 try:
-                    current_mtime = os.path.getmtime(filepath)
-
-                    # 新文件或文件被修改
-                    if filepath not in last_modified_times:
-                        last_modified_times[filepath] = current_mtime
-                        known_paths.add(filepath)
-                        callback()
-                    elif current_mtime != last_modified_times[filepath]:
-                        last_modified_times[filepath] = current_mtime
-                        callback()
-                except OSError:
-                    continue
-
-            # 检查删除的文件
-            deleted_files = known_paths - current_files
-            if deleted_files:
-                for filepath in deleted_files:
-                    known_paths.remove(filepath)
-                    last_modified_times.pop(filepath, None)
-                callback()
-
-            # 休眠一段时间再检查
-            time.sleep(1.5)
+                    os.write(self._wake_fds[1], b'\0')
+                except (BlockingIOError, OSError):
+                    # 管道已满时线程已经会被唤醒
+                    pass
 
-        except Exception as err:  # pylint: disable=broad-exception-caught
-            Log.warning(f"监控时发生错误: {err}")
-            continue
+    def stop(self, timeout=0.0):
+        """
+        停止监控线程，不会阻塞界面：设置停止事件并唤醒线程，最多等待 timeout 秒。
+        线程在下一次检查停止事件时关闭所有后端并结束，正在进行的扫描会在当前目录之后放弃
+
+        :param timeout: 最长等待时间（秒），为0时不等待
+        :return: 线程是否已经结束
+        """
+        self.stop_event.set()
+        self.wake()
+        if timeout > 0 and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def _run(self):
+        """
+        监控线程的主循环，停止事件被设置或者所有目录都停止监视后结束
+        """
+        # 监控线程已经开始监视的目录：标识符 -> WatchedRoot
+        started = {}
+        # 循环本身连续出错的次数
+        loop_failures = 0
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    # 之后的唤醒都会让这一次的等待立即返回
+                    self._wake_event.clear()
+                    with self.lock:
+                        configured = dict(self.roots)
+                    if not configured:
+                        break
+                    self._sync(started, configured)
+                    now = time.monotonic()
+                    timeout = min((root.timeout(now) for root in started.values()),
+                                  default=WAIT_TIMEOUT)
+                    readable = self._wait(started.values(), timeout)
+                    now = time.monotonic()
+                    for root in started.values():
+                        if self.stop_event.is_set():
+                            break
+                        root.poll(readable, now, self.callback)
+                    loop_failures = 0
+                except Exception as err:  # pylint: disable=broad-exception-caught
+                    loop_failures += 1
+                    if loop_failures == 1:
+                        Log.warning("监控时发生错误: %s", err)
+                    self.stop_event.wait(
+                        min(ERROR_BACKOFF_BASE * 2 ** (loop_failures - 1), WAIT_TIMEOUT))
+        finally:
+            for root in started.values():
+                root.close()
+            with self.lock:
+                fds, self._wake_fds = self._wake_fds, None
+            for fd in fds or ():
+                os.close(fd)
+            Log.debug("watcher thread stopped")
+
+    def _sync(self, started, configured):
+        """
+        让监控线程正在监视的目录与主线程的配置一致：停止已经移除或被替换的目录，开始监视新的目录
+
+        :param started: 监控线程已经开始监视的目录，会被修改
+        :param configured: 主线程配置的目录
+        """
+        for identifier, root in list(started.items()):
+            if configured.get(identifier) is not root:
+                root.close()
+                del started[identifier]
+        for identifier, root in configured.items():
+            if identifier in started or self.stop_event.is_set():
+                continue
+            try:
+                root.start()
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                # 目录暂时不可用时按退避时间重试，而不是停止监视
+                root.fail(err, time.monotonic())
+            started[identifier] = root
+
+    def _wait(self, roots, timeout):
+        """
+        同时等待所有事件驱动后端的文件描述符和唤醒管道，没有后端的文件描述符时等待唤醒事件
+
+        :param roots: 正在监视的目录
+        :param timeout: 最长等待时间（秒）
+        :return: 可读的文件描述符集合
+        """
+        fds = [fileno for fileno in (root.backend.fileno() for root in roots
+                                     if root.backend is not None)
+               if fileno is not None]
+        wake_fd = self._wake_fds[0] if self._wake_fds is not None else None
+        if not fds or wake_fd is None:
+            self._wake_event.wait(timeout)
+            return set()
+        if self._wake_event.is_set():
+            timeout = 0.0
+        readable, _, _ = select.select(fds + [wake_fd], [], [], timeout)
+        if wake_fd in readable:
+            try:
+                while os.read(wake_fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        return set(readable)
+
+
+def _dispatch_batch(root, batch, timing, callback):
+    """
+    把静默窗口结束的一批变化交给回调函数：
+    先跳过内容没有变化的文件，再在线程池中预先编译，主线程的定时器执行时 .pyc 已经是最新的。
+
+    参数:
+    - root: 发生变化的 WatchedRoot。
+    - batch: 这批变化的文件路径。
+    - timing: 这批变化的各阶段耗时，会补充去抖、哈希检查和预编译的耗时。
+    - callback: 回调函数。
+    """
+    hash_start = time.perf_counter()
+    timing['debounce'] = (timing['scan'][1], hash_start, {'files': len(batch)})
+    # 只保留内容与上一次成功加载时不同的文件
+    changed = root.hash_cache.filter_changed(batch)
+    compile_start = time.perf_counter()
+    timing['hash check'] = (hash_start, compile_start, {'changed': len(changed)})
+    if not changed:
+        Log.info("%d files touched but content unchanged, skip reload", len(batch))
+        return
+    compile_stats = precompiler.precompile(changed)
+    timing['precompile'] = (compile_start, time.perf_counter(), compile_stats)
+    callback(root.identifier, root.path, frozenset(changed), timing)
+
+
+def get_scan_stats(identifier):
+    """
+    获取插件目录的监控后端最近一次扫描的统计信息，用于在面板中显示每次扫描的耗时。
+
+    参数:
+    identifier: 插件槽位的标识符
+
+    返回值:
+    包含 scan_ms、dirs_listed、dirs_skipped、files_checked、changed 的字典；
+    未在监控或后端不需要扫描时返回空字典
+    """
+    root = _get_root(identifier)
+    backend = root.backend if root is not None else None
+    if backend is None:
+        return {}
+    return backend.stats
+
+
+def get_watch_health(identifier):
+    """
+    获取插件目录的监视状态，用于在面板中显示出错和断路的情况。
+
+    参数:
+    identifier: 插件槽位的标识符
+
+    返回值:
+    包含 failures（连续失败次数）、circuit_open（是否断路）、error（最近一次的错误）、
+    retry_in（距离下一次重试的秒数）、interval（轮询后端当前的扫描间隔，秒）、
+    index（开始监视时与持久化的文件索引比较的结果，没有索引时为空）的字典；
+    未在监控时返回空字典
+    """
+    root = _get_root(identifier)
+    if root is None:
+        return {}
+    backend = root.backend
+    return {
+        'failures': root.failures,
+        'circuit_open': root.circuit_open,
+        'error': root.last_error,
+        'retry_in': max(0.0, root.retry_at - time.monotonic()) if backend is None else 0.0,
+        'interval': getattr(backend, 'interval', None),
+        'index': root.index_stats,
+    }
+
+
+def is_watching(identifier):
+    """
+    参数:
+    identifier: 插件槽位的标识符
+
+    返回值:
+    该插件目录是否正在被监视
+    """
+    return _get_root(identifier) is not None
+
+
+def _get_root(identifier):
+    """
+    参数:
+    identifier: 插件槽位的标识符
+
+    返回值:
+    正在监视的 WatchedRoot，没有时返回None
+    """
+    watcher = _state['watcher']
+    return watcher.get(identifier) if watcher is not None else None
 
 
 # 切换监控状态的函数
-def toggle_watcher(callback):
+def toggle_watcher(identifier, package_path, enabled, callback):
     """
-    启动或停止监控线程以根据自动更新设置监控指定路径的更改。
+    开始或停止监视一个插件目录。所有目录共用一个监控线程，第一个目录开始监视时启动线程，
+    最后一个目录停止监视时通知线程结束但不等待，所以切换监视状态不会阻塞界面。
 
     参数:
+    identifier: 插件槽位的标识符
+    package_path: 插件目录的路径
+    enabled: 是否监视
     callback: 当监控路径发生变化时调用的回调函数。
 
     返回值:
     无
     """
-    global watch_thread  # pylint: disable=global-statement
-    global is_running  # pylint: disable=global-statement
     # 记录当前自动更新的状态
-    Log.info(f"change watcher state: {bpy.context.scene.is_auto_update}")
-    if bpy.context.scene.is_auto_update:
-        # 启动监控
-        if watch_thread is None:
-            is_running = True
-            # 替换为实际路径
-            path_to_watch = bpy.context.scene.plugin_path
-            # 创建并启动监控线程
-            watch_thread = threading.Thread(
-                target=watch_directory,
-                args=(path_to_watch, callback),
-                daemon=True
-            )
-            watch_thread.start()
+    Log.info("change watcher state of plugin %s: %s", identifier, enabled)
+    watcher = _state['watcher']
+    if not enabled:
+        if watcher is not None and watcher.remove(identifier):
+            watcher.stop()
+            _state['watcher'] = None
+        scheduler.release(('watch', identifier))
+        return
+    scene = bpy.context.scene
+    # 监控线程提交的重载由调度器的持久定时器执行，监视期间定时器保持运行
+    scheduler.hold(('watch', identifier))
+    # 替换为实际路径
+    path_to_watch = os.path.normpath(package_path)
+    # 监控规则：默认规则、.gitignore、清单文件中的排除规则以及用户规则
+    path_filter = build_filter(path_to_watch, scene.watch_include, scene.watch_exclude,
+                               scene.watch_use_gitignore, scene.watch_use_manifest)
+    # 已经加载的模块的源文件及其加载时的修改时间，用于判断开始监视之前是否已经有没有重载的修改
+    graph = ig.get_graph(identifier)
+    loaded_files = None
+    if graph is not None:
+        loaded_files = {os.path.normcase(os.path.abspath(filepath)): mtime
+                        for filepath, mtime in graph.module_files.values()}
+    index_dir = bpy.utils.user_resource('CONFIG', path=INDEX_DIR)
+    root = WatchedRoot(identifier, path_to_watch, scene.watch_backend.lower(),
+                       scene.reload_debounce, path_filter, scene.watch_cpu_budget / 100.0,
+                       os.path.join(index_dir, file_index.index_name(path_to_watch)),
+                       loaded_files)
+    if watcher is None:
+        # 创建并启动监控线程
+        watcher = _state['watcher'] = Watcher(callback)
+        watcher.add(root)
+        watcher.start()
     else:
-        # 停止监控
-        is_running = False
-        try:
-            # 确保监控线程正确停止
-            if watch_thread and isinstance(watch_thread, threading.Thread):
-                watch_thread.join()
-                watch_thread = None
-        except Exception as err:  # pylint: disable=broad-exception-caught
-            # 记录停止监控时的错误
-            Log.warning(f"stop watcher error: {err}")
-            watch_thread = None
+        watcher.add(root)
 
 
 def stop_watch():
     """
-    停止运行计时器线程。
+    停止监视所有插件目录，本插件注销时调用。
 
-    此函数将全局变量is_running设置为False，并尝试停止并清理计时器线程（watch_thread）。
-    如果线程存在且为threading.Thread实例，它将等待线程结束并将其设置为None。
-    如果在尝试停止线程时发生AttributeError，它将记录一个警告消息，并同样将线程对象设置为None。
+    通知监控线程停止并最多等待 STOP_TIMEOUT 秒：线程在等待时会被立即唤醒，扫描大型目录时也会在当前目录之后放弃，
+    通常几毫秒内结束；没有按时结束的线程是守护线程，结束时自行关闭后端，不会阻塞界面。
     """
-    global is_running  # pylint: disable=global-statement
-    global watch_thread  # pylint: disable=global-statement
-    is_running = False  # 设置全局变量，表示计时器应停止运行
+    watcher, _state['watcher'] = _state['watcher'], None
+    if watcher is None:
+        return
+    for identifier in list(watcher.roots):
+        scheduler.release(('watch', identifier))
     try:
-        # 检查watch_thread是否存在且为正确的线程类型
-        if watch_thread and isinstance(watch_thread, threading.Thread):
-            watch_thread.join()  # 等待线程结束
-            watch_thread = None  # 线程结束后将其设置为None
+        if not watcher.stop(STOP_TIMEOUT):
+            Log.debug("watcher thread is still finishing a directory and stops on its own")
     except Exception as err:  # pylint: disable=broad-exception-caught
-        # 如果发生AttributeError，记录错误并设置线程对象为None
-        Log.warning(f"stop watcher error: {err}")
-        watch_thread = None
+        Log.warning("stop watcher error: %s", err)
+    precompiler.shutdown()
 
 
-# 注册一个定时器来重新加载模块
-def reload_modules_callback():
-    """
-    经过测试，这样可以让方法回到主线程执行，该方法API文档中有e.g. 但是不知道为什么这样设计
+# 把重载请求交给主线程的调度器
+def reload_modules_callback(identifier, package_path, changed_paths=None, timing=None):
     """
-    bpy.app.timers.register(reload_modules)
+    把变化的文件交给主线程重载，可以在监控线程中调用。
 
+    变化的文件会先合并到该插件的待重载请求中；只有插件还没有待重载的请求时才向调度器提交一个重载任务，
+    这样在主线程执行之前到达的多批变化只会触发一次重载。所有插件共用调度器的一个持久定时器，
+    不会为每次变化注册新的定时器。
 
-# 重新加载所有模块
+    参数:
+    identifier: 插件槽位的标识符
+    package_path: 插件目录的路径，无法增量重载时用于完整重载
+    changed_paths: 这批变化的文件路径，为None时由重载过程自行比较修改时间
+    timing: 这批变化在监控线程中的各阶段耗时，多批变化合并时只保留第一批的
+    """
+    with pending_lock:
+        request = pending_reloads.get(identifier)
+        is_new = request is None
+        if is_new:
+            request = pending_reloads[identifier] = {
+                'path': package_path, 'changes': set(), 'timing': timing,
+                'queued_at': time.perf_counter(),
+            }
+        if changed_paths is not None and (is_new or request['changes']):
+            request['changes'].update(changed_paths)
+        elif changed_paths is None:
+            request['changes'].clear()
+        change_versions[identifier] = change_versions.get(identifier, 0) + 1
+        request['version'] = change_versions[identifier]
+    if is_new:
+        scheduler.submit(reload_modules)
+
+
+# 重新加载发生变化的模块
 def reload_modules():
     """
-    重新加载模块函数：
-    本函数旨在更新插件中的模块，通过卸载旧模块并加载更新后的模块实现。
-    这对于确保插件在使用最新版本的模块时能够正常运行至关重要。
+    重新加载模块的任务，由调度器在主线程中分步执行：
+    本函数旨在更新插件中的模块，只卸载并重新加载发生变化的模块以及导入了它们的模块，
+    无法增量重载时退回到完整的卸载和加载。
+    每次重载的各阶段耗时都会记录下来，可以在面板中查看或导出。
+
+    每个任务处理最早到达的一个插件的请求。先计算需要重载的模块，并在线程池中准备代码对象和热补丁，
+    热补丁准备期间每隔 PREPARE_POLL_INTERVAL 秒检查一次；之后按模块分步卸载、执行并注册，
+    导入每个模块之前只等待该模块的代码对象，每次定时器执行只占用主线程一个时间预算，界面在重载期间仍然可以响应。
+
+    重载期间同一个插件又有新的变化时：还没有开始修改模块的重载被取消，它的变化合并到新的请求中；
+    已经开始修改模块的重载在每一步之后把新变化中还没有导入的模块重新准备，合并到这次重载中，
+    其余的变化留给之后的重载。这样不会先加载过时的源码再紧接着重载一次。
+
+    返回值:
+    生成器，yield 的正数表示需要等待的秒数
     """
+    global active_reload  # pylint: disable=global-statement
+    request = _take_request()
+    if request is None:
+        return
+    identifier, package_path, changed_paths, version, reload_trace = request
+    state = active_reload = {'identifier': identifier, 'version': version, 'applying': False}
+    job = None
     try:
-        # 卸载所有需要更新的模块
-        for module in pm.get_modules(1):
-            package_mgr.unload_package(module)
+        try:
+            job = package_mgr.begin_reload(package_path, changed_paths, identifier)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            job, changed_paths = None, None
+            state['applying'] = True
+            yield from _full_reload(identifier, package_path, err)
+        if job is not None:
+            while not job.ready():
+                yield module_loader.PREPARE_POLL_INTERVAL
+                if _supersede(identifier, changed_paths, reload_trace):
+                    return
+            state['applying'] = True
+            if job.plan is None:
+                changed_paths = None
+            try:
+                changed_paths = yield from _finish_steps(identifier, job, changed_paths,
+                                                         reload_trace)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                changed_paths = None
+                yield from _full_reload(identifier, package_path, err)
+        mark_loaded(identifier, changed_paths)
+    finally:
+        if job is not None and not state['applying'] and job.finder is not None:
+            job.finder.cancel()
+        if active_reload is state:
+            active_reload = None
+        trace.finish(reload_trace)
+
+
+def _supersede(identifier, changed_paths, reload_trace):
+    """
+    还在准备阶段的重载有了更新的变化时，把这次的变化合并到新的请求中，由新的请求重载
 
-        # 清除标识符以准备重新加载
-        pm.clear_identifier(1)
-    except Exception as err:  # pylint: disable=broad-exception-caught
-        # 如果卸载或清除标识符过程中出现错误，记录警告
-        Log.warning(f"Failed to unregister {err}")
+    参数:
+    identifier: 插件槽位的标识符
+    changed_paths: 这次重载的变化文件路径，为None时表示比较所有模块的修改时间
+    reload_trace: 这次重载的记录
+
+    返回值:
+    这次重载是否被取消
+    """
+    with pending_lock:
+        request = pending_reloads.get(identifier)
+        if request is None:
+            return False
+        if changed_paths is None:
+            request['changes'].clear()
+        elif request['changes']:
+            request['changes'].update(changed_paths)
+        version = request['version']
+    reload_trace.count('superseded')
+    Log.info("Reload of plugin %s superseded by change version %d", identifier, version)
+    return True
+
+
+def _merge_newer(identifier, job, reload_trace):
+    """
+    把重载期间新到达的变化合并到正在进行的重载中。新请求的变化全部合并之后移除新请求，不再单独重载
+
+    参数:
+    identifier: 插件槽位的标识符
+    job: 正在执行的 ReloadJob
+    reload_trace: 这次重载的记录
+
+    返回值:
+    合并的文件路径集合，没有可以合并的变化时返回空集合
+    """
+    with pending_lock:
+        request = pending_reloads.get(identifier)
+        if request is None or not request['changes']:
+            return set()
+        merged = job.merge(request['changes'])
+        if not merged:
+            return merged
+        request['changes'] -= merged
+        if not request['changes']:
+            del pending_reloads[identifier]
+            reload_trace.count('merged_requests')
+    reload_trace.count('merged_files', len(merged))
+    return merged
+
+
+def _finish_steps(identifier, job, changed_paths, reload_trace):
+    """
+    分步完成重载，每一步之后合并这个插件新到达的变化
+
+    参数:
+    identifier: 插件槽位的标识符
+    job: 准备完成的 ReloadJob
+    changed_paths: 这次重载的变化文件路径，为None时表示比较所有模块的修改时间
+    reload_trace: 这次重载的记录
+
+    返回值:
+    生成器，返回这次重载加载的变化文件路径（包括合并进来的），为None时表示所有文件
+    """
+    steps = package_mgr.iter_finish_reload(job)
+    try:
+        for wait in steps:
+            yield wait
+            merged = _merge_newer(identifier, job, reload_trace)
+            if merged and changed_paths is not None:
+                changed_paths = set(changed_paths) | merged
+    finally:
+        steps.close()
+    return changed_paths
 
-    # 加载更新后的插件包
-    package_mgr.load_package(bpy.context.scene.plugin_path)
+
+def _take_request():
+    """
+    取出最早到达的一个插件的重载请求，并开始记录这次重载的耗时
+
+    返回值:
+    (标识符, 插件路径, 变化的文件路径集合或None, 版本, ReloadTrace)，没有请求时返回None
+    """
+    with pending_lock:
+        if not pending_reloads:
+            return None
+        identifier = next(iter(pending_reloads))
+        request = pending_reloads.pop(identifier)
+    changed_paths = request['changes'] or None
+    reload_trace = trace.begin("auto reload", plugin=identifier, version=request['version'],
+                               files=len(changed_paths or ()))
+    for phase, (start, end, args) in (request['timing'] or {}).items():
+        reload_trace.add_span(phase, phase, start, end, trace.WATCHER_THREAD, **args)
+    reload_trace.add_span('queue wait', 'queue wait', request['queued_at'], reload_trace.start)
+    return identifier, request['path'], changed_paths, request['version'], reload_trace
+
+
+def discard_reload(identifier):
+    """
+    丢弃插件还没有完成的自动重载，在手动加载、卸载或移除插件槽位之前调用。
+
+    还在等待后台准备的重载没有修改任何模块，直接取消；已经开始分步卸载和加载的重载，
+    以及其他插件正在进行的重载会先同步执行完，避免与手动操作交错
+
+    参数:
+    identifier: 插件槽位的标识符
+    """
+    with pending_lock:
+        pending_reloads.pop(identifier, None)
+    state = active_reload
+    if state is None:
+        return
+    if state['identifier'] == identifier and not state['applying']:
+        scheduler.cancel_current()
+    else:
+        scheduler.finish_current()
+
+
+def _full_reload(identifier, package_path, err):
+    """
+    增量重载失败时记录警告，并分步完整重载
+
+    参数:
+    identifier: 插件槽位的标识符
+    package_path: 插件目录的路径
+    err: 增量重载时发生的异常
+    """
+    Log.warning("Failed to reload changed modules %s", err)
+    yield from package_mgr.iter_full_reload(package_path, identifier)
+
+
+def mark_loaded(identifier, changed_paths=None):
+    """
+    加载或重载成功后，更新插件目录的哈希缓存中已加载的基准，并在线程池中保存文件索引。
+
+    参数:
+    identifier: 插件槽位的标识符
+    changed_paths: 已重新加载的文件路径，为None时表示完整加载，所有文件都更新基准
+    """
+    root = _get_root(identifier)
+    cache = root.hash_cache if root is not None else None
+    if cache is None:
+        return
+    if changed_paths is None:
+        cache.mark_all_loaded()
+    else:
+        cache.mark_loaded(changed_paths)
+    # 保存新的基准，下次会话（或者重新开始监视）时只需要比较之后的修改
+    precompiler.get_executor().submit(root.save_index)
 
 
 if __name__ == "__main__":
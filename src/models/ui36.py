@@ -7,43 +7,197 @@
 包括了用户界面的布局、插件加载和卸载的功能操作。
 """
 
+import logging
+import os
+import time
 import webbrowser
 import bpy  # pylint: disable=import-error
 
 from ..handler import package_mgr
-from ..data import py_models as pm
-from ..handler.watch_handler import toggle_watcher, reload_modules_callback
+from ..handler import packager
+from ..handler import scheduler
+from ..handler.watch_handler import (toggle_watcher, reload_modules_callback, get_scan_stats,
+                                     get_watch_health, mark_loaded, discard_reload)
 from ..util.logger import Log
+from ..util import trace
+from ..util import log_store
 
+# 打包时压缩结果和文件索引的缓存目录（位于Blender的配置目录中）
+BUILD_CACHE_DIR = 'plugin_dev_helper/build_cache'
 
-class PluginPanel1(bpy.types.Panel):
+
+def get_slot(context, index):
+    """
+    获取场景中的插件槽位
+    :param context: Blender上下文
+    :param index: 槽位在列表中的位置
+    :return: PluginSlot，不存在时返回None
+    """
+    slots = context.scene.plugin_slots
+    return slots[index] if 0 <= index < len(slots) else None
+
+
+def add_slot(scene):
+    """
+    添加一个插件槽位，并分配一个没有使用过的标识符
+    :param scene: 场景
+    :return: 新的 PluginSlot
+    """
+    slots = scene.plugin_slots
+    identifier = max((slot.identifier for slot in slots), default=0) + 1
+    slot = slots.add()
+    slot.identifier = identifier
+    return slot
+
+
+def migrate_legacy_slot(scene):
+    """
+    把旧版本保存在场景中的插件路径和自动加载开关移到一个插件槽位中，然后清除旧的属性。
+    只写入保存的值，不触发自动加载的回调：与旧版本打开文件时相同，需要重新勾选才会开始监视
+    :param scene: 场景
+    """
+    if not scene.is_property_set("plugin_path") and not scene.is_property_set("is_auto_update"):
+        return
+    legacy_path = scene.plugin_path
+    if legacy_path and all(slot.plugin_path != legacy_path for slot in scene.plugin_slots):
+        slot = add_slot(scene)
+        slot.plugin_path = legacy_path
+        slot["is_auto_update"] = scene.is_auto_update
+        Log.info("Moved the plugin path saved by an older version into slot %s.", slot.identifier)
+    scene.property_unset("plugin_path")
+    scene.property_unset("is_auto_update")
+
+
+def toggle_slot_watcher(slot, context):  # pylint: disable=unused-argument
+    """
+    自动加载开关的回调，开始或停止监视槽位的插件目录
+    :param slot: PluginSlot
+    :param context: Blender上下文
+    """
+    toggle_watcher(slot.identifier, slot.plugin_path, slot.is_auto_update,
+                   reload_modules_callback)
+
+
+def build_extension_task(identifier, root, cache_dir):
+    """
+    打包扩展的任务，由调度器在主线程中分步执行：读取和压缩在线程池中进行，等待期间界面仍然可以响应
+    :param identifier: 插件槽位的标识符
+    :param root: 插件目录
+    :param cache_dir: 压缩结果和文件索引的缓存目录
+    :return: 生成器
+    """
+    try:
+        yield from packager.iter_build(root, cache_dir=cache_dir)
+    except (OSError, ValueError) as err:
+        Log.error("Build extension %s failed: %s", identifier, err)
+
+
+class PluginSlot(bpy.types.PropertyGroup):
+    """
+    一个开发插件的槽位：插件路径、自动加载开关，以及模块记录和重载使用的标识符。
+    """
+    identifier: bpy.props.IntProperty(default=0, options={'HIDDEN'})
+    plugin_path: bpy.props.StringProperty(
+        name="Plugin Path",
+        description="Path to the plugin file.",
+        default="",
+        maxlen=512,
+        subtype='FILE_PATH',
+    )
+    # 自动加载单选框
+    is_auto_update: bpy.props.BoolProperty(
+        name="Auto change detection(Not rec.)",
+        description="Enable/Disable Automatic check for changes and reload",
+        default=False,
+        update=toggle_slot_watcher
+    )
+
+
+class PluginPanel(bpy.types.Panel):
     """
     定义了一个插件操作面板类，用于显示在Blender的3D视图侧边栏中。
-    该面板主要提供了加载和卸载插件的功能操作。
+    该面板列出所有开发插件的槽位，每个槽位可以单独加载、卸载、重载和自动加载；
+    所有槽位的目录由同一个监控线程监视。
     """
-    bl_label = "DEV Plugin 1"
-    bl_idname = "VIEW3D_PT_dev_plugin1"
+    bl_label = "DEV Plugins"
+    bl_idname = "VIEW3D_PT_dev_plugins"
     bl_space_type = 'VIEW_3D'
     bl_region_type = 'UI'
     bl_category = "Addon DEV Helper"
     bl_order = 2
 
+    class AddSlot(bpy.types.Operator):
+        """
+        添加一个插件槽位。
+        """
+        bl_idname = "dev_plugin.add_slot"
+        bl_label = "Add Plugin"
+        bl_description = "Add a slot for another plugin in development"
+
+        def execute(self, context):
+            """
+            添加槽位，并分配一个没有使用过的标识符。
+            :param context: Blender上下文
+            :return: {'FINISHED'}
+            """
+            add_slot(context.scene)
+            return {'FINISHED'}
+
+    class RemoveSlot(bpy.types.Operator):
+        """
+        停止监视并卸载插件，然后移除它的槽位。
+        """
+        bl_idname = "dev_plugin.remove_slot"
+        bl_label = "Remove Plugin"
+        bl_description = "Unload the plugin and remove its slot"
+
+        index: bpy.props.IntProperty(options={'HIDDEN'})
+
+        def execute(self, context):
+            """
+            移除槽位。
+            :param context: Blender上下文
+            :return: 返回一个集合，表示操作完成或取消。
+            """
+            slot = get_slot(context, self.index)
+            if slot is None:
+                return {'CANCELLED'}
+            toggle_watcher(slot.identifier, slot.plugin_path, False, reload_modules_callback)
+            discard_reload(slot.identifier)
+            package_mgr.unload_all(slot.identifier)
+            context.scene.plugin_slots.remove(self.index)
+            return {'FINISHED'}
+
     class LoadPlugin(bpy.types.Operator):
         """
         定义了一个加载插件的操作类，继承自bpy.types.Operator。
         """
-        bl_idname = "plugin1.load"
-        bl_label = "Load Plugin 1"
+        bl_idname = "dev_plugin.load"
+        bl_label = "Load Plugin"
         bl_description = "Perform the operation of loading plugins"
 
+        index: bpy.props.IntProperty(options={'HIDDEN'})
+
         def execute(self, context):
             """
             执行加载插件操作的函数。
             :param context: Blender上下文，包含了当前场景、对象等信息。
             :return: 返回一个集合，表示操作完成。
             """
-            Log.info(f"Load plugin:{context.scene.plugin_path}")
-            package_mgr.load_package(context.scene.plugin_path)
+            slot = get_slot(context, self.index)
+            if slot is None:
+                return {'CANCELLED'}
+            if not slot.plugin_path or package_mgr.get_package_name(slot.plugin_path) is None:
+                self.report({'ERROR'}, f"Not a plugin package: {slot.plugin_path}")
+                return {'CANCELLED'}
+            Log.info("Load plugin %s: %s", slot.identifier, slot.plugin_path)
+            discard_reload(slot.identifier)
+            trace.begin("load", plugin=slot.identifier)
+            try:
+                package_mgr.load_package(slot.plugin_path, slot.identifier)
+            finally:
+                trace.finish()
+            mark_loaded(slot.identifier)
 
             return {'FINISHED'}
 
@@ -51,41 +205,47 @@ class PluginPanel1(bpy.types.Panel):
         """
         定义了一个卸载插件的操作类，继承自bpy.types.Operator。
         """
-        bl_idname = "plugin1.unload"
-        bl_label = "Unload Plugin 1"
+        bl_idname = "dev_plugin.unload"
+        bl_label = "Unload Plugin"
         bl_description = "Perform the operation of uninstalling plugins"
 
+        index: bpy.props.IntProperty(options={'HIDDEN'})
+
         def execute(self, context):
             """
             执行卸载插件操作的函数。
             :param context: Blender上下文，包含了当前场景、对象等信息。
             :return: 返回一个集合，表示操作完成。
             """
-            Log.info(f"Unload plugin:{context.scene.plugin_path}")
-            for module in pm.get_modules(1):
-                try:
-                    package_mgr.unload_package(module)
-                except Exception as err:
-                    Log.warning(f"Failed to unload plugin: {err}")
-
-            pm.clear_identifier(1)
+            slot = get_slot(context, self.index)
+            if slot is None:
+                return {'CANCELLED'}
+            Log.info("Unload plugin %s: %s", slot.identifier, slot.plugin_path)
+            discard_reload(slot.identifier)
+            trace.begin("unload", plugin=slot.identifier)
+            try:
+                package_mgr.unload_all(slot.identifier)
+            finally:
+                trace.finish()
 
-            Log.info(f"Plugin {context.scene.plugin_path} unloaded")
+            Log.info("Plugin %s unloaded", slot.plugin_path)
             return {'FINISHED'}
 
     class ReloadPlugin(bpy.types.Operator):
         """
         定义了一个重载插件的操作类，继承自bpy.types.Operator。
         """
-        bl_idname = "plugin1.reload"
-        bl_label = "Reload Plugin 1"
+        bl_idname = "dev_plugin.reload"
+        bl_label = "Reload Plugin"
         bl_description = "Perform the operation of reloading plugins"
 
+        index: bpy.props.IntProperty(options={'HIDDEN'})
+
         def execute(self, context):
             """
             执行插件卸载和加载操作。
 
-            本函数首先尝试卸载所有已加载的插件模块，然后清除相关的标识符，
+            本函数首先尝试卸载槽位已加载的插件模块，然后清除相关的标识符和导入图，
             最后加载新的插件包。此过程旨在确保插件的平滑切换和系统稳定。
 
             参数:
@@ -94,23 +254,41 @@ class PluginPanel1(bpy.types.Panel):
             返回:
             - {'FINISHED'}: 表示操作完成。
             """
-            # 遍历所有已加载的插件模块并尝试卸载它们
-            for module in pm.get_modules(1):
-                try:
-                    package_mgr.unload_package(module)
-                except Exception as err:
-                    # 如果卸载插件时发生异常，则记录警告日志
-                    Log.warning(f"Failed to unload plugin: {err}")
-
-            # 尝试清除特定标识符，为加载新插件做准备
+            slot = get_slot(context, self.index)
+            if slot is None:
+                return {'CANCELLED'}
+            discard_reload(slot.identifier)
+            trace.begin("manual reload", plugin=slot.identifier)
             try:
-                pm.clear_identifier(1)
-            except Exception as err:
-                # 如果清除标识符时发生异常，则记录警告日志
-                Log.warning(f"Failed to clear identifier: {err}")
+                # 卸载槽位已加载的插件模块并清除标识符，再根据槽位的插件路径加载新的插件包
+                package_mgr.full_reload(slot.plugin_path, slot.identifier)
+            finally:
+                trace.finish()
+            mark_loaded(slot.identifier)
+            return {'FINISHED'}
+
+    class BuildExtension(bpy.types.Operator):
+        """
+        把槽位的插件目录打包为扩展的zip文件，写入插件目录中的 <id>-<version>.zip。
+        """
+        bl_idname = "dev_plugin.build_extension"
+        bl_label = "Build Extension"
+        bl_description = "Package the plugin directory into an extension zip using its manifest"
+
+        index: bpy.props.IntProperty(options={'HIDDEN'})
 
-            # 加载新的插件包，根据当前场景的插件路径
-            package_mgr.load_package(context.scene.plugin_path)
+        def execute(self, context):
+            """
+            提交打包任务，由调度器分步执行，结果写入日志。压缩结果缓存在Blender的配置目录中，再次打包时只压缩变化的文件。
+            :param context: Blender上下文，包含了当前场景、对象等信息。
+            :return: 返回一个集合，表示操作完成或取消。
+            """
+            slot = get_slot(context, self.index)
+            if slot is None or not slot.plugin_path:
+                return {'CANCELLED'}
+            cache_dir = bpy.utils.user_resource('CONFIG', path=BUILD_CACHE_DIR)
+            scheduler.submit(build_extension_task, slot.identifier, slot.plugin_path, cache_dir)
+            self.report({'INFO'}, "Building extension, see the log for the result")
             return {'FINISHED'}
 
     def draw(self, context):
@@ -123,17 +301,23 @@ class PluginPanel1(bpy.types.Panel):
         # 获取当前场景
         scene = context.scene
 
-        # 在布局中添加场景中的插件路径属性
-        layout.prop(scene, "plugin_path")
-        # 在布局中添加加载插件的操作
-        layout.operator("plugin1.load")
-        # 在布局中添加卸载插件的操作
-        layout.operator("plugin1.unload")
-        # 在布局中添加重载插件的操作
-        layout.operator("plugin1.reload")
-
-        # 添加自动加载单选框
-        layout.prop(scene, "is_auto_update")
+        for index, slot in enumerate(scene.plugin_slots):
+            self.draw_slot(layout.box(), index, slot)
+        layout.operator("dev_plugin.add_slot", icon='ADD')
+
+        # 监控设置由所有槽位共用，修改后重新开启自动加载生效
+        box = layout.box()
+        box.label(text="Watch Settings")
+        box.prop(scene, "watch_backend")
+        box.prop(scene, "reload_debounce")
+        box.prop(scene, "reload_budget")
+        box.prop(scene, "watch_cpu_budget")
+        box.prop(scene, "watch_include")
+        box.prop(scene, "watch_exclude")
+        row = box.row()
+        row.prop(scene, "watch_use_gitignore")
+        row.prop(scene, "watch_use_manifest")
+        box.prop(scene, "hot_patch_enabled")
 
         # 创建About
         row = layout.row()
@@ -147,6 +331,138 @@ class PluginPanel1(bpy.types.Panel):
         row = layout.row()
         row.label(text="author: 豆浆whisky")
 
+    @staticmethod
+    def draw_slot(box, index, slot):
+        """
+        绘制一个插件槽位：路径、加载/卸载/重载按钮、自动加载开关、最近一次扫描的耗时以及监视出错的状态。
+        :param box: 槽位使用的布局
+        :param index: 槽位在列表中的位置
+        :param slot: PluginSlot
+        """
+        row = box.row()
+        row.label(text=f"Plugin {slot.identifier}")
+        row.operator("dev_plugin.remove_slot", text="", icon='X').index = index
+        # 在布局中添加槽位的插件路径属性
+        box.prop(slot, "plugin_path")
+        row = box.row(align=True)
+        row.operator("dev_plugin.load", text="Load").index = index
+        row.operator("dev_plugin.unload", text="Unload").index = index
+        row.operator("dev_plugin.reload", text="Reload").index = index
+        box.operator("dev_plugin.build_extension", icon='PACKAGE').index = index
+        # 添加自动加载单选框
+        box.prop(slot, "is_auto_update")
+        if not slot.is_auto_update:
+            return
+        # 监视出错时显示错误和下一次重试的时间
+        health = get_watch_health(slot.identifier)
+        if health.get('failures'):
+            state = "Circuit open" if health['circuit_open'] else "Retrying"
+            box.label(text=f"{state} after {health['failures']} failures, "
+                           f"next try in {health['retry_in']:.0f} s", icon='ERROR')
+            box.label(text=health['error'] or "")
+            return
+        # 显示轮询后端最近一次扫描的耗时和当前的扫描间隔
+        stats = get_scan_stats(slot.identifier)
+        if stats:
+            box.label(text=f"Scan: {stats['scan_ms']:.1f} ms, "
+                           f"listed {stats['dirs_listed']}/"
+                           f"{stats['dirs_listed'] + stats['dirs_skipped']} dirs, "
+                           f"{stats['files_checked']} files, "
+                           f"every {health.get('interval') or 0.0:.2f} s")
+        # 开始监视时与上次会话保存的文件索引比较的结果
+        index = health.get('index')
+        if index:
+            box.label(text=f"Since last session: {index['added']} added, "
+                           f"{index['modified']} modified, {index['removed']} removed")
+
+
+class ReloadTracePanel(bpy.types.Panel):
+    """
+    显示最近几次加载、卸载和重载的分阶段耗时，并可以导出为 Chrome/Perfetto trace 文件。
+    """
+    bl_label = "Reload Trace"
+    bl_idname = "VIEW3D_PT_dev_reload_trace"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "Addon DEV Helper"
+    bl_order = 3
+    bl_options = {'DEFAULT_CLOSED'}
+
+    class ExportTrace(bpy.types.Operator):
+        """
+        把重载记录导出为 Chrome/Perfetto 可以打开的 trace JSON 文件。
+        """
+        bl_idname = "dev_plugin.export_trace"
+        bl_label = "Export Trace"
+        bl_description = "Export reload timings as a Chrome/Perfetto trace file"
+
+        filepath: bpy.props.StringProperty(subtype='FILE_PATH')
+        filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})
+        # 为0时导出所有最近的记录
+        reload_id: bpy.props.IntProperty(default=0, options={'HIDDEN'})
+
+        def invoke(self, context, event):  # pylint: disable=unused-argument
+            """
+            打开文件浏览器选择导出路径。
+            :param context: Blender上下文
+            :param event: 触发操作的事件
+            :return: {'RUNNING_MODAL'}
+            """
+            if not self.filepath:
+                name = f"reload_{self.reload_id}" if self.reload_id else "reloads"
+                self.filepath = os.path.join(os.path.expanduser('~'), f"{name}.trace.json")
+            context.window_manager.fileselect_add(self)
+            return {'RUNNING_MODAL'}
+
+        def execute(self, context):  # pylint: disable=unused-argument
+            """
+            导出记录。
+            :param context: Blender上下文
+            :return: 返回一个集合，表示操作完成或取消。
+            """
+            if self.reload_id:
+                traces = [t for t in [trace.get_trace(self.reload_id)] if t is not None]
+            else:
+                traces = trace.recent_traces()
+            if not traces:
+                self.report({'WARNING'}, "No reload trace to export")
+                return {'CANCELLED'}
+            try:
+                trace.export_chrome_trace(self.filepath, traces)
+            except OSError as err:
+                self.report({'ERROR'}, f"Failed to export trace: {err}")
+                return {'CANCELLED'}
+            Log.info("Exported %d reload traces to %s", len(traces), self.filepath)
+            return {'FINISHED'}
+
+    def draw(self, context):  # pylint: disable=unused-argument
+        """
+        绘制最近的重载记录：总耗时、各阶段耗时以及最慢的模块。
+        :param context: Blender上下文，包含了当前场景、对象等信息。
+        """
+        layout = self.layout
+        traces = trace.recent_traces()
+        if not traces:
+            layout.label(text="No reloads recorded yet")
+            return
+        layout.operator("dev_plugin.export_trace", text="Export All", icon='EXPORT').reload_id = 0
+        for reload_trace in traces:
+            box = layout.box()
+            row = box.row()
+            row.label(text=f"#{reload_trace.reload_id} {reload_trace.label}: "
+                           f"{reload_trace.duration_ms:.1f} ms")
+            row.operator("dev_plugin.export_trace", text="",
+                         icon='EXPORT').reload_id = reload_trace.reload_id
+            col = box.column(align=True)
+            for phase, total_ms in reload_trace.phase_totals().items():
+                col.label(text=f"{phase}: {total_ms:.1f} ms")
+            if reload_trace.counters:
+                col.label(text=", ".join(f"{name}: {value}"
+                                         for name, value in reload_trace.counters.items()))
+            slowest = reload_trace.slowest_span(('import', 'register', 'unregister'))
+            if slowest is not None:
+                col.label(text=f"slowest: {slowest[0]} ({slowest[1]}, {slowest[2]:.1f} ms)")
+
 
 class OpenURLOperator(bpy.types.Operator):
     """
@@ -179,15 +495,6 @@ class OpenURLOperator(bpy.types.Operator):
         return {'FINISHED'}
 
 
-# 自动加载单选框
-is_auto_update_radio = bpy.props.BoolProperty(
-    name="Auto change detection(Not rec.)",
-    description="Enable/Disable Automatic check for changes and reload",
-    default=False,
-    update=lambda self, context: toggle_watcher(reload_modules_callback)
-)
-
-
 # 定义一个全局设置面板类，继承自bpy.types.Panel
 class GlobalSettingPanel(bpy.types.Panel):
     """
@@ -225,8 +532,28 @@ class GlobalSettingPanel(bpy.types.Panel):
             # 返回'FINISHED'表示运算符执行完成
             return {'FINISHED'}
 
+    class ClearLog(bpy.types.Operator):
+        """
+        清空面板中显示的日志缓冲区。
+        """
+        bl_idname = "dev_plugin.clear_log"
+        bl_label = "Clear Log"
+
+        def execute(self, context):  # pylint: disable=unused-argument
+            """
+            清空日志缓冲区。
+            :param context: Blender上下文
+            :return: {'FINISHED'}
+            """
+            log_store.get_handler().clear()
+            return {'FINISHED'}
+
+    # 日志级别对应的图标
+    LEVEL_ICONS = {logging.DEBUG: 'BLANK1', logging.INFO: 'INFO',
+                   logging.WARNING: 'ERROR', logging.ERROR: 'CANCEL'}
+
     # 绘制面板内容的方法
-    def draw(self, context):  # pylint: disable=unused-argument
+    def draw(self, context):
         """
         在给定的上下文中绘制面板。
 
@@ -234,12 +561,47 @@ class GlobalSettingPanel(bpy.types.Panel):
         - context: Blender上下文，提供对当前运行环境的信息，如场景、对象和窗口设置。
 
         此函数负责在用户界面中绘制面板的内容。它首先获取面板的布局，然后在布局中添加一个运算符按钮，
-        该按钮关联到系统控制台的切换功能。尽管`context`参数未直接在函数体中使用，但它对于确定面板显示位置和方式是必要的。
+        该按钮关联到系统控制台的切换功能。之后绘制日志缓冲区中按级别和重载编号过滤后的最新记录。
         """
         # 获取面板的布局
         layout = self.layout
         # 在布局中添加一个运算符按钮，关联到系统控制台切换运算符
         layout.operator("wm.toggle_system_console", text="Toggle System Console")
+        # 泄漏检查的结果记录在重载耗时记录的计数信息和日志中
+        layout.prop(context.scene, "leak_check_enabled")
+        self.draw_log(layout, context.scene)
+
+    def draw_log(self, layout, scene):
+        """
+        绘制日志列表。
+        UIList 需要 CollectionProperty，而 draw() 中不能写入属性，所以直接用标签绘制过滤视图中的记录；
+        视图只增量处理新增的记录，缓冲区很大时也不会拖慢重绘。
+
+        参数:
+        - layout: 面板布局
+        - scene: 当前场景，保存过滤条件
+        """
+        box = layout.box()
+        row = box.row()
+        row.label(text="Log")
+        row.operator("dev_plugin.clear_log", text="", icon='TRASH')
+        row = box.row(align=True)
+        row.prop(scene, "log_filter_level", text="")
+        row.prop(scene, "log_filter_reload")
+        row.prop(scene, "log_view_rows")
+
+        entries = log_store.get_view().refresh(logging.getLevelName(scene.log_filter_level),
+                                               scene.log_filter_reload)
+        if not entries:
+            box.label(text="No log records")
+            return
+        col = box.column(align=True)
+        for index in range(len(entries) - 1, max(len(entries) - scene.log_view_rows, 0) - 1, -1):
+            entry = entries[index]
+            stamp = time.strftime('%H:%M:%S', time.localtime(entry.created))
+            reload_tag = f" #{entry.reload_id}" if entry.reload_id else ""
+            col.label(text=f"{stamp}{reload_tag} {entry.module}:{entry.lineno} {entry.message}",
+                      icon=self.LEVEL_ICONS.get(entry.levelno, 'BLANK1'))
 
 #
 # class SelfRefresh(bpy.types.Operator):
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+可选的内存泄漏检查：比较一次重载前后的 tracemalloc 快照，并检查旧的模块和类对象是否仍然存活
+"""
+import gc
+import tracemalloc
+import types
+import weakref
+from collections import namedtuple
+
+from .logger import Log
+from . import trace
+
+# 报告中列出的分配位置数量
+TOP_ALLOCATIONS = 5
+# tracemalloc 为每个分配记录的调用栈深度
+TRACE_FRAMES = 1
+
+# 一次检查的结果：retained_bytes 为重载前后 tracemalloc 统计的内存差值，
+# leaked_modules 为 (模块名, 引用者数量, 引用者类型) 列表，leaked_classes 为仍然存活的旧类的名称，
+# top 为 (分配位置, 增加的字节数) 列表
+LeakReport = namedtuple('LeakReport',
+                        'identifier retained_bytes leaked_modules leaked_classes top')
+
+# measured: 开启之后是否已经完成过一次检查。刚开启时旧对象是在 tracemalloc 启动之前分配的，
+# 第一次检查只能看到新分配的内存，所以只作为基准，不报告保留的内存
+_state = {'enabled': False, 'started_tracemalloc': False, 'measured': False}
+
+
+class _Cycle:  # pylint: disable=too-few-public-methods
+    """
+    一次正在检查的重载：重载前的快照，以及旧模块和旧类的弱引用
+    """
+
+    def __init__(self, identifier, modules):
+        """
+        :param identifier: 插件槽位的标识符
+        :param modules: 即将被卸载的模块
+        """
+        self.identifier = identifier
+        self.modules = [(module.__name__, weakref.ref(module)) for module in modules]
+        self.classes = [
+            (f"{module.__name__}.{value.__name__}", weakref.ref(value))
+            for module in modules for value in list(vars(module).values())
+            if isinstance(value, type) and value.__module__ == module.__name__
+        ]
+        gc.collect()
+        self.snapshot = tracemalloc.take_snapshot()
+
+
+def set_enabled(enabled):
+    """
+    开启或关闭检查。开启时启动 tracemalloc，之后的内存分配会变慢，只建议在排查问题时开启
+
+    :param enabled: 是否开启
+    """
+    _state['enabled'] = enabled
+    _state['measured'] = False
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+        _state['started_tracemalloc'] = True
+    elif not enabled and _state['started_tracemalloc']:
+        tracemalloc.stop()
+        _state['started_tracemalloc'] = False
+
+
+def update(enabled):
+    """
+    按设置开启或关闭检查，与当前状态相同时什么都不做，不会重置第一次检查的基准
+
+    :param enabled: 是否开启
+    """
+    if enabled != _state['enabled']:
+        set_enabled(enabled)
+
+
+def is_enabled():
+    """
+    :return: 是否开启了检查
+    """
+    return _state['enabled'] and tracemalloc.is_tracing()
+
+
+def begin_cycle(identifier, modules):
+    """
+    在卸载模块之前调用，记录重载前的内存快照以及旧模块和旧类
+
+    :param identifier: 插件槽位的标识符
+    :param modules: 即将被卸载的模块
+    :return: 传给 end_cycle() 的检查状态，未开启检查时返回None
+    """
+    if not is_enabled():
+        return None
+    with trace.span('leak check', 'leak check'):
+        return _Cycle(identifier, [module for module in modules
+                                   if isinstance(module, types.ModuleType)])
+
+
+def end_cycle(cycle, kept=()):
+    """
+    在重新加载完成之后调用：回收垃圾后比较内存快照，并找出仍然存活的旧模块和旧类。
+    结果记录到当前重载的计数信息中，发现泄漏时输出警告
+
+    :param cycle: begin_cycle() 的返回值
+    :param kept: 有意保留的旧类（定义没有变化而保持注册的类），不算泄漏
+    :return: LeakReport，未开启检查时返回None
+    """
+    if cycle is None or not tracemalloc.is_tracing():
+        return None
+    with trace.span('leak check', 'leak check'):
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot()
+        stats = snapshot.compare_to(cycle.snapshot, 'lineno')
+        leaked_modules = []
+        for name, ref in cycle.modules:
+            module = ref()
+            if module is not None:
+                referrers = [obj for obj in gc.get_referrers(module)
+                             if not isinstance(obj, types.FrameType)]
+                leaked_modules.append(
+                    (name, len(referrers), sorted({type(obj).__name__ for obj in referrers})))
+                del module, referrers
+        leaked_classes = [name for name, ref in cycle.classes
+                          if ref() is not None and ref() not in kept]
+        report = LeakReport(
+            cycle.identifier,
+            sum(stat.size_diff for stat in stats),
+            leaked_modules,
+            leaked_classes,
+            [(str(stat.traceback), stat.size_diff) for stat in stats[:TOP_ALLOCATIONS]],
+        )
+    baseline = not _state['measured']
+    _state['measured'] = True
+    _record(report, baseline)
+    return report
+
+
+def _record(report, baseline):
+    """
+    把检查结果写入当前重载的计数信息和日志
+
+    :param report: LeakReport
+    :param baseline: 是否是开启之后的第一次检查，此时不报告保留的内存
+    """
+    current = trace.current()
+    if current is not None:
+        if not baseline:
+            current.count('retained_kb', round(report.retained_bytes / 1024))
+        current.count('leaked_modules', len(report.leaked_modules))
+        current.count('leaked_classes', len(report.leaked_classes))
+    if baseline:
+        Log.info("leak check baseline recorded, memory is measured from the next reload")
+    else:
+        Log.info("plugin %s reload retained %.1f KiB", report.identifier,
+                 report.retained_bytes / 1024)
+        for location, size in report.top:
+            Log.info("  %+.1f KiB %s", size / 1024, location)
+    for name, count, kinds in report.leaked_modules:
+        Log.warning("old module '%s' is still alive, %d referrers: %s",
+                    name, count, ', '.join(kinds))
+    if report.leaked_classes:
+        Log.warning("%d old classes are still alive: %s", len(report.leaked_classes),
+                    ', '.join(report.leaked_classes[:10]))
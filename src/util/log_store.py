@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+内存中的环形日志缓冲区，以及供面板使用的增量过滤视图
+"""
+import logging
+from collections import deque, namedtuple
+
+from . import trace
+
+# 缓冲区最多保存的记录条数，超出后丢弃最旧的记录
+CAPACITY = 100000
+# 单条消息最多保存的字符数，保证缓冲区占用的内存有上限
+MAX_MESSAGE_LENGTH = 1000
+# 过滤视图最多保存的匹配记录条数
+VIEW_LIMIT = 500
+
+# seq: 递增的序号；created: time.time()；reload_id: 记录产生时正在进行的重载编号，没有时为0
+LogEntry = namedtuple('LogEntry', 'seq created levelno module lineno message reload_id')
+
+_handler = None  # pylint: disable=invalid-name
+_view = None  # pylint: disable=invalid-name
+
+
+class ReloadIdFilter(logging.Filter):  # pylint: disable=too-few-public-methods
+    """
+    在记录产生的线程中标记当时正在进行的重载编号。
+    记录会经过队列交给后台线程处理，到那时当前重载可能已经结束，所以必须在放入队列之前标记。
+    """
+
+    def filter(self, record):
+        current = trace.current()
+        record.reload_id = current.reload_id if current is not None else 0
+        return True
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    把日志记录以结构化的形式保存在固定长度的环形缓冲区中。
+
+    emit() 在日志线程中执行，读取 records 时需要持有 self.lock。
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        """
+        :param capacity: 最多保存的记录条数
+        """
+        super().__init__(logging.DEBUG)
+        self.records = deque(maxlen=capacity)
+        self.next_seq = 1
+        # 每次清空时递增，视图据此判断需要重建
+        self.generation = 0
+
+    def emit(self, record):
+        """
+        :param record: logging.LogRecord
+        """
+        try:
+            message = record.getMessage()
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+            return
+        if len(message) > MAX_MESSAGE_LENGTH:
+            message = message[:MAX_MESSAGE_LENGTH] + '...'
+        self.records.append(LogEntry(self.next_seq, record.created, record.levelno,
+                                     record.module, record.lineno, message,
+                                     getattr(record, 'reload_id', 0)))
+        self.next_seq += 1
+
+    def clear(self):
+        """
+        清空缓冲区
+        """
+        with self.lock:
+            self.records.clear()
+            self.generation += 1
+
+
+class LogView:  # pylint: disable=too-few-public-methods
+    """
+    缓冲区的过滤视图，只保存最新的 VIEW_LIMIT 条匹配记录。
+
+    过滤条件不变时，每次刷新只检查上次刷新之后新增的记录；
+    过滤条件变化或缓冲区被清空时，从最新的记录往前重新过滤，找到足够的记录就停止。
+    """
+
+    def __init__(self, handler, limit=VIEW_LIMIT):
+        """
+        :param handler: RingBufferHandler
+        :param limit: 最多保存的匹配记录条数
+        """
+        self.handler = handler
+        self.entries = deque(maxlen=limit)
+        self._key = None
+        self._last_seq = 0
+
+    def refresh(self, min_level=logging.NOTSET, reload_id=0):
+        """
+        按过滤条件更新视图
+
+        :param min_level: 最低日志级别
+        :param reload_id: 只显示该重载期间产生的记录，为0时显示全部
+        :return: 匹配的记录，最新的在后
+        """
+        key = (min_level, reload_id, self.handler.generation)
+        with self.handler.lock:
+            records = self.handler.records
+            if key != self._key:
+                self._key = key
+                self._last_seq = 0
+                self.entries.clear()
+            matched = []
+            for entry in reversed(records):
+                if entry.seq <= self._last_seq or len(matched) >= self.entries.maxlen:
+                    break
+                if entry.levelno >= min_level and (not reload_id or entry.reload_id == reload_id):
+                    matched.append(entry)
+            if records:
+                self._last_seq = records[-1].seq
+        self.entries.extend(reversed(matched))
+        return self.entries
+
+
+def get_handler():
+    """
+    :return: 全局的 RingBufferHandler
+    """
+    global _handler  # pylint: disable=global-statement
+    if _handler is None:
+        _handler = RingBufferHandler()
+    return _handler
+
+
+def get_view():
+    """
+    :return: 面板使用的全局 LogView
+    """
+    global _view  # pylint: disable=global-statement
+    if _view is None:
+        _view = LogView(get_handler())
+    return _view
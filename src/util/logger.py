@@ -3,15 +3,30 @@
 """
 Log封装库
 """
+import atexit
 import logging
-import traceback
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+from . import log_store
+
+# 跳过 Log 自身的栈帧，让记录中的文件名和行号指向调用者
+_STACKLEVEL = 2
+
 
 class Log:
     """
     日志工具类，提供日志记录功能，包括info, warning和error级别的日志。
     该类使用单例模式管理日志记录器，确保日志记录的一致性和效率。
+
+    消息支持 %-格式的参数，只有在级别启用时才会格式化，例如 Log.info("loaded %s", name)；
+    调用者的文件名和行号由 logging 通过 stacklevel 只查找一层栈帧得到。
+    控制台输出由后台线程完成，主线程只把记录放入队列，不会阻塞在控制台I/O上。
+    记录同时保存在 log_store 的环形缓冲区中，可以在面板中查看。
     """
     _logger = None
+    _handler = None
+    _listener = None
 
     @staticmethod
     def _get_logger():
@@ -21,67 +36,87 @@ class Log:
         """
         if Log._logger is None:
             # 配置日志记录器
-            Log._logger = logging.getLogger('plugin_dev_helper')
-            Log._logger.setLevel(logging.INFO)
+            logger = logging.getLogger('plugin_dev_helper')
+            logger.setLevel(logging.INFO)
 
             # 创建一个控制台处理器
             console_handler = logging.StreamHandler()
             console_handler.setLevel(logging.INFO)
 
-            # 创建一个格式化器
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            # 创建一个格式化器，调用者位置放在消息末尾
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s '
+                                          '(%(pathname)s:%(lineno)d)')
             console_handler.setFormatter(formatter)
 
+            # 记录先进入队列，由后台线程写到控制台和环形缓冲区
+            log_queue = queue.SimpleQueue()
+            Log._handler = QueueHandler(log_queue)
+            Log._handler.addFilter(log_store.ReloadIdFilter())
+            Log._listener = QueueListener(log_queue, console_handler, log_store.get_handler(),
+                                          respect_handler_level=True)
+            Log._listener.start()
+            atexit.register(Log.shutdown)
+
             # 将处理器添加到日志记录器
-            Log._logger.addHandler(console_handler)
+            logger.addHandler(Log._handler)
+            Log._logger = logger
 
         return Log._logger
 
     @staticmethod
-    def _get_caller_info():
+    def shutdown():
+        """
+        输出队列中剩余的记录并停止后台线程。
+        插件注销时调用，避免重新加载插件后同一个日志记录器上出现多个处理器。
+        """
+        if Log._listener is not None:
+            Log._listener.stop()
+            Log._listener = None
+        if Log._logger is not None:
+            Log._logger.removeHandler(Log._handler)
+            Log._handler = None
+            Log._logger = None
+        atexit.unregister(Log.shutdown)
+
+    @staticmethod
+    def is_enabled_for(level):
         """
-        获取调用日志方法的调用者信息。
-        通过解析调用栈，找到调用日志方法的代码位置。
+        判断指定级别的日志是否会输出，用于跳过构造开销较大的日志参数。
+        """
+        return (Log._logger or Log._get_logger()).isEnabledFor(level)
+
+    @staticmethod
+    def debug(message, *args):
+        """
+        记录debug级别的日志信息。
+        包含日志消息和调用者信息。
         """
-        stack = traceback.extract_stack()
-        # 找到调用日志方法的堆栈帧
-        for i, frame in enumerate(reversed(stack)):
-            if frame.name in ['info', 'warning', 'error']:
-                # 返回倒数第二层堆栈的文件名和行数
-                if i + 1 < len(stack):
-                    caller_frame = stack[-i - 2]
-                    return f"{caller_frame.filename}:{caller_frame.lineno}"
-        return None
+        (Log._logger or Log._get_logger()).debug(message, *args, stacklevel=_STACKLEVEL)
 
     @staticmethod
-    def info(message):
+    def info(message, *args):
         """
         记录info级别的日志信息。
         包含日志消息和调用者信息。
         """
-        logger = Log._get_logger()
-        caller_info = Log._get_caller_info()
-        logger.info(f"{message} ({caller_info})")
+        (Log._logger or Log._get_logger()).info(message, *args, stacklevel=_STACKLEVEL)
 
     @staticmethod
-    def warning(message):
+    def warning(message, *args):
         """
         记录warning级别的日志信息。
         包含日志消息和调用者信息。
         """
-        logger = Log._get_logger()
-        caller_info = Log._get_caller_info()
-        logger.warning(f"{message} ({caller_info})")
+        (Log._logger or Log._get_logger()).warning(message, *args, stacklevel=_STACKLEVEL)
 
     @staticmethod
-    def error(message):
+    def error(message, *args, exc_info=False):
         """
         记录error级别的日志信息。
-        包含日志消息和当前调用栈信息。
+        包含日志消息和调用者信息；在 except 块中传入 exc_info=True 可以附带异常的堆栈。
         """
-        logger = Log._get_logger()
-        stack = traceback.format_stack()
-        logger.error(f"{message}\n{''.join(stack)}")
+        (Log._logger or Log._get_logger()).error(message, *args, exc_info=exc_info,
+                                                 stacklevel=_STACKLEVEL)
 
     @staticmethod
     def raise_error(message, exception_type=RuntimeError):
@@ -89,8 +124,5 @@ class Log:
         记录error级别的日志信息并抛出指定类型的异常。
         包含日志消息和调用者信息。
         """
-        logger = Log._get_logger()
-        caller_info = Log._get_caller_info()
-        error_message = f"{message} ({caller_info})"
-        logger.error(error_message)
-        raise exception_type(error_message)
+        (Log._logger or Log._get_logger()).error(message, stacklevel=_STACKLEVEL)
+        raise exception_type(message)
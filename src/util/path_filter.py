@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+文件监控的包含/排除规则
+"""
+import os
+import re
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10（Blender 4.1之前）没有tomllib
+    tomllib = None
+
+from .logger import Log
+
+# 默认排除的路径：重载本身会改写 __pycache__，版本库和虚拟环境也不需要监视
+DEFAULT_EXCLUDES = ('__pycache__/', '.git/', '.venv/', 'venv/', '*.pyc', '*.pyo', '*.swp', '*~')
+
+MANIFEST_NAME = 'blender_manifest.toml'
+# 清单没有 [build] paths_exclude_pattern 时，Blender打包扩展使用的排除规则
+BUILD_DEFAULT_EXCLUDES = ('__pycache__/', '/.git/', '/*.zip')
+GITIGNORE_NAME = '.gitignore'
+
+
+def _translate(pattern):
+    """
+    把gitignore风格的通配符转换为正则表达式：* 和 ? 不匹配 /，** 匹配任意层级的目录，
+    [...] 匹配一个字符（[!...] 取反），\\ 转义下一个字符
+
+    :param pattern: 去掉开头和结尾的 / 之后的规则
+    :return: 匹配完整相对路径的正则表达式文本
+    """
+    parts = []
+    i, length = 0, len(pattern)
+    while i < length:
+        char = pattern[i]
+        if pattern.startswith('**', i):
+            i += 2
+            if (i == 2 or pattern[i - 3] == '/') and pattern.startswith('/', i):
+                # 开头或者两个 / 之间的 **/ 匹配零个或多个目录
+                parts.append('(?:.*/)?')
+                i += 1
+            else:
+                parts.append('.*')
+            continue
+        i += 1
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '\\' and i < length:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+        elif char == '[':
+            negate = pattern.startswith(('!', '^'), i)
+            start = i + 1 if negate else i
+            # 紧跟在 [ 或 [! 之后的 ] 是普通字符
+            end = pattern.find(']', start + 1)
+            if end < 0:
+                parts.append(re.escape(char))
+                continue
+            body = re.sub(r'([\\\[\]^])', r'\\\1', pattern[start:end])
+            parts.append(f"[^/{body}]" if negate else f"[{body}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(char))
+    return '(?s:' + ''.join(parts) + r')\Z'
+
+
+class PathRule:  # pylint: disable=too-few-public-methods
+    """
+    一条gitignore风格的规则：
+    - 以 / 结尾只匹配目录；
+    - 以 ! 开头表示重新包含；
+    - 以 / 开头或中间含有 / 时相对根目录匹配完整路径，否则匹配任意层级的名称；
+    - 与gitignore和Blender的 paths_exclude_pattern 相同，* 和 ? 不匹配 /，** 匹配任意层级的目录。
+    """
+    __slots__ = ('pattern', 'negate', 'dir_only', 'anchored', '_regex')
+
+    def __init__(self, pattern):
+        """
+        :param pattern: 规则文本
+        """
+        self.pattern = pattern
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        self.anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+        self._regex = re.compile(_translate(pattern))
+
+    def matches(self, rel_path, is_dir):
+        """
+        :param rel_path: 以 / 分隔的相对路径
+        :param is_dir: 是否为目录
+        :return: 规则是否匹配
+        """
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            return self._regex.match(rel_path) is not None
+        return self._regex.match(rel_path.rsplit('/', 1)[-1]) is not None
+
+
+def _parse_patterns(patterns):
+    """
+    把规则文本转换为规则对象，忽略空行和注释
+
+    :param patterns: 规则文本列表
+    :return: PathRule 列表
+    """
+    rules = []
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if pattern and not pattern.startswith('#'):
+            rules.append(PathRule(pattern))
+    return rules
+
+
+class PathFilter:
+    """
+    判断监控目录下的文件和目录是否需要监视。
+    目录在进入之前就会被检查，被排除的目录不会被遍历或监视。
+    """
+
+    def __init__(self, root, include=(), exclude=DEFAULT_EXCLUDES):
+        """
+        :param root: 监控的根目录
+        :param include: 包含规则；为空时包含所有未被排除的文件
+        :param exclude: 排除规则，后面的规则优先，! 开头的规则可以重新包含
+        """
+        self.root = os.path.normpath(root)
+        self._prefix_len = len(os.path.join(self.root, ''))
+        self.include_rules = _parse_patterns(include)
+        self.exclude_rules = _parse_patterns(exclude)
+
+    def relative(self, path):
+        """
+        :param path: 根目录下的绝对路径
+        :return: 以 / 分隔的相对路径
+        """
+        rel_path = path[self._prefix_len:]
+        if os.sep != '/':
+            rel_path = rel_path.replace(os.sep, '/')
+        return rel_path
+
+    def _excluded(self, rel_path, is_dir):
+        """
+        :param rel_path: 相对路径
+        :param is_dir: 是否为目录
+        :return: 是否被排除（最后一条匹配的规则决定结果）
+        """
+        excluded = False
+        for rule in self.exclude_rules:
+            if rule.matches(rel_path, is_dir):
+                excluded = not rule.negate
+        return excluded
+
+    def accepts_dir(self, path):
+        """
+        判断是否需要进入并监视该目录
+
+        :param path: 目录的绝对路径
+        :return: bool
+        """
+        if len(path) <= self._prefix_len:
+            return True
+        return not self._excluded(self.relative(path), True)
+
+    def accepts_file(self, path):
+        """
+        判断是否需要监视该文件
+
+        :param path: 文件的绝对路径
+        :return: bool
+        """
+        rel_path = self.relative(path)
+        if self._excluded(rel_path, False):
+            return False
+        if not self.include_rules:
+            return True
+        return any(rule.matches(rel_path, False) for rule in self.include_rules)
+
+
+def read_gitignore(root):
+    """
+    读取插件根目录下的 .gitignore 规则（不处理子目录中的 .gitignore）
+
+    :param root: 插件根目录
+    :return: 规则文本列表
+    """
+    try:
+        with open(os.path.join(root, GITIGNORE_NAME), encoding='utf-8') as file:
+            return [line.rstrip('\n') for line in file]
+    except OSError:
+        return []
+
+
+_TOML_SECTION = re.compile(r'^\[([^\[\]]+)\]')
+_TOML_KEY = re.compile(r'^([A-Za-z0-9_-]+)\s*=\s*(.*)$')
+_TOML_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"|\'([^\']*)\'')
+
+
+def _toml_string(match):
+    """
+    :param match: _TOML_STRING 的匹配结果
+    :return: 字符串的值（只处理 \" 和 \\ 转义）
+    """
+    if match.group(1) is None:
+        return match.group(2)
+    return re.sub(r'\\(["\\])', r'\1', match.group(1))
+
+
+def _parse_manifest(text):
+    """
+    没有tomllib时使用的简单解析：只解析字符串和字符串数组（可以跨多行），足够读取清单中需要的字段
+
+    :param text: 清单内容
+    :return: 与 tomllib.loads 结构相同的字典
+    """
+    manifest = {}
+    table = manifest
+    lines = iter(text.splitlines())
+    for line in lines:
+        line = line.strip()
+        section = _TOML_SECTION.match(line)
+        if section is not None:
+            table = manifest.setdefault(section.group(1).strip(), {})
+            continue
+        key = _TOML_KEY.match(line)
+        if key is None:
+            continue
+        name, value = key.groups()
+        if not value.startswith('['):
+            string = _TOML_STRING.match(value)
+            if string is not None:
+                table[name] = _toml_string(string)
+            continue
+        items = []
+        value = value[1:]
+        while value is not None:
+            if not value.strip().startswith('#'):
+                items.extend(_toml_string(m) for m in _TOML_STRING.finditer(value))
+                if ']' in _TOML_STRING.sub('', value).split('#', 1)[0]:
+                    break
+            value = next(lines, None)
+        table[name] = items
+    return manifest
+
+
+def read_manifest(root):
+    """
+    读取插件根目录下的 blender_manifest.toml
+
+    :param root: 插件根目录
+    :return: 清单内容的字典；没有清单或者无法解析时返回None
+    """
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'rb') as file:
+            content = file.read()
+    except OSError:
+        return None
+
+    try:
+        text = content.decode('utf-8')
+    except UnicodeDecodeError as err:
+        Log.warning("Failed to parse %s: %s", manifest_path, err)
+        return None
+    if tomllib is None:
+        return _parse_manifest(text)
+    try:
+        return tomllib.loads(text)
+    except tomllib.TOMLDecodeError as err:
+        Log.warning("Failed to parse %s: %s", manifest_path, err)
+        return None
+
+
+def read_manifest_excludes(root, default=()):
+    """
+    读取 blender_manifest.toml 中 [build] paths_exclude_pattern 的规则
+
+    :param root: 插件根目录
+    :param default: 清单中没有这个字段时使用的规则
+    :return: 规则文本列表
+    """
+    manifest = read_manifest(root) or {}
+    return list(manifest.get('build', {}).get('paths_exclude_pattern', default))
+
+
+def split_patterns(text):
+    """
+    把以逗号分隔的规则文本拆分为列表
+
+    :param text: 规则文本，如 "*.blend, assets/"
+    :return: 规则文本列表
+    """
+    return [part.strip() for part in text.split(',') if part.strip()]
+
+
+def build_filter(root, include_text='', exclude_text='',
+                 use_gitignore=True, use_manifest=True):
+    """
+    根据设置构建监控规则：默认排除规则、.gitignore、清单文件的排除规则，最后是用户规则
+
+    :param root: 插件根目录
+    :param include_text: 以逗号分隔的包含规则
+    :param exclude_text: 以逗号分隔的排除规则
+    :param use_gitignore: 是否使用 .gitignore 中的规则
+    :param use_manifest: 是否使用 blender_manifest.toml 中的排除规则
+    :return: PathFilter
+    """
+    exclude = list(DEFAULT_EXCLUDES)
+    if use_gitignore:
+        exclude.extend(read_gitignore(root))
+    if use_manifest:
+        exclude.extend(read_manifest_excludes(root))
+    exclude.extend(split_patterns(exclude_text))
+    return PathFilter(root, split_patterns(include_text), exclude)
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+重载过程的分阶段耗时记录，可以导出为 Chrome/Perfetto trace 文件
+"""
+import contextlib
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+# 保留最近多少次重载的记录
+MAX_TRACES = 10
+
+# Chrome trace 中使用的线程编号
+MAIN_THREAD = 1
+WATCHER_THREAD = 2
+# 线程池中的工作线程从该编号开始
+WORKER_THREAD_BASE = 10
+_THREAD_NAMES = {MAIN_THREAD: "main", WATCHER_THREAD: "watcher"}
+
+_traces = deque(maxlen=MAX_TRACES)
+_traces_lock = threading.Lock()
+_ids = itertools.count(1)
+_current = None  # pylint: disable=invalid-name
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class ReloadTrace:
+    """
+    一次加载、卸载或重载的耗时记录。
+
+    spans: (名称, 分类, 开始时间, 结束时间, 线程编号, 参数) 列表，时间为 time.perf_counter() 的秒数
+    """
+
+    def __init__(self, label, **args):
+        """
+        :param label: 记录的名称，如 "auto reload"
+        :param args: 附加信息
+        """
+        self.reload_id = next(_ids)
+        self.label = label
+        self.args = args
+        self.start = time.perf_counter()
+        self.end = None
+        self.spans = []
+        # 计数信息，如 .pyc 缓存命中次数
+        self.counters = {}
+
+    def add_span(self, name, cat, start, end, tid=MAIN_THREAD, **args):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        """
+        添加一个已经结束的时间段
+
+        :param name: 名称，如模块名
+        :param cat: 分类（阶段），如 "import"
+        :param start: 开始时间
+        :param end: 结束时间
+        :param tid: 线程编号
+        :param args: 附加信息
+        """
+        self.spans.append((name, cat, start, end, tid, args))
+
+    def count(self, name, value=1):
+        """
+        累加计数
+
+        :param name: 计数名称
+        :param value: 增加的值
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def span(self, name, cat, **args):
+        """
+        记录代码块耗时的上下文管理器
+
+        :param name: 名称
+        :param cat: 分类（阶段）
+        :param args: 附加信息
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, cat, start, time.perf_counter(), MAIN_THREAD, args))
+
+    @property
+    def duration_ms(self):
+        """
+        :return: 主线程上的总耗时（毫秒），未结束时计算到当前时间
+        """
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000.0
+
+    def phase_totals(self):
+        """
+        按分类汇总耗时
+
+        :return: 分类 -> 毫秒，按首次出现的顺序排列
+        """
+        totals = {}
+        for _, cat, start, end, _, _ in self.spans:
+            totals[cat] = totals.get(cat, 0.0) + (end - start) * 1000.0
+        return totals
+
+    def slowest_span(self, cats):
+        """
+        :param cats: 需要比较的分类
+        :return: 耗时最长的 (名称, 分类, 毫秒)，没有时返回None
+        """
+        spans = [span for span in self.spans if span[1] in cats]
+        if not spans:
+            return None
+        name, cat, start, end, _, _ = max(spans, key=lambda span: span[3] - span[2])
+        return name, cat, (end - start) * 1000.0
+
+    def to_chrome_events(self, pid=1):
+        """
+        转换为 Chrome trace 事件
+
+        :param pid: 进程编号
+        :return: 事件列表
+        """
+        events = [{
+            'name': f"{self.label} #{self.reload_id}", 'cat': 'reload', 'ph': 'X',
+            'ts': self.start * 1e6, 'dur': self.duration_ms * 1000.0,
+            'pid': pid, 'tid': MAIN_THREAD, 'args': dict(self.args, **self.counters),
+        }]
+        for name, cat, start, end, tid, args in self.spans:
+            events.append({
+                'name': name, 'cat': cat, 'ph': 'X', 'ts': start * 1e6,
+                'dur': (end - start) * 1e6, 'pid': pid, 'tid': tid,
+                'args': args,
+            })
+        return events
+
+
+def worker_tid(thread_name):
+    """
+    :param thread_name: 线程池工作线程的名称，如 "pdh_worker_3"
+    :return: Chrome trace 中使用的线程编号
+    """
+    suffix = thread_name.rsplit('_', 1)[-1]
+    return WORKER_THREAD_BASE + (int(suffix) if suffix.isdigit() else 0)
+
+
+def begin(label, **args):
+    """
+    开始记录一次加载/重载，之后的 span() 都会记录到这次记录中
+
+    :param label: 记录的名称
+    :param args: 附加信息
+    :return: ReloadTrace
+    """
+    global _current  # pylint: disable=global-statement
+    _current = ReloadTrace(label, **args)
+    return _current
+
+
+def finish(trace=None):
+    """
+    结束记录并保存到最近记录中
+
+    :param trace: 需要结束的记录，默认为当前记录
+    :return: 结束的记录
+    """
+    global _current  # pylint: disable=global-statement
+    trace = trace or _current
+    if trace is None:
+        return None
+    trace.end = time.perf_counter()
+    if trace is _current:
+        _current = None
+    with _traces_lock:
+        _traces.append(trace)
+    return trace
+
+
+def current():
+    """
+    :return: 当前正在记录的 ReloadTrace，没有时返回None
+    """
+    return _current
+
+
+def span(name, cat, **args):
+    """
+    在当前记录中记录代码块耗时；没有正在进行的记录时什么都不做
+
+    :param name: 名称
+    :param cat: 分类（阶段）
+    :param args: 附加信息
+    :return: 上下文管理器
+    """
+    trace = _current
+    if trace is None:
+        return _NULL_SPAN
+    return trace.span(name, cat, **args)
+
+
+def recent_traces():
+    """
+    :return: 最近的记录，最新的在前
+    """
+    with _traces_lock:
+        return list(reversed(_traces))
+
+
+def get_trace(reload_id):
+    """
+    :param reload_id: 记录编号
+    :return: ReloadTrace，不存在时返回None
+    """
+    with _traces_lock:
+        for trace in _traces:
+            if trace.reload_id == reload_id:
+                return trace
+    return None
+
+
+def export_chrome_trace(filepath, traces):
+    """
+    把记录导出为 Chrome/Perfetto 可以打开的 trace JSON 文件
+
+    :param filepath: 输出文件路径
+    :param traces: ReloadTrace 列表
+    """
+    thread_names = dict(_THREAD_NAMES)
+    events = []
+    for trace in traces:
+        events.extend(trace.to_chrome_events())
+        for span_item in trace.spans:
+            if span_item[4] >= WORKER_THREAD_BASE:
+                thread_names[span_item[4]] = f"worker {span_item[4] - WORKER_THREAD_BASE}"
+    events[:0] = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+        for tid, name in thread_names.items()
+    ]
+    with open(filepath, 'w', encoding='utf-8') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
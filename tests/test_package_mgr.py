@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+package_mgr 的测试：使用基准测试的 bpy 替身模块，在普通CPython中运行
+
+    python -m unittest discover -s tests
+"""
+import importlib
+import os
+import sys
+import tempfile
+import unittest
+
+# 插件开发助手的根目录（本文件的上一级目录），以其目录名作为包名导入
+HELPER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HELPER_NAME = os.path.basename(HELPER_ROOT)
+
+sys.path.insert(0, os.path.join(HELPER_ROOT, 'benchmark'))
+import bpy_stub  # pylint: disable=import-error,wrong-import-position  # noqa: E402
+
+# 在导入插件开发助手之前安装替身模块（pytest 在执行测试之前也会导入根目录的 __init__.py）
+WORK_DIR = tempfile.mkdtemp()
+bpy_stub.install(os.path.join(WORK_DIR, 'user'))
+
+
+class LoadInvalidPathTest(unittest.TestCase):
+    """
+    加载不是插件包的路径时不能影响之后的任何导入
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        sys.path.insert(0, os.path.dirname(HELPER_ROOT))
+        cls.package_mgr = importlib.import_module(f"{HELPER_NAME}.src.handler.package_mgr")
+        cls.dev_finder = importlib.import_module(f"{HELPER_NAME}.src.handler.dev_finder")
+        cls.py_models = importlib.import_module(f"{HELPER_NAME}.src.data.py_models")
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.remove(os.path.dirname(HELPER_ROOT))
+        cls.work.cleanup()
+
+    def _assert_unaffected(self, meta_path):
+        """
+        :param meta_path: 加载之前的 sys.meta_path
+        """
+        self.assertEqual(sys.meta_path, meta_path)
+        self.assertNotIn(1, self.dev_finder.finders)
+        self.assertIsNone(self.py_models.get_package_name(1))
+        sys.modules.pop('json.tool', None)
+        self.assertIsNotNone(importlib.import_module('json.tool'))
+
+    def test_folder_without_init(self):
+        """
+        没有 __init__.py 的目录
+        """
+        meta_path = list(sys.meta_path)
+        self.package_mgr.load_package(os.path.join(self.work.name, 'notapkg'), 1)
+        os.makedirs(os.path.join(self.work.name, 'notapkg'), exist_ok=True)
+        self.package_mgr.load_package(os.path.join(self.work.name, 'notapkg'), 1)
+        self._assert_unaffected(meta_path)
+
+    def test_empty_path(self):
+        """
+        槽位的路径为空
+        """
+        meta_path = list(sys.meta_path)
+        cwd = os.getcwd()
+        os.chdir(self.work.name)
+        try:
+            self.package_mgr.load_package('', 1)
+        finally:
+            os.chdir(cwd)
+        self._assert_unaffected(meta_path)
+
+    def test_finder_refuses_empty_name(self):
+        """
+        查找器不接受空的插件包名称
+        """
+        meta_path = list(sys.meta_path)
+        with self.assertRaises(ValueError):
+            self.dev_finder.install(1, None, self.work.name)
+        self._assert_unaffected(meta_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2024, https://github.com/skys-mission and SoyMilkWhisky
+"""
+不启动Blender，在命令行中把插件目录打包为扩展的zip文件。
+
+与面板中的“打包扩展”使用同样的打包器，适合在CI或者脚本中使用：
+
+    python tools/build_extension.py path/to/addon
+    python tools/build_extension.py path/to/addon --output dist/addon.zip --level 6
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+
+# 插件开发助手的根目录（本文件的上一级目录）
+HELPER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 只导入 src 包：根目录的 __init__.py 需要 bpy
+PACKAGE_NAME = '_plugin_dev_helper_src'
+
+
+def load_packager():
+    """
+    以私有的包名导入 src 包，再导入其中的打包器
+
+    :return: packager 模块
+    """
+    src = os.path.join(HELPER_ROOT, 'src')
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(src, '__init__.py'), submodule_search_locations=[src])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+    return importlib.import_module(f"{PACKAGE_NAME}.handler.packager")
+
+
+def default_cache_dir():
+    """
+    :return: 默认的磁盘缓存目录：$XDG_CACHE_HOME 或 ~/.cache 下的 plugin_dev_helper/build_cache
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'plugin_dev_helper', 'build_cache')
+
+
+def main(argv=None):
+    """
+    命令行入口
+    """
+    packager = load_packager()
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 2)[1])
+    parser.add_argument('root', help="plugin directory containing blender_manifest.toml")
+    parser.add_argument('--output', help="output zip file (default: <root>/<id>-<version>.zip)")
+    parser.add_argument('--cache-dir', default=default_cache_dir(),
+                        help="cache of compressed members and file stats")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the disk cache")
+    parser.add_argument('--level', type=int, default=packager.COMPRESS_LEVEL,
+                        choices=range(0, 10), metavar='0-9', help="deflate compression level")
+    args = parser.parse_args(argv)
+
+    try:
+        stats = packager.build(args.root, args.output,
+                               None if args.no_cache else args.cache_dir, args.level)
+    except (OSError, ValueError) as err:
+        print(f"build failed: {err}", file=sys.stderr)
+        return 1
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())